@@ -0,0 +1,99 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+公式求值基准测试
+对比 编译字节码求值 与 原先的“数值替换 + eval” 方式在同一批公式上的耗时
+
+用法: python benchmarks/bench_formula_eval.py [公式数量] [引用数量]
+"""
+
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from utils.excel_utils_v2 import (
+    build_formula_reference_v2, evaluate_formula_with_values_v2, parse_formula_references_v2
+)
+from utils.formula_compiler import FormulaCompiler
+
+
+def generate_formulas(formula_count: int, reference_count: int, seed: int = 42):
+    """生成测试用的值映射表和公式"""
+    rng = random.Random(seed)
+    value_map = {
+        build_formula_reference_v2("科目余额表", f"科目{i}", f"A{i + 2}"): rng.uniform(-1e6, 1e6)
+        for i in range(reference_count)
+    }
+    references = list(value_map)
+
+    formulas = []
+    for _ in range(formula_count):
+        terms = rng.sample(references, rng.randint(2, 6))
+        formula = terms[0]
+        for term in terms[1:]:
+            formula += f" {rng.choice('+-')} {term}"
+        if rng.random() < 0.2:
+            formula = f"({formula}) * {rng.randint(1, 100) / 100}"
+        formulas.append(formula)
+
+    return value_map, formulas
+
+
+def evaluate_with_eval(formula: str, value_map):
+    """原先的求值方式：解析引用、替换为数值字符串后eval"""
+    calculated_formula = formula
+    for ref_data in parse_formula_references_v2(formula):
+        full_ref = ref_data['full_reference']
+        calculated_formula = calculated_formula.replace(full_ref, str(value_map[full_ref]))
+    return float(eval(calculated_formula))
+
+
+def run_benchmark(formula_count: int = 20000, reference_count: int = 5000):
+    """运行基准测试并打印结果"""
+    value_map, formulas = generate_formulas(formula_count, reference_count)
+
+    start = time.perf_counter()
+    expected = [evaluate_with_eval(f, value_map) for f in formulas]
+    eval_time = time.perf_counter() - start
+
+    # 冷启动：包含编译
+    compiler = FormulaCompiler()
+    start = time.perf_counter()
+    for formula in formulas:
+        compiled = compiler.compile(formula)
+        compiled.evaluate([value_map[r['full_reference']] for r in compiled.references])
+    cold_time = time.perf_counter() - start
+
+    # 热路径：公式已编译，只取值和执行字节码
+    start = time.perf_counter()
+    results = []
+    for formula in formulas:
+        compiled = compiler.compile(formula)
+        results.append(compiled.evaluate([value_map[r['full_reference']] for r in compiled.references]))
+    warm_time = time.perf_counter() - start
+
+    # 完整的公开接口（第一轮编译并缓存，第二轮命中缓存）
+    api_times = []
+    for _ in range(2):
+        start = time.perf_counter()
+        for formula in formulas:
+            evaluate_formula_with_values_v2(formula, value_map)
+        api_times.append(time.perf_counter() - start)
+
+    mismatches = sum(1 for a, b in zip(expected, results) if abs(a - b) > 1e-9 * max(1.0, abs(a)))
+
+    print(f"公式数量: {formula_count}, 引用数量: {reference_count}")
+    print(f"  替换+eval:              {eval_time:.3f} 秒")
+    print(f"  编译求值（含编译）:     {cold_time:.3f} 秒")
+    print(f"  编译求值（已缓存）:     {warm_time:.3f} 秒")
+    print(f"  evaluate_formula_with_values_v2: 首次 {api_times[0]:.3f} 秒, 再次 {api_times[1]:.3f} 秒")
+    print(f"  结果不一致: {mismatches}")
+
+
+if __name__ == "__main__":
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 20000
+    refs = int(sys.argv[2]) if len(sys.argv) > 2 else 5000
+    run_benchmark(count, refs)
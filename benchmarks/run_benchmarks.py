@@ -0,0 +1,303 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+性能基准测试套件
+生成指定规模的合成工作簿，依次测量 加载、数据提取、公式解析、公式验证、公式计算、模糊搜索、导出
+等热点路径的耗时，结果保存为JSON，可与上一次的结果对比
+
+用法:
+    python benchmarks/run_benchmarks.py --rows 5000 -o bench.json
+    python benchmarks/run_benchmarks.py --rows 5000 -o new.json --compare bench.json
+"""
+
+import argparse
+import contextlib
+import io
+import json
+import os
+import platform
+import shutil
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from benchmarks.synthetic_workbook import generate_workbook, generate_formulas
+from modules.file_manager import FileManager
+from modules.data_extractor import DataExtractor
+from modules.calculation_engine import CalculationEngine
+from utils.excel_utils_v2 import parse_formula_references_v2, validate_formula_syntax_v2
+from utils.formula_compiler import get_default_compiler
+from utils.data_indexer import DataIndexer
+from utils.value_index import ValueIndex
+from models.data_models import TargetItem, SourceItem, MappingFormula, CalculationResult
+
+
+def _quiet():
+    """屏蔽被测代码的打印输出"""
+    return contextlib.redirect_stdout(io.StringIO())
+
+
+def measure(func: Callable[[], Any], repeat: int, setup: Optional[Callable[[], Any]] = None) -> Dict[str, Any]:
+    """
+    多次运行并统计耗时（setup不计入耗时）
+
+    Args:
+        func: 被测函数
+        repeat: 运行次数
+        setup: 每次运行前执行的准备函数
+
+    Returns:
+        Dict[str, Any]: {min, median, max, runs}（秒）
+    """
+    runs = []
+    for _ in range(repeat):
+        if setup is not None:
+            setup()
+        start = time.perf_counter()
+        with _quiet():
+            func()
+        runs.append(time.perf_counter() - start)
+
+    return {
+        "min": round(min(runs), 6),
+        "median": round(statistics.median(runs), 6),
+        "max": round(max(runs), 6),
+        "runs": [round(r, 6) for r in runs]
+    }
+
+
+def _git_revision() -> str:
+    """当前代码版本（无法获取时返回空字符串）"""
+    try:
+        root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=root,
+                              capture_output=True, text=True, timeout=5).stdout.strip()
+    except Exception:
+        return ""
+
+
+def _load_and_extract(file_path: str):
+    """加载工作簿并提取数据，返回工作簿管理器"""
+    file_manager = FileManager()
+    file_manager.load_excel_files([file_path])
+    workbook_manager = file_manager.get_workbook_manager()
+    DataExtractor(workbook_manager).extract_all_data()
+    return workbook_manager
+
+
+def _build_indexer(workbook_manager) -> DataIndexer:
+    """以目标项和来源项构建DataIndexer"""
+    indexer = DataIndexer()
+    for target_id, target in workbook_manager.target_items.items():
+        indexer.add_item(target_id, {
+            'name': target.name, 'original_text': target.original_text,
+            'sheet_name': target.sheet_name, 'level': target.level
+        }, 'target')
+    for source_id, source in workbook_manager.source_items.items():
+        indexer.add_item(source_id, {
+            'name': source.name, 'sheet_name': source.sheet_name, 'value': source.value
+        }, 'source')
+    return indexer
+
+
+def _model_arguments(count: int) -> List[Tuple[str, ...]]:
+    """预先生成构造数据模型用的文本（不计入构造耗时）"""
+    return [(f"t{i}", f"s{i}", f"项目{i}", f"{i}. 项目{i}", f"科目{i}", f"{1001 + i}",
+             f'[科目余额表:"科目{i}"](A{i + 3})') for i in range(count)]
+
+
+def _construct_models(arguments: List[Tuple[str, ...]]) -> List[Any]:
+    """为每组参数构造目标项、来源项、映射公式和计算结果各一个"""
+    items = []
+    for row, (target_id, source_id, name, text, account_name, code, formula) in enumerate(arguments):
+        items.append(TargetItem(id=target_id, name=name, original_text=text, sheet_name="快报", row=row))
+        items.append(SourceItem(id=source_id, sheet_name="科目余额表", name=account_name, cell_address="",
+                                row=row, column="A", value=1.0, account_code=code,
+                                hierarchy_level=1, data_columns={"期末余额_借方": 1.0}))
+        items.append(MappingFormula(target_id=target_id, formula=formula))
+        items.append(CalculationResult(target_id=target_id, success=True, result=1.0))
+    return items
+
+
+def run_benchmarks(args) -> Dict[str, Any]:
+    """
+    运行全部基准测试
+
+    Args:
+        args: 命令行参数
+
+    Returns:
+        Dict[str, Any]: 测试结果
+    """
+    work_dir = tempfile.mkdtemp(prefix="bench_")
+    results: Dict[str, Any] = {}
+
+    try:
+        file_path = os.path.join(work_dir, "synthetic.xlsx")
+        start = time.perf_counter()
+        size = generate_workbook(file_path, args.trial_balance_sheets, args.rows,
+                                 args.flash_sheets, args.targets, seed=args.seed)
+        generate_time = time.perf_counter() - start
+        print(f"生成合成工作簿: {os.path.getsize(file_path) / 1024:.0f} KB, {generate_time:.2f} 秒")
+
+        # 数据模型构造
+        model_arguments = _model_arguments(10000)
+        results["data_models construction (x10000)"] = measure(lambda: _construct_models(model_arguments), args.repeat)
+
+        # 加载（分类工作表）
+        file_manager = FileManager()
+        results["FileManager.load_excel_files"] = measure(
+            lambda: file_manager.load_excel_files([file_path]), args.repeat)
+
+        # 数据提取（每次使用新的工作簿管理器）
+        state: Dict[str, Any] = {}
+
+        def prepare_extract():
+            with _quiet():
+                manager = FileManager()
+                manager.load_excel_files([file_path])
+            state["workbook_manager"] = manager.get_workbook_manager()
+
+        results["DataExtractor.extract_all_data"] = measure(
+            lambda: DataExtractor(state["workbook_manager"]).extract_all_data(), args.repeat, prepare_extract)
+        results["DataExtractor.extract_all_data (streaming)"] = measure(
+            lambda: DataExtractor(state["workbook_manager"], streaming=True).extract_all_data(),
+            args.repeat, prepare_extract)
+        if args.workers > 1:
+            results[f"DataExtractor.extract_all_data (parallel x{args.workers})"] = measure(
+                lambda: DataExtractor(state["workbook_manager"], max_workers=args.workers).extract_all_data(),
+                args.repeat, prepare_extract)
+
+        with _quiet():
+            workbook_manager = _load_and_extract(file_path)
+        formulas = generate_formulas(workbook_manager, args.terms, seed=args.seed)
+        size.update({
+            "target_items": len(workbook_manager.target_items),
+            "source_items": len(workbook_manager.source_items),
+            "formulas": len(formulas)
+        })
+        print(f"目标项 {size['target_items']} 个, 来源项 {size['source_items']} 个, 公式 {size['formulas']} 个")
+
+        # 公式解析与验证（验证前清空编译缓存，测量冷启动）
+        results["parse_formula_references_v2"] = measure(
+            lambda: [parse_formula_references_v2(f) for f in formulas], args.repeat)
+        results["validate_formula_syntax_v2"] = measure(
+            lambda: [validate_formula_syntax_v2(f) for f in formulas], args.repeat,
+            get_default_compiler().clear_cache)
+        results["validate_formula_syntax_v2 (cached)"] = measure(
+            lambda: [validate_formula_syntax_v2(f) for f in formulas], args.repeat)
+
+        # 公式计算
+        for backend in CalculationEngine.BACKENDS:
+            results[f"CalculationEngine.calculate_all_formulas ({backend})"] = measure(
+                lambda: CalculationEngine(workbook_manager, backend=backend).calculate_all_formulas(False),
+                args.repeat, get_default_compiler().clear_cache)
+
+        engine = CalculationEngine(workbook_manager)
+        results["CalculationEngine.calculate_all_formulas (warm)"] = measure(
+            lambda: engine.calculate_all_formulas(False), args.repeat)
+
+        # 模糊搜索
+        queries = ["银行", "应收账款", "费用", "利润", "资产总额", "研发", "主营业务收入1", "不存在的项目"]
+        results["DataIndexer.build"] = measure(lambda: _build_indexer(workbook_manager), args.repeat)
+        indexer = _build_indexer(workbook_manager)
+        results["DataIndexer.fuzzy_search"] = measure(
+            lambda: [indexer.fuzzy_search(q) for q in queries], args.repeat)
+        value_index = ValueIndex.from_source_items(workbook_manager.source_items)
+        lookup_values = [value for _, _, value in value_index.range()[::97]][:200]
+        results["ValueIndex.nearest (x200)"] = measure(
+            lambda: [value_index.nearest(v, 5) for v in lookup_values], args.repeat)
+        results["DataIndexer.suggest_sources_for_targets"] = measure(
+            lambda: indexer.suggest_sources_for_targets(limit=5), args.repeat, indexer._similarity_indexes.clear)
+
+        # 导出
+        export_path = os.path.join(work_dir, "export.xlsx")
+        results["CalculationEngine.export_to_excel"] = measure(
+            lambda: engine.export_to_excel(export_path), args.repeat)
+
+    finally:
+        shutil.rmtree(work_dir, ignore_errors=True)
+
+    return {
+        "meta": {
+            "timestamp": datetime.now().isoformat(),
+            "revision": _git_revision(),
+            "python": sys.version.split()[0],
+            "platform": platform.platform(),
+            "cpu_count": os.cpu_count(),
+            "repeat": args.repeat,
+            "size": size
+        },
+        "results": results
+    }
+
+
+def compare_results(current: Dict[str, Any], baseline: Dict[str, Any]) -> List[str]:
+    """
+    与基线结果对比（按中位数）
+
+    Args:
+        current: 本次结果
+        baseline: 基线结果
+
+    Returns:
+        List[str]: 对比报告行
+    """
+    lines = [f"对比基线: {baseline['meta'].get('revision', '')} ({baseline['meta'].get('timestamp', '')})"]
+    if baseline["meta"].get("size") != current["meta"].get("size"):
+        lines.append("警告: 两次测试的数据规模不同")
+
+    for name, result in current["results"].items():
+        base = baseline["results"].get(name)
+        if not base:
+            lines.append(f"  {name:<55} {result['median']:>10.4f}s  (新增)")
+            continue
+        ratio = result["median"] / base["median"] if base["median"] else float("inf")
+        lines.append(f"  {name:<55} {base['median']:>10.4f}s -> {result['median']:>10.4f}s  x{ratio:.2f}")
+
+    return lines
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    """命令行入口"""
+    parser = argparse.ArgumentParser(description="热点路径性能基准测试")
+    parser.add_argument("--rows", type=int, default=2000, help="每个科目余额表的科目行数")
+    parser.add_argument("--trial-balance-sheets", type=int, default=2, help="科目余额表数量")
+    parser.add_argument("--flash-sheets", type=int, default=2, help="快报表数量")
+    parser.add_argument("--targets", type=int, default=200, help="每个快报表的项目数")
+    parser.add_argument("--terms", type=int, default=4, help="每个公式引用的来源项数量")
+    parser.add_argument("--repeat", type=int, default=3, help="每项测试的运行次数")
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1, help="并行提取的进程数")
+    parser.add_argument("--seed", type=int, default=42, help="随机种子")
+    parser.add_argument("-o", "--output", help="结果JSON文件")
+    parser.add_argument("--compare", help="用于对比的基线JSON文件")
+    args = parser.parse_args(argv)
+
+    report = run_benchmarks(args)
+
+    print("\n=== 基准测试结果（秒） ===")
+    for name, result in report["results"].items():
+        print(f"  {name:<55} 中位数 {result['median']:.4f}  最小 {result['min']:.4f}")
+
+    if args.compare:
+        with open(args.compare, 'r', encoding='utf-8') as f:
+            baseline = json.load(f)
+        print()
+        print("\n".join(compare_results(report, baseline)))
+
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            json.dump(report, f, ensure_ascii=False, indent=2)
+        print(f"\n结果已保存到: {args.output}")
+
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,121 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+合成测试工作簿
+按指定规模生成 TableSchemaAnalyzer 能识别的科目余额表（两行列头：期初/本期/期末 × 借方/贷方）
+和快报表（A列为项目名称），以及引用来源项的映射公式
+"""
+
+import random
+from typing import Dict, List, Optional
+
+import openpyxl
+
+from models.data_models import MappingFormula, WorkbookManager
+from utils.excel_utils_v2 import build_formula_reference_v2
+
+
+# 科目余额表列头: (一级列头, 二级列头)
+TRIAL_BALANCE_HEADERS = [
+    ("科目代码", ""), ("科目名称", ""),
+    ("期初余额", "借方"), ("", "贷方"),
+    ("本期发生额", "借方"), ("", "贷方"),
+    ("期末余额", "借方"), ("", "贷方"),
+]
+
+# 生成科目名称用的词
+_ACCOUNT_WORDS = ["银行存款", "应收账款", "其他应收款", "预付账款", "库存商品", "固定资产", "累计折旧",
+                  "应付账款", "应交税费", "短期借款", "主营业务收入", "主营业务成本", "管理费用",
+                  "销售费用", "财务费用", "研发费用", "实收资本", "盈余公积", "未分配利润", "长期股权投资"]
+_TARGET_WORDS = ["营业总收入", "营业成本", "利润总额", "净利润", "资产总额", "负债总额", "所有者权益",
+                 "经营活动现金流量", "应收账款净额", "存货", "货币资金", "研发投入", "职工薪酬", "税金及附加"]
+
+
+def generate_workbook(file_path: str, trial_balance_sheets: int = 2, trial_balance_rows: int = 2000,
+                      flash_report_sheets: int = 2, targets_per_sheet: int = 200, seed: int = 42) -> Dict[str, int]:
+    """
+    生成合成工作簿
+
+    Args:
+        file_path: 保存路径
+        trial_balance_sheets: 科目余额表数量
+        trial_balance_rows: 每个科目余额表的科目行数
+        flash_report_sheets: 快报表数量
+        targets_per_sheet: 每个快报表的项目数
+        seed: 随机种子
+
+    Returns:
+        Dict[str, int]: 生成的规模信息
+    """
+    rng = random.Random(seed)
+    workbook = openpyxl.Workbook()
+    workbook.remove(workbook.active)
+
+    for index in range(flash_report_sheets):
+        sheet = workbook.create_sheet(f"企业财务快报{index + 1}")
+        sheet.append(["项目", "本期金额", "上年同期"])
+        for row in range(targets_per_sheet):
+            word = _TARGET_WORDS[row % len(_TARGET_WORDS)]
+            sheet.append([f"{row + 1}. {word}{row // len(_TARGET_WORDS) + 1}", None, None])
+
+    for index in range(trial_balance_sheets):
+        sheet = workbook.create_sheet(f"科目余额表{index + 1}")
+        sheet.append([primary for primary, _ in TRIAL_BALANCE_HEADERS])
+        sheet.append([secondary for _, secondary in TRIAL_BALANCE_HEADERS])
+        for row in range(trial_balance_rows):
+            word = _ACCOUNT_WORDS[row % len(_ACCOUNT_WORDS)]
+            # 带分隔点的科目代码，避免代码列被识别为数值列
+            code = f"{1001 + row % 9000}.{row // 9000 + 1:02d}.{index + 1:02d}"
+            values = [round(rng.uniform(0, 1e6), 2) if rng.random() < 0.8 else 0 for _ in range(6)]
+            sheet.append([code, f"{word}{row + 1}"] + values)
+
+    workbook.save(file_path)
+    workbook.close()
+
+    return {
+        "trial_balance_sheets": trial_balance_sheets,
+        "trial_balance_rows": trial_balance_rows,
+        "flash_report_sheets": flash_report_sheets,
+        "targets_per_sheet": targets_per_sheet
+    }
+
+
+def generate_formulas(workbook_manager: WorkbookManager, terms_per_formula: int = 4,
+                      column_ratio: float = 0.5, seed: int = 42) -> List[str]:
+    """
+    为每个目标项生成引用来源项的映射公式，写入workbook_manager.mapping_formulas
+
+    Args:
+        workbook_manager: 已提取数据的工作簿管理器
+        terms_per_formula: 每个公式引用的来源项数量
+        column_ratio: 使用带列键引用的比例
+        seed: 随机种子
+
+    Returns:
+        List[str]: 生成的公式
+    """
+    rng = random.Random(seed)
+    sources = list(workbook_manager.source_items.values())
+    formulas = []
+    if not sources:
+        return formulas
+
+    for target_id in workbook_manager.target_items:
+        terms = []
+        for source in rng.sample(sources, min(terms_per_formula, len(sources))):
+            column_key: Optional[str] = None
+            if source.data_columns and rng.random() < column_ratio:
+                column_key = rng.choice(list(source.data_columns))
+            terms.append(build_formula_reference_v2(source.sheet_name, source.name,
+                                                    source.cell_address, column_key))
+
+        formula = terms[0]
+        for term in terms[1:]:
+            formula += f" {rng.choice('+-')} {term}"
+        if rng.random() < 0.1:
+            formula = f"({formula}) / 10000"
+
+        workbook_manager.mapping_formulas[target_id] = MappingFormula(target_id=target_id, formula=formula)
+        formulas.append(formula)
+
+    return formulas
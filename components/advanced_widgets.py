@@ -549,6 +549,12 @@ class SearchableSourceTree(DragDropTreeView):
         self.all_source_items = {}
         self.current_sheet = "全部工作表"
 
+        # 索引搜索：搜索服务给出匹配的来源项，只切换可见性发生变化的行
+        self.search_service = None
+        self._row_ids: List[str] = []  # 行号 -> 来源项ID
+        self._row_of: Dict[str, int] = {}  # 来源项ID -> 行号
+        self._hidden_rows: set = set()
+
     def setup_search(self):
         """设置搜索功能（新增下拉菜单模式）"""
         # 创建搜索框
@@ -610,6 +616,10 @@ class SearchableSourceTree(DragDropTreeView):
         # 初始使用默认列头
         self.current_headers = self.default_headers
 
+    def set_search_service(self, search_service):
+        """设置搜索服务（ItemSearchService），过滤时通过索引查找匹配的来源项"""
+        self.search_service = search_service
+
     def populate_source_items(self, source_items: Dict[str, Any]):
         """填充来源项数据（支持下拉菜单模式）"""
         if not source_items:
@@ -772,6 +782,11 @@ class SearchableSourceTree(DragDropTreeView):
     def filter_items(self, text: str):
         """过滤项目（增强版）"""
         model = self.model()
+        if model and self.search_service is not None and self._row_ids and \
+                model.rowCount() == len(self._row_ids):
+            self._filter_rows_indexed(text)
+            return
+
         if not model or not text.strip():
             # 显示所有项目
             self._show_all_items(model)
@@ -780,6 +795,29 @@ class SearchableSourceTree(DragDropTreeView):
         # 隐藏不匹配的项目
         self._filter_model_items(model, text.lower())
 
+    def _filter_rows_indexed(self, text: str):
+        """通过搜索服务过滤顶层行（名称或科目代码包含搜索文本），只切换可见性变化的行"""
+        if text.strip():
+            matches = self.search_service.match_sources(text, by_code=True)
+            row_of = self._row_of
+            visible = {row_of[item_id] for item_id in matches if item_id in row_of}
+            hidden = set(range(len(self._row_ids))) - visible
+        else:
+            hidden = set()
+
+        changed = hidden.symmetric_difference(self._hidden_rows)
+        if not changed:
+            return
+
+        self.setUpdatesEnabled(False)
+        try:
+            root = QModelIndex()
+            for row in sorted(changed):
+                self.setRowHidden(row, root, row in hidden)
+        finally:
+            self.setUpdatesEnabled(True)
+        self._hidden_rows = hidden
+
     def _show_all_items(self, model):
         """显示所有项目"""
         for i in range(model.rowCount()):
@@ -849,6 +887,7 @@ class SearchableSourceTree(DragDropTreeView):
 
     def _populate_filtered_items(self, source_items: Dict[str, Any]):
         """填充过滤后的数据（单sheet模式）"""
+        self._set_row_ids([])
         if not source_items:
             model = QStandardItemModel()
             model.setHorizontalHeaderLabels(["项目名称", "数据列"])
@@ -925,6 +964,7 @@ class SearchableSourceTree(DragDropTreeView):
         """直接添加层级项目到模型（不使用sheet节点）"""
         # 按原始行号排序，保持原sheet顺序
         sorted_items = sorted(items, key=lambda x: getattr(x, 'row', 0))
+        self._set_row_ids(sorted_items)
 
         for item in sorted_items:
             row_items = self._create_item_row_enhanced(item)
@@ -934,11 +974,18 @@ class SearchableSourceTree(DragDropTreeView):
         """直接添加平面项目到模型（不使用sheet节点）"""
         # 按原始行号排序，保持原sheet顺序
         sorted_items = sorted(items, key=lambda x: getattr(x, 'row', 0))
+        self._set_row_ids(sorted_items)
 
         for item in sorted_items:
             row_items = self._create_item_row_enhanced(item)
             model.appendRow(row_items)
 
+    def _set_row_ids(self, items: List[Any]):
+        """记录顶层各行对应的来源项ID"""
+        self._row_ids = [item.id for item in items]
+        self._row_of = {item_id: row for row, item_id in enumerate(self._row_ids)}
+        self._hidden_rows = set()
+
     def _create_item_row_enhanced(self, item: Any) -> List[QStandardItem]:
         """创建增强的数据行（支持多列数据）"""
         row_items = []
@@ -45,6 +45,7 @@ from modules.file_manager import FileManager
 from modules.data_extractor import DataExtractor
 from modules.ai_mapper import AIMapper
 from modules.calculation_engine import CalculationEngine
+from utils.extraction_cache import ExtractionCache
 from components.advanced_widgets import (
     DragDropTreeView, FormulaEditor, FormulaSyntaxHighlighter,
     FormulaEditorDelegate, SearchableSourceTree, PropertyInspector,
@@ -1216,11 +1217,17 @@ class MainWindow(QMainWindow):
         self.template_manager = TemplateManager()
         self.template_manager.load_from_file()
 
-        self.file_manager = FileManager()  # 移除回调，现在使用拖拽界面
+        # 提取结果缓存：重新打开未修改的文件时不再解析工作簿
+        self.extraction_cache = ExtractionCache()
+        self.file_manager = FileManager(cache=self.extraction_cache)  # 移除回调，现在使用拖拽界面
         self.data_extractor = None
         self.ai_mapper = AIMapper()
         self.calculation_engine = None
 
+        # 目标项搜索：(目标项列表, 目标项ID -> 行号) 缓存，以及被搜索隐藏的行
+        self._target_row_cache = (None, {})
+        self._hidden_target_rows = set()
+
         self.init_ui()
         self.setup_models()
         self.setup_connections()
@@ -3096,8 +3103,16 @@ class MainWindow(QMainWindow):
             self.log_manager.info("开始数据提取...")
 
             # 使用增强的数据提取器
-            extractor = DataExtractor(self.workbook_manager)
-            success = extractor.extract_all_data()
+            extractor = DataExtractor(self.workbook_manager, cache=self.extraction_cache)
+            if self.workbook_manager.is_data_extracted:
+                # 已提取过：只重新处理内容变化的工作表，映射公式和计算结果保留
+                diff = extractor.refresh_changed_sheets()
+                success = diff is not None
+                if success:
+                    self.log_manager.info(diff.summary())
+                    self._recalculate_after_refresh(diff)
+            else:
+                success = extractor.extract_all_data()
 
             if not success:
                 QMessageBox.warning(self, "错误", "数据提取失败，请检查Excel文件格式")
@@ -3119,7 +3134,8 @@ class MainWindow(QMainWindow):
             self.update_category_filter()
             self.source_model.set_workbook_manager(self.workbook_manager)
 
-            # 使用增强的来源项显示
+            # 使用增强的来源项显示（目标项和来源项的搜索共用一次建立的索引）
+            self.source_tree.set_search_service(self.workbook_manager.get_search_service())
             self.source_tree.populate_source_items(self.workbook_manager.source_items)
             self.sheet_explorer_model.set_workbook_manager(self.workbook_manager)
 
@@ -3138,6 +3154,17 @@ class MainWindow(QMainWindow):
             self.log_manager.error(error_msg)
             QMessageBox.critical(self, "错误", error_msg)
 
+    def _recalculate_after_refresh(self, diff):
+        """增量重新提取后只重算受影响的公式"""
+        engine = self.calculation_engine
+        if not diff.has_changes or engine is None or engine.workbook_manager is not self.workbook_manager:
+            return
+
+        affected = engine.apply_extraction_diff(diff)
+        if affected:
+            engine.recalculate_dirty()
+            self.log_manager.info(f"已重新计算受影响的 {len(affected)} 个公式")
+
     def ai_analyze(self):
         """AI分析"""
         if not self.workbook_manager:
@@ -3607,6 +3634,7 @@ class MainWindow(QMainWindow):
             for i in range(self.target_model.rowCount()):
                 index = self.target_model.index(i, 0)
                 self.item_structure_tree.setRowHidden(i, QModelIndex(), False)
+            self._hidden_target_rows = set()
         else:
             # 只显示匹配的分类
             for i in range(self.target_model.rowCount()):
@@ -3619,43 +3647,56 @@ class MainWindow(QMainWindow):
         self.log_manager.info(f"🔍 筛选分类: {category_text}")
 
     def search_target_items(self, search_text: str):
-        """搜索目标项"""
+        """搜索目标项（通过搜索服务的索引查找，只切换可见性变化的行）"""
         if not self.target_model or not search_text.strip():
             # 清空搜索时恢复所有项目
             self.clear_search_filter()
             return
 
-        search_text = search_text.lower()
-        found_items = []
+        if not self.workbook_manager:
+            return
 
-        # 搜索所有目标项
-        for category_node in self.target_model.root_items:
-            category_match = False
-            for target_item in category_node.children:
-                if search_text in target_item.name.lower():
-                    found_items.append((category_node.name, target_item.name))
-                    category_match = True
-
-            # 如果分类下有匹配项，展开该分类
-            if category_match:
-                category_index = self.target_model.createIndex(
-                    self.target_model.root_items.index(category_node), 0, category_node
-                )
-                self.item_structure_tree.expand(category_index)
+        matches = self.workbook_manager.get_search_service().match_targets(search_text)
+        row_of = self._target_rows()
+        visible = {row_of[target_id] for target_id in matches if target_id in row_of}
+        self._set_hidden_target_rows(set(range(len(row_of))) - visible)
 
-        if found_items:
-            self.log_manager.info(f"🔍 找到 {len(found_items)} 个匹配项: {search_text}")
+        if visible:
+            self.log_manager.info(f"🔍 找到 {len(visible)} 个匹配项: {search_text}")
             # 可以高亮显示搜索结果
-            self.highlight_search_results(found_items)
+            self.highlight_search_results([self.target_model.root_items[row] for row in sorted(visible)])
         else:
             self.log_manager.info(f"🔍 未找到匹配项: {search_text}")
 
+    def _target_rows(self) -> Dict[str, int]:
+        """目标项ID -> 行号（目标项树重建后重新生成，树重建时所有行恢复可见）"""
+        root_items = self.target_model.root_items
+        cached_items, row_of = self._target_row_cache
+        if cached_items is not root_items:
+            row_of = {target.id: row for row, target in enumerate(root_items)}
+            self._target_row_cache = (root_items, row_of)
+            self._hidden_target_rows = set()
+        return row_of
+
+    def _set_hidden_target_rows(self, hidden: set):
+        """隐藏指定的目标项行，只对可见性变化的行调用setRowHidden"""
+        changed = hidden.symmetric_difference(self._hidden_target_rows)
+        if changed:
+            tree = self.item_structure_tree
+            tree.setUpdatesEnabled(False)
+            try:
+                for row in sorted(changed):
+                    tree.setRowHidden(row, QModelIndex(), row in hidden)
+            finally:
+                tree.setUpdatesEnabled(True)
+        self._hidden_target_rows = hidden
+
     def clear_search_filter(self):
         """清除搜索筛选"""
         if self.target_model:
-            # 恢复所有项目的可见性
-            for i in range(self.target_model.rowCount()):
-                self.item_structure_tree.setRowHidden(i, QModelIndex(), False)
+            # 恢复被搜索隐藏的项目
+            self._target_rows()
+            self._set_hidden_target_rows(set())
 
     def highlight_search_results(self, found_items: list):
         """高亮搜索结果（简化实现）"""
@@ -4245,6 +4286,8 @@ class MainWindow(QMainWindow):
             return
 
         self.log_manager.info(f"🔧 重新提取 {len(selected_items)} 个项目数据")
+        # 按工作表内容指纹增量提取，只有内容变化的工作表会被重新处理
+        self.extract_data()
 
     def reset_mappings(self):
         """重置映射关系"""
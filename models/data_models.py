@@ -5,14 +5,31 @@
 定义系统中使用的所有核心数据结构，支持新的公式格式
 """
 
-from typing import Dict, List, Optional, Union, Any, Tuple
-from dataclasses import dataclass, field
+from typing import Dict, Iterable, Iterator, List, Optional, Union, Any, Tuple
+from dataclasses import dataclass, field, fields
 from enum import Enum
+from array import array
+from collections.abc import MutableMapping
+import copy
 import json
+import math
 import os
+import sys
+import time
+import weakref
 from datetime import datetime
 import uuid
 
+import numpy as np
+
+from utils.workbook_session import WorkbookSession
+from utils.search_service import ItemSearchService
+
+
+# 数量大的数据项使用__slots__（没有实例__dict__，构造更快、占用更小）；
+# 保留weakref槽位供SourceItemStore复用物化对象，需要Python 3.11
+_SLOTTED = {"slots": True, "weakref_slot": True} if sys.version_info >= (3, 11) else {}
+
 
 class SheetType(Enum):
     """工作表类型枚举"""
@@ -44,7 +61,7 @@ class CellReference:
             self.cell_address = f"{self.column}{self.row}"
 
 
-@dataclass
+@dataclass(**_SLOTTED)
 class TargetItem:
     """目标项数据模型 - 快报表中需要填充的项目"""
 
@@ -68,9 +85,9 @@ class TargetItem:
     display_index: str = ""  # 显示序号
     indentation_level: int = 0  # 缩进级别
 
-    # 元数据
-    extracted_time: datetime = field(default_factory=datetime.now)
+    # 元数据（提取时间按需由时间戳转换为datetime）
     notes: str = ""  # 备注信息
+    _extracted_at: float = field(default_factory=time.time, init=False, repr=False, compare=False)
 
     def __post_init__(self):
         if not self.id:
@@ -84,8 +101,17 @@ class TargetItem:
         """cell_address属性，返回target_cell_address的值"""
         return self.target_cell_address
 
+    @property
+    def extracted_time(self) -> datetime:
+        """提取时间"""
+        return datetime.fromtimestamp(self._extracted_at)
 
-@dataclass
+    @extracted_time.setter
+    def extracted_time(self, value: datetime):
+        self._extracted_at = value.timestamp()
+
+
+@dataclass(**_SLOTTED)
 class SourceItem:
     """来源项数据模型 - 数据来源表中的数据项"""
 
@@ -106,7 +132,6 @@ class SourceItem:
     account_code: str = ""  # 科目代码
     hierarchy_level: int = 0  # 层级深度（0为根级）
     parent_code: str = ""  # 父级科目代码
-    full_name_with_indent: str = ""  # 带缩进的完整名称
     has_children: bool = False  # 是否有子项
 
     # 多列数据支持（新增）
@@ -118,9 +143,10 @@ class SourceItem:
     data_category: str = ""  # 数据分类（beginning, ending, current, previous等）
     data_type_detail: str = ""  # 数据类型详情（debit, credit, amount等）
 
-    # 元数据
-    extracted_time: datetime = field(default_factory=datetime.now)
+    # 元数据（提取时间按需由时间戳转换为datetime）
     notes: str = ""
+    _extracted_at: float = field(default_factory=time.time, init=False, repr=False, compare=False)
+    _full_name_with_indent: str = field(default="", init=False, repr=False)  # 显式设置的带缩进名称
 
     def __post_init__(self):
         if not self.id:
@@ -129,13 +155,29 @@ class SourceItem:
         if not self.cell_address and self.row and self.column:
             self.cell_address = f"{self.column}{self.row}"
 
-        # 如果没有设置带缩进的名称，使用原名称
-        if not self.full_name_with_indent:
-            indent = "  " * self.hierarchy_level
-            if self.account_code:
-                self.full_name_with_indent = f"{indent}{self.account_code} {self.name}"
-            else:
-                self.full_name_with_indent = f"{indent}{self.name}"
+    @property
+    def full_name_with_indent(self) -> str:
+        """带缩进的完整名称（没有显式设置时由层级、科目代码和名称生成）"""
+        if self._full_name_with_indent:
+            return self._full_name_with_indent
+
+        indent = "  " * self.hierarchy_level
+        if self.account_code:
+            return f"{indent}{self.account_code} {self.name}"
+        return f"{indent}{self.name}"
+
+    @full_name_with_indent.setter
+    def full_name_with_indent(self, value: str):
+        self._full_name_with_indent = value
+
+    @property
+    def extracted_time(self) -> datetime:
+        """提取时间"""
+        return datetime.fromtimestamp(self._extracted_at)
+
+    @extracted_time.setter
+    def extracted_time(self, value: datetime):
+        self._extracted_at = value.timestamp()
 
     def add_data_column(self, column_name: str, value: Any, column_desc: str = ""):
         """添加数据列"""
@@ -183,7 +225,732 @@ class SourceItem:
         return display_data
 
 
-@dataclass
+class _TrackedDict(dict):
+    """原地修改都经过 _on_set / _on_delete / _on_clear 的字典，复制或序列化时得到普通字典"""
+
+    __slots__ = ()
+
+    def __reduce_ex__(self, protocol):
+        return dict, (dict(self),)
+
+    def _on_set(self, key: str, value: Any):
+        pass
+
+    def _on_delete(self, key: str):
+        pass
+
+    def _on_clear(self):
+        pass
+
+    def __setitem__(self, key: str, value: Any):
+        super().__setitem__(key, value)
+        self._on_set(key, value)
+
+    def __delitem__(self, key: str):
+        super().__delitem__(key)
+        self._on_delete(key)
+
+    def __ior__(self, other):
+        self.update(other)
+        return self
+
+    def update(self, *args, **kwargs):
+        for key, value in dict(*args, **kwargs).items():
+            self[key] = value
+
+    def setdefault(self, key: str, default: Any = None) -> Any:
+        if key not in self:
+            self[key] = default
+        return self[key]
+
+    def pop(self, key: str, *default: Any) -> Any:
+        if key not in self:
+            return super().pop(key, *default)
+        value = self[key]
+        del self[key]
+        return value
+
+    def popitem(self) -> Tuple[str, Any]:
+        key, value = super().popitem()
+        self._on_delete(key)
+        return key, value
+
+    def clear(self):
+        super().clear()
+        self._on_clear()
+
+
+class _StoredColumns(_TrackedDict):
+    """列存储中来源项的data_columns：修改同时写回列存储"""
+
+    __slots__ = ('_table', '_position')
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self._table = None
+        self._position = -1
+
+    def _bind(self, table: 'SourceTable', position: int) -> '_StoredColumns':
+        self._table = table
+        self._position = position
+        return self
+
+    def _on_set(self, key: str, value: Any):
+        if self._table is not None:
+            self._table.set_value(self._position, value, key)
+
+    def _on_delete(self, key: str):
+        if self._table is not None:
+            self._table.delete_value(self._position, key)
+
+    def _on_clear(self):
+        if self._table is not None:
+            self._table.set_data_columns(self._position, {})
+
+
+class _StoredColumnInfo(_TrackedDict):
+    """列存储中来源项的column_info：修改同时写回列存储"""
+
+    __slots__ = ('_table', '_position')
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self._table = None
+        self._position = -1
+
+    def _bind(self, table: 'SourceTable', position: int) -> '_StoredColumnInfo':
+        self._table = table
+        self._position = position
+        return self
+
+    def _write(self):
+        if self._table is not None:
+            self._table.set_column_info(self._position, self)
+
+    def _on_set(self, key: str, value: Any):
+        self._write()
+
+    def _on_delete(self, key: str):
+        self._write()
+
+    def _on_clear(self):
+        self._write()
+
+
+class _StoredSourceItem(SourceItem):
+    """由SourceTable物化的来源项
+
+    主要数值、数据列、列信息、名称、科目代码和层级的修改同时写回列存储，
+    修改过的对象由列存储持有，之后读取同一行得到同一个对象，其他字段的修改也不会丢失。
+    与SourceItem内存布局相同（所属列存储和行位置记录在data_columns上），
+    物化时先按SourceItem构造再改变类型，构造不经过写回逻辑
+    """
+
+    __slots__ = ()
+
+    # 写回列存储的字段
+    _TABLE_FIELDS = frozenset({'value', 'data_columns', 'column_info', 'name', 'account_code', 'parent_code',
+                               'hierarchy_level'})
+
+    def __new__(cls, *args, **kwargs):
+        # 直接构造（如dataclasses.replace）得到不关联列存储的普通SourceItem
+        for name in ('data_columns', 'column_info'):
+            if isinstance(kwargs.get(name), _TrackedDict):
+                kwargs[name] = dict(kwargs[name])
+        return SourceItem(*args, **kwargs)
+
+    @staticmethod
+    def bind(item: SourceItem, table: 'SourceTable', position: int) -> '_StoredSourceItem':
+        """把普通SourceItem关联到列存储的一行"""
+        item.data_columns = _StoredColumns(item.data_columns)._bind(table, position)
+        item.column_info = _StoredColumnInfo(item.column_info)._bind(table, position)
+        item.__class__ = _StoredSourceItem
+        return item
+
+    def __setattr__(self, name: str, value: Any):
+        columns = getattr(self, 'data_columns', None)
+        table = getattr(columns, '_table', None)
+        if table is None:
+            # dataclasses.replace等构造的对象不关联列存储
+            object.__setattr__(self, name, value)
+            return
+
+        position = columns._position
+        if name == 'data_columns':
+            value = _StoredColumns(value)._bind(table, position)
+        elif name == 'column_info':
+            value = _StoredColumnInfo(value)._bind(table, position)
+        object.__setattr__(self, name, value)
+        if name in self._TABLE_FIELDS:
+            table.write_field(position, name, value)
+        table.pin(position, self)
+
+    def __eq__(self, other: Any) -> bool:
+        if not isinstance(other, SourceItem):
+            return NotImplemented
+        return all(getattr(self, f.name) == getattr(other, f.name) for f in fields(SourceItem) if f.compare)
+
+    __hash__ = None
+
+    def __reduce_ex__(self, protocol):
+        # 序列化为普通字段加上所属列存储（与列存储一起序列化时保持关联）
+        return _StoredSourceItem.bind, (self.detach(), self.data_columns._table, self.data_columns._position)
+
+    def __copy__(self) -> SourceItem:
+        return self.detach()
+
+    def __deepcopy__(self, memo: Dict[int, Any]) -> SourceItem:
+        item = self.detach()
+        item.data_columns = copy.deepcopy(item.data_columns, memo)
+        item.column_info = copy.deepcopy(item.column_info, memo)
+        return item
+
+    def detach(self) -> SourceItem:
+        """不与列存储关联的普通SourceItem副本"""
+        item = SourceItem.__new__(SourceItem)
+        for f in fields(SourceItem):
+            object.__setattr__(item, f.name, getattr(self, f.name))
+        item.data_columns = dict(self.data_columns)
+        item.column_info = dict(self.column_info)
+        return item
+
+
+class SourceTable:
+    """一个工作表的来源项列存储
+
+    每行一个来源项：名称、科目代码等字符串按列保存在列表中（驻留，重复文本只存一份），
+    行号、层级、主要数值和每个数据列分别保存在紧凑的数值数组中（缺失值为NaN），
+    不为每个来源项创建对象和字典。读取时按行物化为SourceItem，对物化对象的修改写回列存储。
+    加入SourceItemStore后冻结，不能再追加行，但可以修改已有行
+    """
+
+    def __init__(self, sheet_name: str, table_type: str = "unknown", column_keys: Iterable[str] = (),
+                 column: str = "A"):
+        """
+        初始化列存储
+
+        Args:
+            sheet_name: 工作表名
+            table_type: 表格类型
+            column_keys: 数据列键名（按此顺序物化data_columns）
+            column: 来源项所在列的列字母
+        """
+        self.sheet_name = sys.intern(sheet_name)
+        self.table_type = sys.intern(table_type)
+        self.column = column
+
+        self.ids: List[str] = []
+        self.index: Dict[str, int] = {}  # 来源项ID -> 行位置
+        self.names: List[str] = []
+        self.account_codes: List[str] = []
+        self.parent_codes: List[str] = []
+        self.rows = array('l')
+        self.levels = array('h')
+        self.values = array('d')
+        self.columns: Dict[str, array] = {key: array('d') for key in column_keys}
+        self._column_positions = {key: i for i, key in enumerate(self.columns)}
+
+        # 无法用浮点数组表示的行（非浮点值、NaN、列顺序与存储顺序不同）：行位置 -> (主要数值, 数据列)
+        self._irregular: Dict[int, Tuple[Any, Dict[str, Any]]] = {}
+        # 修改过的物化对象：行位置 -> 来源项（保留不在列中保存的字段的修改）
+        self._pinned: Dict[int, SourceItem] = {}
+        # 设置过列信息的行：行位置 -> column_info
+        self._column_info: Dict[int, Dict[str, str]] = {}
+        self.frozen = False
+
+    def __len__(self) -> int:
+        return len(self.ids)
+
+    def __iter__(self) -> Iterator[SourceItem]:
+        for position in range(len(self.ids)):
+            yield self.materialize(position)
+
+    @staticmethod
+    def _is_plain_float(value: Any) -> bool:
+        """是否可以无损保存在浮点数组中（NaN用于表示缺失值，不能作为数据保存）"""
+        return type(value) is float and not math.isnan(value)
+
+    def append(self, source_id: str, name: str, row: int, value: Any = None,
+               data_columns: Optional[Dict[str, Any]] = None, account_code: str = "",
+               hierarchy_level: int = 0, parent_code: str = ""):
+        """
+        追加一个来源项
+
+        Args:
+            source_id: 来源项ID
+            name: 项目名称
+            row: 行号
+            value: 主要数值
+            data_columns: 多列数据
+            account_code: 科目代码
+            hierarchy_level: 层级深度
+            parent_code: 父级科目代码
+        """
+        if self.frozen:
+            raise RuntimeError(f"工作表 '{self.sheet_name}' 的来源项列存储已冻结，不能追加")
+
+        position = len(self.ids)
+        data_columns = data_columns or {}
+
+        self.ids.append(source_id)
+        self.index[source_id] = position
+        self.names.append(sys.intern(name))
+        self.account_codes.append(sys.intern(account_code))
+        self.parent_codes.append(sys.intern(parent_code))
+        self.rows.append(row)
+        self.levels.append(hierarchy_level)
+
+        regular = value is None or self._is_plain_float(value)
+        self.values.append(value if value is not None and regular else math.nan)
+
+        last_position = -1
+        for key, column_value in data_columns.items():
+            column_position = self._column_positions.get(key)
+            if column_position is None:
+                # 新出现的列，已有的行补NaN
+                column_position = len(self.columns)
+                self._column_positions[key] = column_position
+                self.columns[key] = array('d', [math.nan]) * position
+            if column_position < last_position or not self._is_plain_float(column_value):
+                regular = False
+            last_position = column_position
+
+        for key, column in self.columns.items():
+            column_value = data_columns.get(key)
+            column.append(column_value if regular and column_value is not None else math.nan)
+
+        if not regular:
+            self._irregular[position] = (value, dict(data_columns))
+
+    def freeze(self):
+        """冻结列存储（之后可以获取数值数组视图）"""
+        self.frozen = True
+
+    def __setstate__(self, state: Dict[str, Any]):
+        self.__dict__.update(state)
+        self.__dict__.setdefault('_pinned', {})  # 早期版本的提取缓存
+        self.__dict__.setdefault('_column_info', {})
+
+    def _make_irregular(self, position: int) -> Tuple[Any, Dict[str, Any]]:
+        """把一行改为按对象保存（数组中该行置为NaN），返回 (主要数值, 数据列)"""
+        irregular = self._irregular.get(position)
+        if irregular is None:
+            irregular = (self.get_value(position), self.get_data_columns(position))
+            self._irregular[position] = irregular
+            self.values[position] = math.nan
+            for column in self.columns.values():
+                column[position] = math.nan
+        return irregular
+
+    def set_value(self, position: int, value: Any, column_key: str = ""):
+        """
+        修改一行的主要数值或某个数据列的值
+
+        Args:
+            position: 行位置
+            value: 新数值
+            column_key: 数据列键名，为空时修改主要数值
+        """
+        column = self.columns.get(column_key) if column_key else self.values
+        if position not in self._irregular and column is not None and \
+                (value is None or self._is_plain_float(value)):
+            column[position] = math.nan if value is None else value
+            return
+
+        main_value, data_columns = self._make_irregular(position)
+        if column_key:
+            data_columns[column_key] = value
+        else:
+            self._irregular[position] = (value, data_columns)
+
+    def delete_value(self, position: int, column_key: str):
+        """删除一行的某个数据列"""
+        irregular = self._irregular.get(position)
+        if irregular is not None:
+            irregular[1].pop(column_key, None)
+        elif column_key in self.columns:
+            self.columns[column_key][position] = math.nan
+
+    def set_data_columns(self, position: int, data_columns: Dict[str, Any]):
+        """替换一行的所有数据列"""
+        main_value, _ = self._make_irregular(position)
+        self._irregular[position] = (main_value, dict(data_columns))
+
+    def set_column_info(self, position: int, column_info: Dict[str, str]):
+        """替换一行的列信息"""
+        if column_info:
+            self._column_info[position] = dict(column_info)
+        else:
+            self._column_info.pop(position, None)
+
+    def write_field(self, position: int, name: str, value: Any):
+        """把物化对象上的字段修改写回列存储"""
+        if name == 'value':
+            self.set_value(position, value)
+        elif name == 'data_columns':
+            self.set_data_columns(position, value)
+        elif name == 'column_info':
+            self.set_column_info(position, value)
+        elif name == 'name':
+            self.names[position] = sys.intern(value)
+        elif name == 'account_code':
+            self.account_codes[position] = sys.intern(value)
+        elif name == 'parent_code':
+            self.parent_codes[position] = sys.intern(value)
+        elif name == 'hierarchy_level':
+            self.levels[position] = value
+
+    def pin(self, position: int, item: SourceItem):
+        """保留修改过的物化对象，之后物化该行时返回同一个对象"""
+        self._pinned[position] = item
+
+    def column_array(self, column_key: str = "") -> np.ndarray:
+        """
+        获取一列数值的NumPy视图（缺失值为NaN，不含无法用浮点数表示的行）
+
+        Args:
+            column_key: 数据列键名，为空时返回主要数值
+
+        Returns:
+            np.ndarray: 只读的float64数组
+        """
+        if not self.frozen:
+            raise RuntimeError("列存储冻结后才能获取数组视图")
+        column = self.values if not column_key else self.columns.get(column_key)
+        if column is None:
+            return np.full(len(self.ids), np.nan)
+        view = np.frombuffer(column, dtype=np.float64) if len(column) else np.zeros(0, dtype=np.float64)
+        view.flags.writeable = False
+        return view
+
+    def get_value(self, position: int, column_key: str = "") -> Any:
+        """
+        读取一行的主要数值或某个数据列的值
+
+        Args:
+            position: 行位置
+            column_key: 数据列键名，为空时返回主要数值
+
+        Returns:
+            Any: 数值，不存在时返回None
+        """
+        irregular = self._irregular.get(position)
+        if irregular is not None:
+            value, data_columns = irregular
+            return data_columns.get(column_key) if column_key else value
+
+        column = self.columns.get(column_key) if column_key else self.values
+        if column is None:
+            return None
+        value = column[position]
+        return None if value != value else value
+
+    def get_data_columns(self, position: int) -> Dict[str, Any]:
+        """读取一行的所有数据列"""
+        irregular = self._irregular.get(position)
+        if irregular is not None:
+            return dict(irregular[1])
+
+        data_columns = {}
+        for key, column in self.columns.items():
+            value = column[position]
+            if value == value:
+                data_columns[key] = value
+        return data_columns
+
+    def materialize(self, position: int) -> SourceItem:
+        """
+        把一行物化为SourceItem
+
+        Args:
+            position: 行位置
+
+        Returns:
+            SourceItem: 来源项（修改会写回列存储）
+        """
+        pinned = self._pinned.get(position)
+        if pinned is not None:
+            return pinned
+
+        row = self.rows[position]
+        return _StoredSourceItem.bind(SourceItem(
+            id=self.ids[position],
+            sheet_name=self.sheet_name,
+            name=self.names[position],
+            cell_address=f"{self.column}{row}",
+            row=row,
+            column=self.column,
+            value=self.get_value(position),
+            account_code=self.account_codes[position],
+            hierarchy_level=self.levels[position],
+            parent_code=self.parent_codes[position],
+            table_type=self.table_type,
+            data_columns=self.get_data_columns(position),
+            column_info=dict(self._column_info.get(position, ()))
+        ), self, position)
+
+    def __repr__(self) -> str:
+        return f"SourceTable({self.sheet_name!r}, rows={len(self.ids)}, columns={len(self.columns)})"
+
+
+class SourceItemStore(MutableMapping):
+    """来源项集合 {来源项ID: SourceItem}
+
+    数据提取产生的来源项按工作表保存在SourceTable列存储中，访问时才物化为SourceItem；
+    逐个赋值的来源项按原样保存。对物化来源项的修改直接写回列存储，get_value等不物化的读取
+    也能读到。正在被使用的物化对象会被复用（弱引用），同一ID多次读取得到同一个对象
+    """
+
+    def __init__(self, items: Optional[Any] = None):
+        """
+        初始化来源项集合
+
+        Args:
+            items: 初始来源项（字典或SourceItemStore）
+        """
+        # 来源项ID -> 所在列存储（逐个赋值的来源项为None），同时记录插入顺序
+        self._locations: Dict[str, Optional[SourceTable]] = {}
+        self._tables: List[SourceTable] = []
+        self._items: Dict[str, SourceItem] = {}
+        self._materialized = weakref.WeakValueDictionary()
+        if items:
+            self.update(items)
+
+    def __getitem__(self, source_id: str) -> SourceItem:
+        table = self._locations[source_id]
+        if table is None:
+            return self._items[source_id]
+
+        item = self._materialized.get(source_id)
+        if item is None:
+            item = table.materialize(table.index[source_id])
+            self._materialized[source_id] = item
+        return item
+
+    def __setitem__(self, source_id: str, item: SourceItem):
+        table = self._locations.get(source_id)
+        if table is not None and isinstance(item, _StoredSourceItem) and item.data_columns._table is table \
+                and table.ids[item.data_columns._position] == source_id:
+            # 重新赋值本来就在列存储中的物化对象（修改已写回）
+            self._materialized[source_id] = item
+            return
+
+        self._locations[source_id] = None
+        self._items[source_id] = item
+        self._materialized.pop(source_id, None)
+
+    def __delitem__(self, source_id: str):
+        if self._locations.pop(source_id) is None:
+            del self._items[source_id]
+        self._materialized.pop(source_id, None)
+
+    def __iter__(self) -> Iterator[str]:
+        return iter(self._locations)
+
+    def __len__(self) -> int:
+        return len(self._locations)
+
+    def __contains__(self, source_id: object) -> bool:
+        return source_id in self._locations
+
+    def __repr__(self) -> str:
+        return f"SourceItemStore({len(self._locations)} items, {len(self._tables)} tables)"
+
+    def add_table(self, table: SourceTable):
+        """
+        加入一个工作表的列存储（冻结后共享，不复制数据），同ID的已有来源项被替换
+
+        Args:
+            table: 列存储
+        """
+        table.freeze()
+        if not any(existing is table for existing in self._tables):
+            self._tables.append(table)
+
+        for source_id in table.ids:
+            if self._locations.get(source_id, table) is None:
+                del self._items[source_id]
+            self._locations[source_id] = table
+            self._materialized.pop(source_id, None)
+
+    def update(self, other: Any = (), **kwargs):
+        """批量加入来源项，另一个SourceItemStore的列存储直接共享"""
+        if isinstance(other, SourceItemStore):
+            for table in other._tables:
+                if not any(existing is table for existing in self._tables):
+                    self._tables.append(table)
+            for source_id, table in other._locations.items():
+                if table is None:
+                    self[source_id] = other._items[source_id]
+                else:
+                    if self._locations.get(source_id, table) is None:
+                        del self._items[source_id]
+                    self._locations[source_id] = table
+                    self._materialized.pop(source_id, None)
+            other = ()
+        super().update(other, **kwargs)
+
+    def clear(self):
+        self._locations.clear()
+        self._tables.clear()
+        self._items.clear()
+        self._materialized = weakref.WeakValueDictionary()
+
+    def tables(self) -> List[SourceTable]:
+        """仍包含来源项的列存储"""
+        live = {id(table) for table in self._locations.values() if table is not None}
+        return [table for table in self._tables if id(table) in live]
+
+    def get_sheet_ids(self, sheet_name: str) -> List[str]:
+        """
+        获取一个工作表的所有来源项ID（按插入顺序）
+
+        Args:
+            sheet_name: 工作表名
+
+        Returns:
+            List[str]: 来源项ID
+        """
+        return [source_id for source_id, table in self._locations.items()
+                if (table.sheet_name if table is not None else self._items[source_id].sheet_name) == sheet_name]
+
+    def replace_sheet(self, sheet_name: str, table: Optional[SourceTable]):
+        """
+        用新的列存储替换一个工作表的所有来源项，新来源项放在原来该工作表所在的位置
+
+        Args:
+            sheet_name: 工作表名
+            table: 新的列存储，为None时只删除该工作表的来源项
+        """
+        old_ids = set(self.get_sheet_ids(sheet_name))
+        new_index = table.index if table is not None else {}
+        if table is not None:
+            table.freeze()
+            if not any(existing is table for existing in self._tables):
+                self._tables.append(table)
+
+        locations: Dict[str, Optional[SourceTable]] = {}
+        inserted = table is None
+        for source_id, location in self._locations.items():
+            if source_id in old_ids:
+                if not inserted:
+                    locations.update(dict.fromkeys(table.ids, table))
+                    inserted = True
+            elif source_id not in new_index:
+                locations[source_id] = location
+                continue
+            if location is None:
+                del self._items[source_id]
+
+        if not inserted:
+            locations.update(dict.fromkeys(table.ids, table))
+
+        self._locations = locations
+        for source_id in old_ids.union(new_index):
+            self._materialized.pop(source_id, None)
+
+    def get_value(self, source_id: str, column_key: str = "") -> Any:
+        """
+        直接读取来源项的主要数值或数据列的值（不物化来源项）
+
+        Args:
+            source_id: 来源项ID
+            column_key: 数据列键名，为空时返回主要数值
+
+        Returns:
+            Any: 数值，来源项或列不存在时返回None
+        """
+        table = self._locations.get(source_id)
+        if table is None:
+            item = self._items.get(source_id)
+            if item is None:
+                return None
+            return item.data_columns.get(column_key) if column_key else item.value
+        return table.get_value(table.index[source_id], column_key)
+
+    def get_sheet_name(self, source_id: str) -> Optional[str]:
+        """读取来源项所属的工作表名（不物化来源项）"""
+        table = self._locations.get(source_id)
+        if table is not None:
+            return table.sheet_name
+        item = self._items.get(source_id)
+        return item.sheet_name if item is not None else None
+
+    def get_account_codes(self, source_id: str) -> Tuple[str, str]:
+        """读取来源项的 (科目代码, 父级科目代码)（不物化来源项）"""
+        table = self._locations.get(source_id)
+        if table is not None:
+            position = table.index[source_id]
+            return table.account_codes[position], table.parent_codes[position]
+        item = self._items.get(source_id)
+        return (item.account_code, item.parent_code) if item is not None else ("", "")
+
+    def iter_numeric_columns(self) -> Iterator[Tuple[str, List[str], np.ndarray]]:
+        """
+        逐列读取所有来源项的数值（不物化列存储中的来源项）
+
+        Yields:
+            Tuple[str, List[str], np.ndarray]: (列键, 来源项ID, 与ID对应的float64数值)，
+            列键为空表示主要数值；缺失或非数值为NaN，同一个ID列表可能对应多个列键
+        """
+        # 无法保存在数组中的值（如整数）和逐个赋值的来源项: 列键 -> ([来源项ID], [数值])
+        extra: Dict[str, Tuple[List[str], List[float]]] = {}
+
+        def add_extra(source_id: str, value: Any, data_columns: Dict[str, Any]):
+            for column_key, column_value in [("", value), *data_columns.items()]:
+                if isinstance(column_value, (int, float)) and not isinstance(column_value, bool):
+                    ids, values = extra.setdefault(column_key, ([], []))
+                    ids.append(source_id)
+                    values.append(float(column_value))
+
+        for table in self.tables():
+            masked = [position for position, source_id in enumerate(table.ids)
+                      if self._locations.get(source_id) is not table]
+            masked.extend(table._irregular)
+            for position, (value, data_columns) in table._irregular.items():
+                if self._locations.get(table.ids[position]) is table:
+                    add_extra(table.ids[position], value, data_columns)
+
+            for column_key in ["", *table.columns]:
+                values = table.column_array(column_key)
+                if masked:
+                    values = values.copy()
+                    values[masked] = np.nan
+                yield column_key, table.ids, values
+
+        for source_id, table in self._locations.items():
+            if table is None:
+                item = self._items[source_id]
+                add_extra(source_id, item.value, item.data_columns)
+
+        for column_key, (ids, values) in extra.items():
+            yield column_key, ids, np.asarray(values, dtype=np.float64)
+
+    def get_statistics(self) -> Dict[str, int]:
+        """获取存储统计信息"""
+        tables = self.tables()
+        return {
+            "items": len(self._locations),
+            "tables": len(tables),
+            "columnar_items": len(self._locations) - len(self._items),
+            "individual_items": len(self._items),
+            "data_columns": sum(len(table.columns) for table in tables),
+            "materialized": len(self._materialized)
+        }
+
+    def __getstate__(self):
+        # 物化对象的弱引用不能序列化，也不需要
+        state = self.__dict__.copy()
+        state["_tables"] = self.tables()
+        del state["_materialized"]
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self._materialized = weakref.WeakValueDictionary()
+
+
+@dataclass(**_SLOTTED)
 class MappingFormula:
     """映射公式数据模型"""
 
@@ -205,17 +972,35 @@ class MappingFormula:
     ai_confidence: float = 0.0  # AI生成的置信度
     ai_reasoning: str = ""  # AI推理过程
 
-    # 元数据
-    created_time: datetime = field(default_factory=datetime.now)
-    modified_time: datetime = field(default_factory=datetime.now)
+    # 元数据（创建/修改时间按需由时间戳转换为datetime）
     version: int = 1  # 版本号
     notes: str = ""
+    _created_at: float = field(default_factory=time.time, init=False, repr=False, compare=False)
+    _modified_at: Optional[float] = field(default=None, init=False, repr=False, compare=False)
+
+    @property
+    def created_time(self) -> datetime:
+        """创建时间"""
+        return datetime.fromtimestamp(self._created_at)
+
+    @created_time.setter
+    def created_time(self, value: datetime):
+        self._created_at = value.timestamp()
+
+    @property
+    def modified_time(self) -> datetime:
+        """修改时间（未修改过时为创建时间）"""
+        return datetime.fromtimestamp(self._modified_at if self._modified_at is not None else self._created_at)
+
+    @modified_time.setter
+    def modified_time(self, value: datetime):
+        self._modified_at = value.timestamp()
 
     def update_formula(self, new_formula: str, status: FormulaStatus = FormulaStatus.USER_MODIFIED):
         """更新公式"""
         self.formula = new_formula
         self.status = status
-        self.modified_time = datetime.now()
+        self._modified_at = time.time()
         self.version += 1
         self.is_valid = False  # 需要重新验证
 
@@ -237,6 +1022,34 @@ class MappingFormula:
             self.status = FormulaStatus.ERROR
 
 
+@dataclass
+class ExtractionDiff:
+    """增量重新提取的结果：重新处理的工作表，以及新增、删除、内容变化的数据项ID"""
+
+    changed_sheets: List[str] = field(default_factory=list)  # 内容变化、重新提取的工作表
+    unchanged_sheets: List[str] = field(default_factory=list)  # 内容未变化、跳过的工作表
+
+    added_targets: List[str] = field(default_factory=list)
+    removed_targets: List[str] = field(default_factory=list)
+    modified_targets: List[str] = field(default_factory=list)
+
+    added_sources: List[str] = field(default_factory=list)
+    removed_sources: List[str] = field(default_factory=list)
+    modified_sources: List[str] = field(default_factory=list)
+
+    @property
+    def has_changes(self) -> bool:
+        """是否有数据项发生变化"""
+        return bool(self.added_targets or self.removed_targets or self.modified_targets or
+                    self.added_sources or self.removed_sources or self.modified_sources)
+
+    def summary(self) -> str:
+        """变化摘要"""
+        return (f"重新提取 {len(self.changed_sheets)} 个工作表，跳过 {len(self.unchanged_sheets)} 个未变化的工作表；"
+                f"目标项 +{len(self.added_targets)} -{len(self.removed_targets)} ~{len(self.modified_targets)}，"
+                f"来源项 +{len(self.added_sources)} -{len(self.removed_sources)} ~{len(self.modified_sources)}")
+
+
 @dataclass
 class WorksheetInfo:
     """工作表信息"""
@@ -250,8 +1063,18 @@ class WorksheetInfo:
     max_row: int = 0
     max_column: int = 0
     has_merged_cells: bool = False
+    merged_cell_ranges: int = 0  # 合并单元格区域数
     data_range: str = ""  # 数据范围，如'A1:D100'
 
+    # 单元格统计（FileManager.profile_worksheets 按需计算）
+    non_empty_cells: int = 0
+    numeric_cells: int = 0
+    text_cells: int = 0
+    formula_cells: int = 0
+    fill_rate: float = 0.0  # 填充率（%）
+    is_profiled: bool = False  # 是否已完成单元格统计
+    is_sampled: bool = False  # 单元格统计是否为抽样估算
+
     # 处理状态
     is_processed: bool = False
     extraction_time: Optional[datetime] = None
@@ -271,7 +1094,7 @@ class WorkbookManager:
 
     # 数据项
     target_items: Dict[str, TargetItem] = field(default_factory=dict)
-    source_items: Dict[str, SourceItem] = field(default_factory=dict)
+    source_items: SourceItemStore = field(default_factory=SourceItemStore)  # 按工作表列存储
     mapping_formulas: Dict[str, MappingFormula] = field(default_factory=dict)
     calculation_results: Dict[str, 'CalculationResult'] = field(default_factory=dict)
 
@@ -284,11 +1107,45 @@ class WorkbookManager:
     is_loaded: bool = False
     is_data_extracted: bool = False
     last_processed: Optional[datetime] = None
+    # 上次提取时各工作表的内容指纹 (用途, 工作表名) -> 指纹，用于增量重新提取
+    sheet_fingerprints: Dict[Tuple[str, str], str] = field(default_factory=dict)
+    # 上次提取时各工作表XML部件的摘要（未变化的工作表无需解析即可跳过）
+    sheet_part_digests: Dict[str, str] = field(default_factory=dict)
 
     # 元数据
     created_time: datetime = field(default_factory=datetime.now)
     notes: str = ""
 
+    # 工作簿会话（分类、提取、处理、导出共用一次加载）
+    session: Optional[WorkbookSession] = field(default=None, repr=False, compare=False)
+    # 数据项搜索服务（提取后首次搜索时建立索引，增量提取后按差异更新）
+    search_service: Optional[ItemSearchService] = field(default=None, repr=False, compare=False)
+
+    def get_session(self) -> WorkbookSession:
+        """获取当前文件的工作簿会话（文件路径变化时新建）"""
+        if self.session is None or self.session.file_path != self.file_path:
+            if self.session is not None:
+                self.session.invalidate()
+            self.session = WorkbookSession(self.file_path)
+        return self.session
+
+    def invalidate_session(self):
+        """文件在外部被修改后调用，下次访问时重新加载"""
+        if self.session is not None:
+            self.session.invalidate()
+
+    def get_search_service(self) -> ItemSearchService:
+        """获取数据项搜索服务（尚未建立或数据项已整体变化时重新建立索引）"""
+        if self.search_service is None:
+            self.search_service = ItemSearchService(self)
+        elif self.search_service.is_stale(self):
+            self.search_service.build(self)
+        return self.search_service
+
+    def invalidate_search_service(self):
+        """数据项整体重新提取后调用，下次搜索时重新建立索引"""
+        self.search_service = None
+
     @property
     def file_name(self) -> str:
         """从文件路径获取文件名"""
@@ -356,16 +1213,8 @@ class WorkbookManager:
         return self.target_items.get(target.parent_id)
 
     def search_source_items(self, query: str) -> List[SourceItem]:
-        """搜索来源项"""
-        query_lower = query.lower()
-        results = []
-
-        for source_item in self.source_items.values():
-            if (query_lower in source_item.name.lower() or
-                query_lower in source_item.sheet_name.lower()):
-                results.append(source_item)
-
-        return results
+        """搜索来源项（名称或工作表名包含查询文本，通过搜索服务的索引查找）"""
+        return self.get_search_service().search_sources(query, by_sheet=True)
 
     def get_formula_statistics(self) -> Dict[str, int]:
         """获取公式统计信息"""
@@ -443,7 +1292,7 @@ class WorkbookManager:
         return json.dumps(data, ensure_ascii=False, indent=2)
 
 
-@dataclass
+@dataclass(**_SLOTTED)
 class CalculationResult:
     """计算结果数据模型"""
 
@@ -458,8 +1307,17 @@ class CalculationResult:
     input_values: Dict[str, Any] = field(default_factory=dict)  # 输入值
     calculation_steps: List[str] = field(default_factory=list)  # 计算步骤
 
-    # 元数据
-    calculated_time: datetime = field(default_factory=datetime.now)
+    # 元数据（计算时间按需由时间戳转换为datetime）
+    _calculated_at: float = field(default_factory=time.time, init=False, repr=False, compare=False)
+
+    @property
+    def calculated_time(self) -> datetime:
+        """计算时间"""
+        return datetime.fromtimestamp(self._calculated_at)
+
+    @calculated_time.setter
+    def calculated_time(self, value: datetime):
+        self._calculated_at = value.timestamp()
 
 
 @dataclass
@@ -646,12 +1504,11 @@ class TemplateManager:
                     if target_id not in workbook_manager.mapping_formulas:
                         workbook_manager.mapping_formulas[target_id] = MappingFormula(
                             target_id=target_id,
-                            formula_text=formula_text,
+                            formula=formula_text,
                             status=FormulaStatus.USER_MODIFIED
                         )
                     else:
-                        workbook_manager.mapping_formulas[target_id].formula_text = formula_text
-                        workbook_manager.mapping_formulas[target_id].status = FormulaStatus.USER_MODIFIED
+                        workbook_manager.mapping_formulas[target_id].update_formula(formula_text)
 
                     applied_count += 1
 
@@ -0,0 +1,336 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+批量无界面处理模块
+不依赖图形界面，对一批工作簿依次执行 加载 -> 数据提取 -> 应用映射模板 -> 计算 -> 导出，
+多个文件在进程池中并行处理，并输出每个文件的耗时和错误汇总
+
+用法:
+    python -m modules.batch_processor 子公司报表/ -t mapping_templates.json -o 输出/ -w 4
+"""
+
+import argparse
+import contextlib
+import glob
+import io
+import json
+import os
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from typing import Any, Dict, List, Optional
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from models.data_models import MappingTemplate, TemplateManager, WorkbookManager
+from modules.file_manager import FileManager
+from modules.data_extractor import DataExtractor
+from modules.calculation_engine import CalculationEngine
+
+
+# 支持的工作簿扩展名
+EXCEL_EXTENSIONS = ('.xlsx', '.xls')
+
+
+def collect_workbook_paths(inputs: List[str]) -> List[str]:
+    """
+    展开输入的文件、目录和通配符为工作簿路径列表
+
+    Args:
+        inputs: 文件路径、目录或通配符
+
+    Returns:
+        List[str]: 去重并排序后的工作簿路径
+    """
+    paths = set()
+
+    for item in inputs:
+        if os.path.isdir(item):
+            candidates = [os.path.join(item, name) for name in os.listdir(item)]
+        else:
+            candidates = glob.glob(item)
+
+        for path in candidates:
+            name = os.path.basename(path)
+            # 跳过Excel临时文件和导出时生成的备份文件
+            if name.startswith('~$') or '_backup_' in name:
+                continue
+            if os.path.isfile(path) and path.lower().endswith(EXCEL_EXTENSIONS):
+                paths.add(os.path.abspath(path))
+
+    return sorted(paths)
+
+
+def load_templates(template_file: str, template_names: Optional[List[str]] = None) -> List[MappingTemplate]:
+    """
+    从模板文件加载映射模板
+
+    Args:
+        template_file: TemplateManager保存的模板文件
+        template_names: 只使用指定名称或ID的模板，None表示全部
+
+    Returns:
+        List[MappingTemplate]: 模板列表
+    """
+    manager = TemplateManager(template_file_path=template_file)
+    manager.load_from_file()
+
+    templates = list(manager.templates.values())
+    if template_names:
+        wanted = set(template_names)
+        templates = [t for t in templates if t.name in wanted or t.id in wanted]
+
+    return templates
+
+
+def apply_templates(workbook_manager: WorkbookManager, templates: List[MappingTemplate]) -> int:
+    """
+    将模板应用到工作簿的快报表
+
+    模板指定了目标表格时只应用到该表格；否则应用到与来源快报表同名的表格，
+    都不存在时应用到所有快报表
+
+    Args:
+        workbook_manager: 工作簿管理器
+        templates: 模板列表
+
+    Returns:
+        int: 应用的映射数量
+    """
+    manager = TemplateManager()
+    flash_sheets = list(workbook_manager.flash_report_sheets)
+    applied_count = 0
+
+    for template in templates:
+        if template.target_sheet and template.target_sheet in flash_sheets:
+            sheets = [template.target_sheet]
+        elif template.source_sheet in flash_sheets:
+            sheets = [template.source_sheet]
+        else:
+            sheets = flash_sheets
+
+        for sheet_name in sheets:
+            applied_count += manager.apply_template_to_sheet(template, workbook_manager, sheet_name)
+
+    return applied_count
+
+
+def process_workbook(file_path: str, template_dicts: List[Dict[str, Any]], output_dir: str,
+                     backend: str = "python", quiet: bool = True, streaming: bool = False) -> Dict[str, Any]:
+    """
+    处理单个工作簿（在子进程中运行）
+
+    Args:
+        file_path: 工作簿路径
+        template_dicts: 模板字典列表（MappingTemplate.to_dict格式）
+        output_dir: 导出目录
+        backend: 计算后端
+        quiet: 是否屏蔽处理过程中的输出
+        streaming: 是否以只读流式模式提取数据
+
+    Returns:
+        Dict[str, Any]: 处理结果汇总
+    """
+    summary = {
+        "file": file_path,
+        "success": False,
+        "error": None,
+        "output": None,
+        "timings": {},
+        "target_items": 0,
+        "source_items": 0,
+        "formulas": 0,
+        "calculated": 0,
+        "failed": 0,
+        "calculation_errors": []
+    }
+    timings = summary["timings"]
+    total_start = time.perf_counter()
+
+    def step(name: str, start: float):
+        timings[name] = round(time.perf_counter() - start, 3)
+
+    output = io.StringIO() if quiet else sys.stdout
+
+    try:
+        with contextlib.redirect_stdout(output):
+            # 1. 加载并分类工作表
+            start = time.perf_counter()
+            file_manager = FileManager()
+            success, message = file_manager.load_excel_files([file_path])
+            step("load", start)
+            if not success:
+                summary["error"] = message
+                return summary
+            workbook_manager = file_manager.get_workbook_manager()
+
+            # 2. 提取数据
+            start = time.perf_counter()
+            extractor = DataExtractor(workbook_manager, streaming=streaming)
+            success = extractor.extract_all_data()
+            step("extract", start)
+            if not success:
+                summary["error"] = "数据提取失败"
+                return summary
+            summary["target_items"] = len(workbook_manager.target_items)
+            summary["source_items"] = len(workbook_manager.source_items)
+
+            # 3. 应用映射模板
+            start = time.perf_counter()
+            templates = [MappingTemplate.from_dict(data) for data in template_dicts]
+            apply_templates(workbook_manager, templates)
+            summary["formulas"] = len(workbook_manager.mapping_formulas)
+            step("apply_templates", start)
+
+            # 4. 计算
+            start = time.perf_counter()
+            engine = CalculationEngine(workbook_manager, backend=backend)
+            engine.calculate_all_formulas(show_progress=False)
+            calculation_summary = engine.get_calculation_summary()
+            summary["calculated"] = calculation_summary["successful_calculations"]
+            summary["failed"] = calculation_summary["failed_calculations"]
+            summary["calculation_errors"] = engine.get_errors()[:20]
+            step("calculate", start)
+
+            # 5. 导出
+            start = time.perf_counter()
+            os.makedirs(output_dir, exist_ok=True)
+            base_name = os.path.splitext(os.path.basename(file_path))[0]
+            output_path = os.path.join(output_dir, f"{base_name}_计算结果.xlsx")
+            if not engine.export_to_excel(output_path):
+                summary["error"] = "; ".join(engine.get_errors()[-1:]) or "导出失败"
+                step("export", start)
+                return summary
+            step("export", start)
+
+            summary["output"] = output_path
+            summary["success"] = True
+
+    except Exception as e:
+        summary["error"] = f"{type(e).__name__}: {str(e)}"
+
+    finally:
+        timings["total"] = round(time.perf_counter() - total_start, 3)
+
+    return summary
+
+
+def run_batch(file_paths: List[str], templates: List[MappingTemplate], output_dir: str,
+              max_workers: int = 1, backend: str = "python", quiet: bool = True,
+              streaming: bool = False) -> List[Dict[str, Any]]:
+    """
+    批量处理工作簿
+
+    Args:
+        file_paths: 工作簿路径列表
+        templates: 映射模板
+        output_dir: 导出目录
+        max_workers: 并行进程数，1表示在当前进程中依次处理
+        backend: 计算后端
+        quiet: 是否屏蔽处理过程中的输出
+        streaming: 是否以只读流式模式提取数据
+
+    Returns:
+        List[Dict[str, Any]]: 每个文件的处理结果（与file_paths顺序一致）
+    """
+    template_dicts = [template.to_dict() for template in templates]
+    results: Dict[str, Dict[str, Any]] = {}
+    total = len(file_paths)
+
+    def report(summary: Dict[str, Any]):
+        status = "成功" if summary["success"] else f"失败: {summary['error']}"
+        print(f"[{len(results)}/{total}] {os.path.basename(summary['file'])} "
+              f"{summary['timings'].get('total', 0):.2f}秒 {status}")
+
+    if max_workers <= 1:
+        for path in file_paths:
+            results[path] = process_workbook(path, template_dicts, output_dir, backend, quiet, streaming)
+            report(results[path])
+    else:
+        with ProcessPoolExecutor(max_workers=max_workers) as executor:
+            futures = {
+                executor.submit(process_workbook, path, template_dicts, output_dir, backend, quiet, streaming): path
+                for path in file_paths
+            }
+            for future in as_completed(futures):
+                path = futures[future]
+                try:
+                    results[path] = future.result()
+                except Exception as e:
+                    results[path] = {"file": path, "success": False, "timings": {},
+                                     "error": f"{type(e).__name__}: {str(e)}"}
+                report(results[path])
+
+    return [results[path] for path in file_paths]
+
+
+def print_summary(results: List[Dict[str, Any]], elapsed: float):
+    """打印批量处理汇总"""
+    succeeded = [r for r in results if r["success"]]
+    failed = [r for r in results if not r["success"]]
+
+    print("\n=== 批量处理汇总 ===")
+    print(f"{'文件':<40} {'提取':>8} {'计算':>8} {'导出':>8} {'合计':>8}  公式(成功/失败)")
+    for r in results:
+        timings = r.get("timings", {})
+        print(f"{os.path.basename(r['file'])[:40]:<40} "
+              f"{timings.get('extract', 0):>8.2f} {timings.get('calculate', 0):>8.2f} "
+              f"{timings.get('export', 0):>8.2f} {timings.get('total', 0):>8.2f}  "
+              f"{r.get('calculated', 0)}/{r.get('failed', 0)}")
+
+    if failed:
+        print("\n失败的文件:")
+        for r in failed:
+            print(f"  {r['file']}: {r['error']}")
+
+    print(f"\n共 {len(results)} 个文件，成功 {len(succeeded)} 个，失败 {len(failed)} 个，总耗时 {elapsed:.2f} 秒")
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    """命令行入口"""
+    parser = argparse.ArgumentParser(description="批量计算快报工作簿（无界面）")
+    parser.add_argument("inputs", nargs="+", help="工作簿文件、目录或通配符")
+    parser.add_argument("-t", "--template-file", default="mapping_templates.json",
+                        help="映射模板文件（默认 mapping_templates.json）")
+    parser.add_argument("-n", "--template", action="append", dest="templates",
+                        help="只使用指定名称或ID的模板，可重复指定")
+    parser.add_argument("-o", "--output-dir", default="batch_output", help="导出目录（默认 batch_output）")
+    parser.add_argument("-w", "--workers", type=int, default=os.cpu_count() or 1, help="并行进程数")
+    parser.add_argument("-b", "--backend", choices=CalculationEngine.BACKENDS, default="python",
+                        help="计算后端")
+    parser.add_argument("-r", "--streaming", action="store_true",
+                        help="以只读流式模式提取数据（适用于大型科目余额表）")
+    parser.add_argument("-s", "--summary", help="将处理结果汇总写入JSON文件")
+    parser.add_argument("-v", "--verbose", action="store_true", help="显示每个文件的处理过程输出")
+    args = parser.parse_args(argv)
+
+    file_paths = collect_workbook_paths(args.inputs)
+    if not file_paths:
+        print("未找到任何工作簿")
+        return 1
+
+    templates = load_templates(args.template_file, args.templates)
+    if not templates:
+        print(f"模板文件中没有可用的模板: {args.template_file}")
+        return 1
+
+    print(f"共 {len(file_paths)} 个工作簿，{len(templates)} 个模板，{args.workers} 个进程")
+
+    start = time.perf_counter()
+    results = run_batch(file_paths, templates, args.output_dir,
+                        max_workers=min(args.workers, len(file_paths)),
+                        backend=args.backend, quiet=not args.verbose, streaming=args.streaming)
+    elapsed = time.perf_counter() - start
+
+    print_summary(results, elapsed)
+
+    if args.summary:
+        with open(args.summary, 'w', encoding='utf-8') as f:
+            json.dump({"elapsed": round(elapsed, 3), "files": results}, f, ensure_ascii=False, indent=2)
+        print(f"汇总已保存到: {args.summary}")
+
+    return 0 if all(r["success"] for r in results) else 2
+
+
+if __name__ == "__main__":
+    sys.exit(main())
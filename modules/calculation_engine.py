@@ -5,22 +5,27 @@
 实现公式解析、计算和导出功能
 """
 
+import os
 import openpyxl
 from typing import Dict, List, Tuple, Any, Optional, Union
-import re
 from dataclasses import dataclass, field
 from datetime import datetime
+from time import perf_counter_ns
 import json
 
 from models.data_models import (
     TargetItem, SourceItem, MappingFormula, WorkbookManager,
-    FormulaStatus, CalculationResult
+    FormulaStatus, CalculationResult, ExtractionDiff
 )
-from utils.excel_utils_v2 import (
-    validate_formula_syntax_v2, parse_formula_references_v2,
-    build_formula_reference_v2, evaluate_formula_with_values_v2,
-    write_values_to_excel, backup_excel_file
+from utils.excel_utils_v2 import build_formula_reference_v2, backup_excel_file
+from utils.formula_compiler import (
+    CompiledFormula, FormulaSyntaxError, get_default_compiler
 )
+from modules.dependency_graph import FormulaDependencyGraph
+from modules.vectorized_calculator import VectorizedCalculator
+from modules.parallel_calculator import ParallelCalculator
+from modules.calculation_profiler import CalculationProfiler
+from utils.reference_index import ReferenceIndex
 
 
 @dataclass
@@ -28,6 +33,7 @@ class CalculationContext:
     """计算上下文信息"""
     workbook_manager: WorkbookManager
     value_cache: Dict[str, Any] = field(default_factory=dict)
+    reference_index: Optional[ReferenceIndex] = None
     calculation_order: List[str] = field(default_factory=list)
     errors: List[str] = field(default_factory=list)
     warnings: List[str] = field(default_factory=list)
@@ -36,38 +42,68 @@ class CalculationContext:
 class CalculationEngine:
     """计算引擎主类"""
 
-    def __init__(self, workbook_manager: WorkbookManager):
+    # 支持的计算后端
+    BACKENDS = ("python", "numpy")
+
+    def __init__(self, workbook_manager: WorkbookManager, backend: str = "python",
+                 profile: bool = False):
         """
         初始化计算引擎
 
         Args:
             workbook_manager: 工作簿管理器
+            backend: 全量计算后端，"python"逐个公式计算，"numpy"对线性公式使用稀疏矩阵批量计算
+            profile: 是否记录各计算阶段的耗时（见get_profile_report）
         """
+        if backend not in self.BACKENDS:
+            raise ValueError(f"不支持的计算后端: {backend}")
+
         self.workbook_manager = workbook_manager
+        self.backend = backend
         self.calculation_context = CalculationContext(workbook_manager)
 
+        # 公式编译器（全局共享缓存，同一公式文本只解析一次）
+        self.formula_compiler = get_default_compiler()
+
+        # 公式依赖图（用于拓扑排序和增量重算）
+        self.dependency_graph = FormulaDependencyGraph()
+        self._dependency_graph_built = False
+        self._dependency_graph_signature: Optional[Tuple[Tuple[str, str], ...]] = None
+        self._target_name_index: Dict[Tuple[str, str], str] = {}  # (工作表名, 项目名) -> 目标项ID
+
+        # 向量化后端（按需创建）
+        self.vectorized_calculator: Optional[VectorizedCalculator] = None
+
+        # 性能分析（按需开启）
+        self.profiler: Optional[CalculationProfiler] = CalculationProfiler() if profile else None
+
         # 计算统计
         self.total_formulas = 0
         self.successful_calculations = 0
         self.failed_calculations = 0
         self.calculation_time = 0.0
 
-    def build_value_map(self) -> Dict[str, Any]:
+    def get_reference_index(self) -> ReferenceIndex:
         """
-        构建引用值映射表
+        获取来源项引用索引（按需构建，数据源变化后由invalidate_cache重置）
 
         Returns:
-            Dict[str, Any]: {引用字符串: 值}
+            ReferenceIndex: 引用索引
         """
-        value_map = {}
+        if self.calculation_context.reference_index is None:
+            self.calculation_context.reference_index = ReferenceIndex.from_source_items(
+                self.workbook_manager.source_items
+            )
+        return self.calculation_context.reference_index
 
-        for source_id, source in self.workbook_manager.source_items.items():
-            # 为每个来源项创建引用
-            if source.value is not None:
-                reference = build_formula_reference_v2(source.sheet_name, source.name, source.cell_address)
-                value_map[reference] = source.value
+    def build_value_map(self) -> Dict[str, Any]:
+        """
+        构建引用值映射表（包含主要数值及data_columns中每一列的引用）
 
-        return value_map
+        Returns:
+            Dict[str, Any]: {引用字符串: 值}
+        """
+        return self.get_reference_index().to_value_map()
 
     def validate_all_formulas(self) -> Dict[str, Tuple[bool, Optional[str]]]:
         """
@@ -79,7 +115,8 @@ class CalculationEngine:
         results = {}
 
         for target_id, formula in self.workbook_manager.mapping_formulas.items():
-            is_valid, error_msg = validate_formula_syntax_v2(formula.formula)
+            compiled, error_msg = self.compile_formula(formula.formula)
+            is_valid = compiled is not None
             results[target_id] = (is_valid, error_msg)
 
             # 更新公式状态
@@ -90,6 +127,127 @@ class CalculationEngine:
 
         return results
 
+    def compile_formula(self, formula_text: str) -> Tuple[Optional[CompiledFormula], Optional[str]]:
+        """
+        编译公式（带缓存），校验规则与validate_formula_syntax_v2一致
+
+        Args:
+            formula_text: 公式文本
+
+        Returns:
+            Tuple[Optional[CompiledFormula], Optional[str]]: (编译结果, 错误信息)
+        """
+        if not formula_text or not formula_text.strip():
+            return None, "公式不能为空"
+
+        try:
+            compiled = self.formula_compiler.compile(formula_text)
+        except FormulaSyntaxError as e:
+            return None, str(e)
+
+        if not compiled.references:
+            return None, "公式中未发现有效的引用"
+
+        return compiled, None
+
+    def _lookup_reference(self, ref_data: Dict[str, str]) -> Tuple[Optional[Tuple[str, str]], Optional[str]]:
+        """
+        解析引用的指向：精确索引 -> 快报表目标项 -> 模糊匹配
+
+        Args:
+            ref_data: 引用信息
+
+        Returns:
+            Tuple[Optional[Tuple[str, str]], Optional[str]]: (来源项索引条目, 目标项ID)
+        """
+        index = self.get_reference_index()
+
+        entry = index.lookup(ref_data)
+        if entry is not None:
+            return entry, None
+
+        # 引用快报表中其他目标项的计算结果
+        upstream_id = self._get_target_name_index().get((ref_data['sheet_name'], ref_data['item_name']))
+        if upstream_id is not None:
+            return None, upstream_id
+
+        return index.fuzzy_lookup(ref_data), None
+
+    def _resolve_slot_values(self, compiled: CompiledFormula) -> Tuple[Optional[List[float]], Optional[str]]:
+        """
+        按引用槽位取值
+
+        Args:
+            compiled: 编译后的公式
+
+        Returns:
+            Tuple[Optional[List[float]], Optional[str]]: (槽位值列表, 错误信息)
+        """
+        index = self.get_reference_index()
+        values = []
+
+        for ref_data in compiled.references:
+            full_ref = ref_data['full_reference']
+            entry, upstream_id = self._lookup_reference(ref_data)
+
+            if upstream_id is not None:
+                value = self._get_target_value(upstream_id)
+                if value is None:
+                    return None, f"引用的目标项尚未计算成功: {full_ref}"
+            elif entry is not None:
+                value = index.value_of(entry)
+            else:
+                value = None
+
+            if value is None:
+                return None, f"未找到引用: {full_ref}"
+
+            # 确保值是数字
+            if not isinstance(value, (int, float)):
+                try:
+                    value = float(value)
+                except (ValueError, TypeError):
+                    return None, f"引用值不是数字: {full_ref} = {value}"
+
+            values.append(value)
+
+        return values, None
+
+    def evaluate_compiled_formula(self, compiled: CompiledFormula) -> Tuple[bool, Union[float, str]]:
+        """
+        计算编译后的公式
+
+        Args:
+            compiled: 编译后的公式
+
+        Returns:
+            Tuple[bool, Union[float, str]]: (成功标志, 计算结果或错误信息)
+        """
+        values, error_msg = self._resolve_slot_values(compiled)
+        if values is None:
+            return False, error_msg
+
+        try:
+            return True, compiled.evaluate(values)
+        except Exception as e:
+            return False, f"计算错误: {str(e)}"
+
+    def _get_target_name_index(self) -> Dict[Tuple[str, str], str]:
+        """获取目标项名称索引 {(工作表名, 项目名): 目标项ID}"""
+        if not self._target_name_index and self.workbook_manager.target_items:
+            for target_id, target in self.workbook_manager.target_items.items():
+                self._target_name_index.setdefault((target.sheet_name, target.name.strip()), target_id)
+        return self._target_name_index
+
+    def _get_target_value(self, target_id: str) -> Optional[float]:
+        """获取目标项当前的计算结果"""
+        result = self.workbook_manager.calculation_results.get(target_id)
+        if result is not None:
+            return result.result if result.success else None
+
+        formula = self.workbook_manager.mapping_formulas.get(target_id)
+        return formula.calculation_result if formula else None
+
     def calculate_single_formula(self, target_id: str,
                                 formula_obj: MappingFormula) -> CalculationResult:
         """
@@ -103,29 +261,31 @@ class CalculationEngine:
             CalculationResult: 计算结果
         """
         try:
-            # 验证公式
-            is_valid, error_msg = validate_formula_syntax_v2(formula_obj.formula)
-            if not is_valid:
-                return CalculationResult(
-                    target_id=target_id,
-                    success=False,
-                    error_message=error_msg,
-                    calculation_time=0.0
-                )
-
-            # 构建值映射
-            if not self.calculation_context.value_cache:
-                self.calculation_context.value_cache = self.build_value_map()
-
-            # 计算公式
-            start_time = datetime.now()
-            success, result = evaluate_formula_with_values_v2(
-                formula_obj.formula,
-                self.calculation_context.value_cache
-            )
-            end_time = datetime.now()
+            start_ns = perf_counter_ns()
+
+            # 编译公式（同时完成语法验证）
+            compiled, error_msg = self.compile_formula(formula_obj.formula)
+            validated_ns = perf_counter_ns()
+            resolved_ns = evaluated_ns = validated_ns
+
+            success = False
+            result = error_msg
+            if compiled is not None:
+                # 按槽位取值并执行字节码
+                values, error_msg = self._resolve_slot_values(compiled)
+                resolved_ns = perf_counter_ns()
+
+                if values is None:
+                    result = error_msg
+                else:
+                    try:
+                        result = compiled.evaluate(values)
+                        success = True
+                    except Exception as e:
+                        result = f"计算错误: {str(e)}"
+                evaluated_ns = perf_counter_ns()
 
-            calculation_time = (end_time - start_time).total_seconds() * 1000  # 毫秒
+            calculation_time = (evaluated_ns - validated_ns) / 1e6  # 毫秒
 
             if success:
                 # 更新公式状态
@@ -133,20 +293,31 @@ class CalculationEngine:
                 formula_obj.calculation_result = result
                 formula_obj.last_calculated = datetime.now()
 
-                return CalculationResult(
+                calculation_result = CalculationResult(
                     target_id=target_id,
                     success=True,
                     result=result,
                     calculation_time=calculation_time
                 )
             else:
-                return CalculationResult(
+                calculation_result = CalculationResult(
                     target_id=target_id,
                     success=False,
                     error_message=str(result),
                     calculation_time=calculation_time
                 )
 
+            if self.profiler is not None:
+                target = self.workbook_manager.target_items.get(target_id)
+                self.profiler.record(
+                    target_id, target.sheet_name if target else "", formula_obj.formula,
+                    (validated_ns - start_ns, resolved_ns - validated_ns,
+                     evaluated_ns - resolved_ns, perf_counter_ns() - evaluated_ns),
+                    success
+                )
+
+            return calculation_result
+
         except Exception as e:
             return CalculationResult(
                 target_id=target_id,
@@ -155,17 +326,242 @@ class CalculationEngine:
                 calculation_time=0.0
             )
 
-    def calculate_all_formulas(self, show_progress: bool = True) -> List[CalculationResult]:
+    def _resolve_reference_owner(self, ref_data: Dict[str, str]) -> Tuple[Optional[str], Optional[str]]:
+        """
+        确定引用指向的来源项或目标项（与_resolve_slot_values的取值顺序一致）
+
+        Args:
+            ref_data: 引用信息
+
+        Returns:
+            Tuple[Optional[str], Optional[str]]: (来源项ID, 目标项ID)
+        """
+        entry, upstream_id = self._lookup_reference(ref_data)
+        if entry is not None:
+            return entry[0], None
+        return None, upstream_id
+
+    def _register_formula_dependencies(self, target_id: str, formula_text: str):
+        """将公式的依赖登记到依赖图"""
+        source_ids = set()
+        upstream_ids = set()
+
+        compiled, _ = self.compile_formula(formula_text)
+        if compiled is not None:
+            for ref_data in compiled.references:
+                source_id, upstream_id = self._resolve_reference_owner(ref_data)
+                if source_id is not None:
+                    source_ids.add(source_id)
+                elif upstream_id is not None:
+                    upstream_ids.add(upstream_id)
+
+        self.dependency_graph.set_formula_dependencies(target_id, source_ids, upstream_ids)
+
+    def build_dependency_graph(self) -> List[List[str]]:
+        """
+        根据所有映射公式重建依赖图
+
+        Returns:
+            List[List[str]]: 检测到的循环引用
+        """
+        self.dependency_graph.clear()
+
+        for target_id, formula in self.workbook_manager.mapping_formulas.items():
+            self._register_formula_dependencies(target_id, formula.formula)
+
+        self._dependency_graph_built = True
+        self._dependency_graph_signature = self._get_formulas_signature()
+
+        cycles = self.dependency_graph.find_cycles()
+        for cycle in cycles:
+            self.calculation_context.warnings.append(
+                f"检测到循环引用: {self._format_cycle(cycle)}"
+            )
+
+        return cycles
+
+    def _get_formulas_signature(self) -> Tuple[Tuple[str, str], ...]:
+        """当前所有公式的签名，用于判断依赖图是否需要重建"""
+        return tuple((target_id, formula.formula)
+                     for target_id, formula in self.workbook_manager.mapping_formulas.items())
+
+    def _ensure_dependency_graph(self, check_formulas: bool = False):
+        """
+        确保依赖图已构建
+
+        Args:
+            check_formulas: 是否检查公式集合是否在引擎之外被修改
+        """
+        if (not self._dependency_graph_built or
+                (check_formulas and self._dependency_graph_signature != self._get_formulas_signature())):
+            self.build_dependency_graph()
+        elif check_formulas:
+            # 依赖图可复用，仍需报告已知的循环引用
+            for cycle in self.dependency_graph.find_cycles():
+                self.calculation_context.warnings.append(
+                    f"检测到循环引用: {self._format_cycle(cycle)}"
+                )
+
+    def _format_cycle(self, cycle: List[str]) -> str:
+        """格式化循环引用描述"""
+        names = []
+        for target_id in cycle:
+            target = self.workbook_manager.target_items.get(target_id)
+            names.append(target.name if target else target_id)
+        return " -> ".join(names + names[:1])
+
+    def _calculate_in_order(self, target_ids, show_progress: bool = False) -> Dict[str, CalculationResult]:
+        """
+        按依赖顺序计算一组公式，循环引用中的公式及其下游直接标记为失败
+
+        Args:
+            target_ids: 需要计算的公式目标项ID
+            show_progress: 是否显示进度
+
+        Returns:
+            Dict[str, CalculationResult]: {target_id: 计算结果}
+        """
+        target_ids = set(target_ids)
+        order, cycles = self.dependency_graph.topological_order(target_ids)
+        total = len(target_ids)
+        results = {}
+
+        for i, target_id in enumerate(order):
+            if show_progress and (i + 1) % 10 == 0:
+                print(f"进度: {i + 1}/{total}")
+
+            formula = self.workbook_manager.mapping_formulas.get(target_id)
+            if formula is None:
+                continue
+
+            result = self.calculate_single_formula(target_id, formula)
+            self.workbook_manager.calculation_results[target_id] = result
+            results[target_id] = result
+
+        # 无法排序的公式：处于循环中或依赖循环
+        cycle_members = {}
+        for cycle in cycles:
+            description = self._format_cycle(cycle)
+            for target_id in cycle:
+                cycle_members[target_id] = description
+
+        for target_id in target_ids.difference(order):
+            if target_id not in self.workbook_manager.mapping_formulas:
+                continue
+
+            if target_id in cycle_members:
+                error_message = f"循环引用: {cycle_members[target_id]}"
+            else:
+                error_message = "依赖的目标项存在循环引用"
+
+            result = CalculationResult(
+                target_id=target_id,
+                success=False,
+                error_message=error_message,
+                formula_used=self.workbook_manager.mapping_formulas[target_id].formula
+            )
+            self.workbook_manager.calculation_results[target_id] = result
+            results[target_id] = result
+
+        return results
+
+    def _calculate_vectorized(self) -> Dict[str, CalculationResult]:
+        """
+        使用向量化后端一次性计算所有线性公式
+
+        Returns:
+            Dict[str, CalculationResult]: {target_id: 计算结果}，未包含的公式需走标量路径
+        """
+        if self.vectorized_calculator is None:
+            self.vectorized_calculator = VectorizedCalculator(self.workbook_manager)
+
+        compiled_formulas = {}
+        for target_id, formula in self.workbook_manager.mapping_formulas.items():
+            compiled, _ = self.compile_formula(formula.formula)
+            if compiled is not None and compiled.is_linear:
+                compiled_formulas[target_id] = compiled
+
+        start_ns = perf_counter_ns()
+        target_ids = self.vectorized_calculator.compile_formulas(compiled_formulas)
+        values = self.vectorized_calculator.evaluate()
+        elapsed_ns = perf_counter_ns() - start_ns
+
+        if self.profiler is not None:
+            self.profiler.record_vectorized(len(target_ids), elapsed_ns)
+
+        # 批量计算耗时均摊到每个公式（毫秒）
+        calculation_time = elapsed_ns / 1e6 / len(target_ids) if target_ids else 0.0
+
+        results = {}
+        calculated_time = datetime.now()
+        for target_id, value in zip(target_ids, values.tolist()):
+            formula_obj = self.workbook_manager.mapping_formulas[target_id]
+            formula_obj.status = FormulaStatus.CALCULATED
+            formula_obj.calculation_result = value
+            formula_obj.last_calculated = calculated_time
+
+            result = CalculationResult(
+                target_id=target_id,
+                success=True,
+                result=value,
+                calculation_time=calculation_time
+            )
+            self.workbook_manager.calculation_results[target_id] = result
+            results[target_id] = result
+
+        return results
+
+    def _calculate_parallel(self, target_ids: List[str], max_workers: int, partition_by: str,
+                            show_progress: bool = False) -> Dict[str, CalculationResult]:
         """
-        计算所有公式
+        将公式按依赖关系分组后在进程池中并行计算，无法使用进程池时退回单进程计算
 
         Args:
+            target_ids: 需要计算的公式目标项ID
+            max_workers: 进程数
+            partition_by: 分组方式，"component"或"sheet"
             show_progress: 是否显示进度
 
+        Returns:
+            Dict[str, CalculationResult]: {target_id: 计算结果}
+        """
+        calculator = ParallelCalculator(self.workbook_manager, max_workers)
+        tasks = calculator.partition(target_ids, self.dependency_graph, partition_by)
+
+        if len(tasks) > 1:
+            if show_progress:
+                print(f"并行计算: {len(tasks)} 个任务, {max_workers} 个进程")
+            try:
+                results = calculator.calculate(tasks, self.dependency_graph, show_progress)
+                calculator.apply_results(results)
+                return results
+            except Exception as e:
+                self.calculation_context.warnings.append(f"并行计算失败，改为单进程计算: {str(e)}")
+                if show_progress:
+                    print(f"并行计算失败，改为单进程计算: {str(e)}")
+
+        return self._calculate_in_order(target_ids, show_progress)
+
+    def calculate_all_formulas(self, show_progress: bool = True,
+                               backend: Optional[str] = None,
+                               max_workers: Optional[int] = None,
+                               partition_by: str = "component") -> List[CalculationResult]:
+        """
+        计算所有公式（按依赖关系的拓扑顺序）
+
+        Args:
+            show_progress: 是否显示进度
+            backend: 计算后端，None表示使用引擎默认后端
+            max_workers: 并行计算的进程数，None或1表示单进程计算
+            partition_by: 并行计算时的分组方式，"component"按依赖图连通分量，"sheet"按快报工作表
+
         Returns:
             List[CalculationResult]: 计算结果列表
         """
-        results = []
+        backend = backend or self.backend
+        if backend not in self.BACKENDS:
+            raise ValueError(f"不支持的计算后端: {backend}")
+
         self.calculation_context.errors.clear()
         self.calculation_context.warnings.clear()
 
@@ -173,21 +569,40 @@ class CalculationEngine:
         self.total_formulas = len(self.workbook_manager.mapping_formulas)
         self.successful_calculations = 0
         self.failed_calculations = 0
+        if self.profiler is not None:
+            self.profiler.reset()
 
         start_time = datetime.now()
 
         if show_progress:
             print(f"开始计算 {self.total_formulas} 个公式...")
 
-        for i, (target_id, formula) in enumerate(self.workbook_manager.mapping_formulas.items()):
-            if show_progress and (i + 1) % 10 == 0:
-                print(f"进度: {i + 1}/{self.total_formulas}")
+        # 公式集合变化时重建依赖图，保证与当前公式一致
+        self._ensure_dependency_graph(check_formulas=True)
+        self.dependency_graph.pop_dirty()
 
-            result = self.calculate_single_formula(target_id, formula)
-            results.append(result)
+        if backend == "numpy":
+            # 引用全部命中来源项槽位的线性公式一次矩阵乘法算完，其余公式按拓扑顺序标量计算
+            results_by_id = self._calculate_vectorized()
+            remaining = [tid for tid in self.workbook_manager.mapping_formulas if tid not in results_by_id]
+            if show_progress:
+                print(f"向量化计算 {len(results_by_id)} 个公式，标量计算 {len(remaining)} 个公式")
+        else:
+            results_by_id = {}
+            remaining = list(self.workbook_manager.mapping_formulas.keys())
 
-            # 将计算结果存储到workbook_manager中
-            self.workbook_manager.calculation_results[target_id] = result
+        if max_workers is not None and max_workers > 1:
+            results_by_id.update(self._calculate_parallel(remaining, max_workers, partition_by, show_progress))
+        else:
+            results_by_id.update(self._calculate_in_order(remaining, show_progress))
+
+        # 按公式原始顺序返回结果
+        results = []
+        for target_id in self.workbook_manager.mapping_formulas:
+            result = results_by_id.get(target_id)
+            if result is None:
+                continue
+            results.append(result)
 
             if result.success:
                 self.successful_calculations += 1
@@ -206,6 +621,91 @@ class CalculationEngine:
 
         return results
 
+    def mark_source_changed(self, source_id: str) -> List[str]:
+        """
+        标记来源项数值已变化（同步引用索引），返回受影响的公式
+
+        Args:
+            source_id: 来源项ID
+
+        Returns:
+            List[str]: 需要重新计算的目标项ID
+        """
+        # 索引只保存来源项ID，数值变化时直接读取新值；这里处理有效列的增减
+        if self.calculation_context.reference_index is not None:
+            self.calculation_context.reference_index.update_source(source_id)
+
+        if self.vectorized_calculator is not None:
+            self.vectorized_calculator.update_source_values(source_id)
+
+        self._ensure_dependency_graph()
+        affected = self.dependency_graph.mark_source_changed(source_id)
+        return sorted(affected, key=lambda tid: self.dependency_graph.formula_order.get(tid, 0))
+
+    def apply_extraction_diff(self, diff: ExtractionDiff) -> List[str]:
+        """
+        数据增量重新提取后同步引擎缓存，只把受影响的公式标记为脏（随后调用recalculate_dirty）
+
+        变化前的依赖图给出引用了被删除/被修改数据项的公式，按新数据重建依赖图后再找出
+        引用了新增/被修改数据项的公式（包括原来无法解析、现在能解析的引用）
+
+        Args:
+            diff: DataExtractor.refresh_changed_sheets返回的差异
+
+        Returns:
+            List[str]: 需要重新计算的目标项ID
+        """
+        if not self._dependency_graph_built:
+            # 尚未计算过，没有需要保留的中间结果
+            self.invalidate_cache()
+            return []
+
+        graph = self.dependency_graph
+        affected = graph.pop_dirty()
+        for source_id in diff.removed_sources + diff.modified_sources:
+            affected |= graph.mark_source_changed(source_id)
+        for target_id in diff.removed_targets + diff.modified_targets:
+            affected |= graph.mark_target_changed(target_id)
+
+        self.invalidate_cache()
+        self._ensure_dependency_graph()
+        graph = self.dependency_graph
+
+        for source_id in diff.added_sources + diff.modified_sources:
+            affected |= graph.mark_source_changed(source_id)
+        for target_id in diff.added_targets + diff.modified_targets:
+            affected |= graph.mark_target_changed(target_id)
+        for target_id in list(affected):
+            affected |= graph.mark_formula_changed(target_id)
+
+        for target_id in diff.removed_targets:
+            self.workbook_manager.calculation_results.pop(target_id, None)
+
+        affected &= set(graph.formula_sources)
+        return sorted(affected, key=lambda tid: graph.formula_order.get(tid, 0))
+
+    def recalculate_dirty(self, show_progress: bool = False) -> List[CalculationResult]:
+        """
+        只重新计算被标记为脏的公式（按拓扑顺序）
+
+        Args:
+            show_progress: 是否显示进度
+
+        Returns:
+            List[CalculationResult]: 本次重新计算的结果
+        """
+        self._ensure_dependency_graph()
+        dirty = self.dependency_graph.pop_dirty()
+        if not dirty:
+            return []
+
+        if show_progress:
+            print(f"增量计算 {len(dirty)} 个公式...")
+
+        results_by_id = self._calculate_in_order(dirty, show_progress)
+        order = self.dependency_graph.formula_order
+        return [results_by_id[tid] for tid in sorted(results_by_id, key=lambda tid: order.get(tid, 0))]
+
     def get_calculation_summary(self) -> Dict[str, Any]:
         """
         获取计算摘要
@@ -222,9 +722,48 @@ class CalculationEngine:
             ) if self.total_formulas > 0 else 0.0,
             "calculation_time": round(self.calculation_time, 3),
             "errors_count": len(self.calculation_context.errors),
-            "warnings_count": len(self.calculation_context.warnings)
+            "warnings_count": len(self.calculation_context.warnings),
+            "cache_stats": self.get_cache_stats()
         }
 
+    def get_cache_stats(self) -> Dict[str, Any]:
+        """
+        获取公式编译缓存和引用索引的命中情况
+
+        Returns:
+            Dict[str, Any]: 缓存统计
+        """
+        stats = {"formula_compiler": self.formula_compiler.get_cache_stats()}
+        if self.calculation_context.reference_index is not None:
+            stats["reference_index"] = self.calculation_context.reference_index.get_statistics()
+        return stats
+
+    def enable_profiling(self, enabled: bool = True):
+        """
+        开启或关闭性能分析（开启时清空已有记录）
+
+        Args:
+            enabled: 是否开启
+        """
+        self.profiler = CalculationProfiler() if enabled else None
+
+    def get_profile_report(self, top_n: int = 10) -> Optional[Dict[str, Any]]:
+        """
+        获取性能分析报告：各阶段耗时按工作表和公式形态汇总、最慢的公式及缓存命中率
+
+        Args:
+            top_n: 列出的最慢公式和形态数量
+
+        Returns:
+            Optional[Dict[str, Any]]: 报告，未开启性能分析时返回None
+        """
+        if self.profiler is None:
+            return None
+
+        report = self.profiler.get_report(top_n)
+        report["cache_stats"] = self.get_cache_stats()
+        return report
+
     def export_results_to_json(self, file_path: str) -> bool:
         """
         导出计算结果到JSON文件
@@ -299,6 +838,7 @@ class CalculationEngine:
         Returns:
             bool: 是否成功
         """
+        session = None
         try:
             # 确定源文件
             if source_file_path is None:
@@ -308,8 +848,12 @@ class CalculationEngine:
             backup_path = backup_excel_file(source_file_path)
             print(f"已创建备份文件: {backup_path}")
 
-            # 打开工作簿
-            workbook = openpyxl.load_workbook(source_file_path)
+            # 打开工作簿（导出原文件时复用工作簿会话，保留公式的模式）
+            if os.path.abspath(source_file_path) == os.path.abspath(self.workbook_manager.file_path or ""):
+                session = self.workbook_manager.get_session()
+                workbook = session.get_workbook(data_only=False)
+            else:
+                workbook = openpyxl.load_workbook(source_file_path)
 
             # 准备写入的值
             values_to_write = {}
@@ -343,12 +887,18 @@ class CalculationEngine:
 
             # 保存工作簿
             workbook.save(target_file_path)
-            workbook.close()
+            if session is not None:
+                # 已写入计算结果，与磁盘上的原文件不再一致
+                session.release(data_only=False)
+            else:
+                workbook.close()
 
             print(f"成功导出 {updated_count} 个计算结果到 {target_file_path}")
             return True
 
         except Exception as e:
+            if session is not None:
+                session.release(data_only=False)
             self.calculation_context.errors.append(f"导出Excel失败: {str(e)}")
             return False
 
@@ -475,8 +1025,8 @@ class CalculationEngine:
         else:
             formulas_to_preview = self.workbook_manager.mapping_formulas
 
-        # 构建值映射
-        value_map = self.build_value_map()
+        # 引用索引
+        reference_index = self.get_reference_index()
 
         # 计算预览
         for target_id, formula in formulas_to_preview.items():
@@ -489,7 +1039,11 @@ class CalculationEngine:
             }
 
             # 尝试计算
-            success, result = evaluate_formula_with_values_v2(formula.formula, value_map)
+            compiled, error_msg = self.compile_formula(formula.formula)
+            if compiled is None:
+                success, result = False, error_msg
+            else:
+                success, result = self.evaluate_compiled_formula(compiled)
 
             if success:
                 preview_data["preview_result"] = result
@@ -503,7 +1057,7 @@ class CalculationEngine:
         return {
             "total_previewed": len(preview_results),
             "results": preview_results,
-            "value_map_size": len(value_map)
+            "value_map_size": len(reference_index)
         }
 
     def calculate_formula_realtime(self, formula_text: str,
@@ -533,8 +1087,9 @@ class CalculationEngine:
         try:
             start_time = datetime.now()
 
-            # 1. 验证公式语法
-            is_valid, validation_error = validate_formula_syntax_v2(formula_text)
+            # 1. 编译公式（同时验证语法）
+            compiled, validation_error = self.compile_formula(formula_text)
+            is_valid = compiled is not None
             result["validation"]["is_valid"] = is_valid
             result["validation"]["error_message"] = validation_error
 
@@ -542,22 +1097,11 @@ class CalculationEngine:
                 result["error"] = f"语法错误: {validation_error}"
                 return result
 
-            # 2. 解析公式引用
-            try:
-                references = parse_formula_references_v2(formula_text)
-                result["references"] = references
-            except Exception as e:
-                result["error"] = f"引用解析错误: {str(e)}"
-                return result
-
-            # 3. 构建值映射表（使用缓存以提高性能）
-            if not self.calculation_context.value_cache:
-                self.calculation_context.value_cache = self.build_value_map()
+            # 2. 公式引用（编译时已解析）
+            result["references"] = list(compiled.references)
 
-            value_map = self.calculation_context.value_cache
-
-            # 4. 计算公式
-            success, calc_result = evaluate_formula_with_values_v2(formula_text, value_map)
+            # 3. 计算公式（通过引用索引取值）
+            success, calc_result = self.evaluate_compiled_formula(compiled)
 
             if success:
                 result["success"] = True
@@ -565,7 +1109,7 @@ class CalculationEngine:
             else:
                 result["error"] = f"计算错误: {str(calc_result)}"
 
-            # 5. 计算耗时
+            # 4. 计算耗时
             end_time = datetime.now()
             result["calculation_time"] = (end_time - start_time).total_seconds() * 1000
 
@@ -579,11 +1123,17 @@ class CalculationEngine:
         清除缓存（当数据源发生变化时调用）
         """
         self.calculation_context.value_cache.clear()
+        self.calculation_context.reference_index = None
+        self._target_name_index.clear()
+        self._dependency_graph_built = False
+        self._dependency_graph_signature = None
+        if self.vectorized_calculator is not None:
+            self.vectorized_calculator.invalidate()
 
     def update_formula_realtime(self, target_id: str, formula_text: str,
                               auto_validate: bool = True) -> bool:
         """
-        实时更新公式（立即生效）
+        实时更新公式（立即生效，只重算该公式及其下游公式）
 
         Args:
             target_id: 目标项ID
@@ -594,36 +1144,46 @@ class CalculationEngine:
             bool: 是否更新成功
         """
         try:
+            self._ensure_dependency_graph()
+
             # 1. 确保有映射公式对象
             if target_id not in self.workbook_manager.mapping_formulas:
                 self.workbook_manager.mapping_formulas[target_id] = MappingFormula(
-                    target_id=target_id
+                    target_id=target_id,
+                    formula=formula_text
                 )
 
             formula_obj = self.workbook_manager.mapping_formulas[target_id]
 
-            # 2. 更新公式文本
+            # 2. 更新公式文本并刷新依赖
             formula_obj.formula = formula_text
+            self._register_formula_dependencies(target_id, formula_text)
+            self._dependency_graph_signature = self._get_formulas_signature()
+            self.dependency_graph.mark_formula_changed(target_id)
 
             if auto_validate and formula_text.strip():
                 # 3. 自动验证
-                is_valid, error_msg = validate_formula_syntax_v2(formula_text)
+                compiled, error_msg = self.compile_formula(formula_text)
 
-                if is_valid:
-                    formula_obj.status = FormulaStatus.VALID
-                    formula_obj.validation_error = None
+                if compiled is not None:
+                    formula_obj.status = FormulaStatus.VALIDATED
+                    formula_obj.validation_error = ""
 
-                    # 4. 立即计算
-                    calc_result = self.calculate_single_formula(target_id, formula_obj)
-                    return calc_result.success
+                    # 4. 立即计算该公式及受影响的下游公式
+                    self.recalculate_dirty()
+                    calc_result = self.workbook_manager.calculation_results.get(target_id)
+                    return bool(calc_result and calc_result.success)
                 else:
                     formula_obj.status = FormulaStatus.ERROR
                     formula_obj.validation_error = error_msg
                     formula_obj.calculation_result = None
+
+                    # 下游公式引用了该目标项，同样需要刷新
+                    self.recalculate_dirty()
                     return False
             else:
-                # 仅更新，不验证
-                formula_obj.status = FormulaStatus.DRAFT
+                # 仅更新，不验证（脏标记保留到下次增量计算）
+                formula_obj.status = FormulaStatus.PENDING
                 return True
 
         except Exception as e:
@@ -679,31 +1239,29 @@ class CalculationEngine:
 
     def optimize_calculation_order(self) -> List[str]:
         """
-        优化计算顺序（基于依赖关系）
+        优化计算顺序（基于依赖关系的拓扑排序）
 
         Returns:
-            List[str]: 优化后的目标项ID列表
+            List[str]: 优化后的目标项ID列表（不包含处于循环引用中的公式）
         """
-        # 简化版本：按层级排序，避免循环依赖
-        target_levels = []
-
-        for target_id, target in self.workbook_manager.target_items.items():
-            if target_id in self.workbook_manager.mapping_formulas:
-                target_levels.append((target.hierarchical_level or 1, target_id))
-
-        # 按层级排序：先计算低层级的项目
-        target_levels.sort(key=lambda x: x[0])
-        return [target_id for level, target_id in target_levels]
+        self._ensure_dependency_graph()
+        order, cycles = self.dependency_graph.topological_order()
+        self.calculation_context.calculation_order = order
+        return order
 
 
-def create_calculation_engine(workbook_manager: WorkbookManager) -> CalculationEngine:
+def create_calculation_engine(workbook_manager: WorkbookManager,
+                              backend: str = "python",
+                              profile: bool = False) -> CalculationEngine:
     """
     创建计算引擎实例
 
     Args:
         workbook_manager: 工作簿管理器
+        backend: 全量计算后端（"python" 或 "numpy"）
+        profile: 是否开启性能分析
 
     Returns:
         CalculationEngine: 计算引擎实例
     """
-    return CalculationEngine(workbook_manager)
\ No newline at end of file
+    return CalculationEngine(workbook_manager, backend, profile)
\ No newline at end of file
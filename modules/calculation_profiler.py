@@ -0,0 +1,196 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+计算性能分析模块
+以 perf_counter_ns 记录每个公式在 验证(编译) / 引用解析 / 求值 / 结果写回 各阶段的耗时，
+按快报工作表和公式形态汇总，并保留最慢的若干公式
+"""
+
+import heapq
+import re
+from typing import Any, Dict, List, Tuple
+
+from utils.formula_compiler import REFERENCE_PATTERN, NUMBER_PATTERN
+
+
+# 计算阶段
+PHASES = ("validation", "resolution", "evaluation", "write_back")
+
+_WHITESPACE_PATTERN = re.compile(r'\s+')
+
+
+def formula_shape(formula: str) -> str:
+    """
+    公式形态：引用替换为R、数字替换为N并去掉空白，如 "R+R*N"
+
+    Args:
+        formula: 公式字符串
+
+    Returns:
+        str: 公式形态
+    """
+    shape = REFERENCE_PATTERN.sub('R', formula)
+    shape = NUMBER_PATTERN.sub('N', shape)
+    return _WHITESPACE_PATTERN.sub('', shape)
+
+
+class _PhaseTotals:
+    """一组公式的各阶段累计耗时"""
+
+    __slots__ = ("count", "failed", "phase_ns")
+
+    def __init__(self):
+        self.count = 0
+        self.failed = 0
+        self.phase_ns = [0, 0, 0, 0]
+
+    def add(self, phase_ns: Tuple[int, int, int, int], success: bool):
+        self.count += 1
+        if not success:
+            self.failed += 1
+        for i, ns in enumerate(phase_ns):
+            self.phase_ns[i] += ns
+
+    @property
+    def total_ns(self) -> int:
+        return sum(self.phase_ns)
+
+    def to_dict(self) -> Dict[str, Any]:
+        total_ns = self.total_ns
+        return {
+            "count": self.count,
+            "failed": self.failed,
+            "total_ms": round(total_ns / 1e6, 3),
+            "avg_us": round(total_ns / self.count / 1e3, 3) if self.count else 0.0,
+            "phases_ms": {phase: round(ns / 1e6, 3) for phase, ns in zip(PHASES, self.phase_ns)}
+        }
+
+
+class CalculationProfiler:
+    """公式计算性能分析器"""
+
+    def __init__(self, max_slowest: int = 50):
+        """
+        初始化性能分析器
+
+        Args:
+            max_slowest: 保留的最慢公式数量
+        """
+        self.max_slowest = max_slowest
+        self._shape_cache: Dict[str, str] = {}
+        self.reset()
+
+    def reset(self):
+        """清空已记录的数据"""
+        self.overall = _PhaseTotals()
+        self.by_sheet: Dict[str, _PhaseTotals] = {}
+        self.by_shape: Dict[str, _PhaseTotals] = {}
+        self._slowest: List[Tuple[int, str, str]] = []  # 最小堆 (总耗时ns, 目标项ID, 公式)
+
+        # 向量化后端的批量计算
+        self.vectorized_formulas = 0
+        self.vectorized_ns = 0
+
+    def record(self, target_id: str, sheet_name: str, formula: str,
+               phase_ns: Tuple[int, int, int, int], success: bool):
+        """
+        记录一个公式的各阶段耗时
+
+        Args:
+            target_id: 目标项ID
+            sheet_name: 目标项所在工作表
+            formula: 公式文本
+            phase_ns: 验证、引用解析、求值、结果写回的耗时（纳秒）
+            success: 是否计算成功
+        """
+        shape = self._shape_cache.get(formula)
+        if shape is None:
+            shape = formula_shape(formula)
+            self._shape_cache[formula] = shape
+
+        self.overall.add(phase_ns, success)
+
+        sheet_totals = self.by_sheet.get(sheet_name)
+        if sheet_totals is None:
+            sheet_totals = self.by_sheet[sheet_name] = _PhaseTotals()
+        sheet_totals.add(phase_ns, success)
+
+        shape_totals = self.by_shape.get(shape)
+        if shape_totals is None:
+            shape_totals = self.by_shape[shape] = _PhaseTotals()
+        shape_totals.add(phase_ns, success)
+
+        entry = (sum(phase_ns), target_id, formula)
+        if len(self._slowest) < self.max_slowest:
+            heapq.heappush(self._slowest, entry)
+        elif entry[0] > self._slowest[0][0]:
+            heapq.heapreplace(self._slowest, entry)
+
+    def record_vectorized(self, formula_count: int, elapsed_ns: int):
+        """记录向量化后端的一次批量计算"""
+        self.vectorized_formulas += formula_count
+        self.vectorized_ns += elapsed_ns
+
+    def get_report(self, top_n: int = 10) -> Dict[str, Any]:
+        """
+        生成性能分析报告
+
+        Args:
+            top_n: 报告中列出的最慢公式和形态数量
+
+        Returns:
+            Dict[str, Any]: 报告
+        """
+        slowest = sorted(self._slowest, reverse=True)[:top_n]
+        shapes = sorted(self.by_shape.items(), key=lambda item: item[1].total_ns, reverse=True)[:top_n]
+
+        return {
+            "overall": self.overall.to_dict(),
+            "by_sheet": {sheet: totals.to_dict() for sheet, totals in sorted(self.by_sheet.items())},
+            "by_shape": {shape: totals.to_dict() for shape, totals in shapes},
+            "slowest_formulas": [
+                {"target_id": target_id, "formula": formula, "time_us": round(ns / 1e3, 3)}
+                for ns, target_id, formula in slowest
+            ],
+            "vectorized": {
+                "formulas": self.vectorized_formulas,
+                "total_ms": round(self.vectorized_ns / 1e6, 3)
+            }
+        }
+
+    def format_report(self, top_n: int = 10) -> str:
+        """
+        生成文本格式的性能分析报告
+
+        Args:
+            top_n: 列出的最慢公式和形态数量
+
+        Returns:
+            str: 报告文本
+        """
+        report = self.get_report(top_n)
+        overall = report["overall"]
+        lines = [
+            "=== 公式计算性能分析 ===",
+            f"公式数: {overall['count']}, 失败: {overall['failed']}, "
+            f"总耗时: {overall['total_ms']:.3f} ms, 平均: {overall['avg_us']:.3f} μs",
+            "阶段耗时(ms): " + ", ".join(f"{phase} {ms:.3f}" for phase, ms in overall["phases_ms"].items())
+        ]
+
+        if report["vectorized"]["formulas"]:
+            lines.append(f"向量化计算: {report['vectorized']['formulas']} 个公式, "
+                         f"{report['vectorized']['total_ms']:.3f} ms")
+
+        lines.append("\n按工作表:")
+        for sheet, totals in report["by_sheet"].items():
+            lines.append(f"  {sheet}: {totals['count']} 个, {totals['total_ms']:.3f} ms")
+
+        lines.append("\n耗时最多的公式形态:")
+        for shape, totals in report["by_shape"].items():
+            lines.append(f"  {shape[:60]}: {totals['count']} 个, {totals['total_ms']:.3f} ms")
+
+        lines.append("\n最慢的公式:")
+        for item in report["slowest_formulas"]:
+            lines.append(f"  {item['target_id']}: {item['time_us']:.3f} μs  {item['formula'][:80]}")
+
+        return "\n".join(lines)
@@ -6,27 +6,80 @@
 
 import sys
 import os
+import io
+import contextlib
 import json
 import openpyxl
+from openpyxl.utils import range_boundaries
 import re
 from typing import List, Dict, Optional, Any, Tuple
 from datetime import datetime
+from concurrent.futures import ProcessPoolExecutor, as_completed
 
 sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 
 from models.data_models import (
-    WorkbookManager, TargetItem, SourceItem, SheetType, update_hierarchy_structure
+    WorkbookManager, TargetItem, SourceItemStore, SourceTable, SheetType, ExtractionDiff,
+    update_hierarchy_structure
 )
-from modules.table_schema_analyzer import TableSchemaAnalyzer, TableType, TableSchema
+from modules.table_schema_analyzer import TableSchemaAnalyzer, TableType, TableSchema, CHINESE_PATTERN
 from utils.column_detector import ColumnDetector
+from utils.extraction_cache import ExtractionCache
+from utils.table_column_rules import TableColumnRules
+from utils.pattern_rules import compile_any
+from utils.sheet_fingerprint import SheetFingerprint
+
+# 科目代码：3-12位数字，可带小数点分隔
+_ACCOUNT_CODE_PATTERN = re.compile(r'^\d{3,12}(\.\d+)*$')
+
+# 不是科目名称的文本（任意一个模式在开头匹配即排除）
+_ACCOUNT_NAME_EXCLUDE_PATTERN = compile_any([
+    r'^日期[:：]', r'^期间[:：]', r'^单位[:：]',
+    r'^科目代码$', r'^科目名称$', r'^期初$', r'^期末$',
+    r'^借方$', r'^贷方$', r'^合计$', r'^小计$',
+    r'^年初$', r'^本期$', r'^余额$', r'^发生额$',
+    r'^\d+$',  # 纯数字
+    r'^[\d\.,\s\-\(\)]+$'  # 纯数字格式
+], re.IGNORECASE)
+
+# 目标项编号：按顺序尝试 "1." "1 " "1、" "(1)"，每种形式两个分组(编号, 名称)
+_TARGET_NUMBERING_PATTERN = compile_any([
+    r'^(\d+)\.\s*(.+)',
+    r'^(\d+)\s+(.+)',
+    r'^(\d+)、\s*(.+)',
+    r'^\((\d+)\)\s*(.+)',
+])
+
+# 已加载的表格规则配置
+_table_rules_cache: Optional[Dict] = None
+
+# 流式模式下用于分析表格模式的表头样本行数（TableSchemaAnalyzer只检查前20行以内）
+SCHEMA_SAMPLE_ROWS = 30
+
 
 class DataExtractor:
     """增强的数据提取器"""
 
-    def __init__(self, workbook_manager: WorkbookManager):
-        """初始化数据提取器"""
+    def __init__(self, workbook_manager: WorkbookManager, streaming: bool = False,
+                 cache: Optional[ExtractionCache] = None, max_workers: int = 1):
+        """初始化数据提取器
+
+        Args:
+            workbook_manager: 工作簿管理器
+            streaming: 是否使用只读流式模式（适用于数万行的大型科目余额表，
+                不在内存中构建完整的单元格对象）
+            cache: 提取结果缓存，文件内容、工作表分类和表格规则都未变化时直接使用缓存结果
+            max_workers: 大于1时各工作表在进程池中并行提取（子进程使用只读模式）
+        """
         self.workbook_manager = workbook_manager
         self.workbook = None
+        self.streaming = streaming
+        self.cache = cache
+        self.max_workers = max_workers
+        # 流式模式下各工作表的表头样本（普通工作表，供表格模式分析和列头读取）
+        self._schema_sheets: Dict[str, Any] = {}
+        # 本次提取的各工作表内容指纹 (用途, 工作表名) -> 指纹
+        self._fingerprints: Dict[Tuple[str, str], str] = {}
         self.schema_analyzer = TableSchemaAnalyzer()
         self.column_detector = ColumnDetector()
 
@@ -34,26 +87,49 @@ class DataExtractor:
         self.table_rules = self._load_table_rules()
 
     def _load_table_rules(self) -> Dict:
-        """加载表格规则配置"""
+        """加载表格规则配置（每个进程只读取一次）"""
+        global _table_rules_cache
+        if _table_rules_cache is not None:
+            return _table_rules_cache
+
         try:
             rules_path = os.path.join(os.path.dirname(__file__), '..', 'data', 'table_schema_rules.json')
             with open(rules_path, 'r', encoding='utf-8') as f:
-                return json.load(f)
+                _table_rules_cache = json.load(f)
         except FileNotFoundError:
             print("警告：无法找到表格规则文件，使用默认规则")
-            return {"table_schemas": {}}
+            _table_rules_cache = {"table_schemas": {}}
+        return _table_rules_cache
 
     def extract_all_data(self) -> bool:
         """提取所有数据"""
         try:
             print("开始提取表格数据...")
 
+            # 文件未变化时直接使用缓存的提取结果，不再解析工作簿
+            if self.cache and self.cache.load_extraction(self.workbook_manager):
+                print(f"使用缓存的提取结果: 目标项 {len(self.workbook_manager.target_items)} 个, "
+                      f"来源项 {len(self.workbook_manager.source_items)} 个")
+                # 缓存的指纹对应当前文件内容，部件摘要需在下次增量提取时重新读取
+                self.workbook_manager.sheet_part_digests = {}
+                self.workbook_manager.invalidate_search_service()
+                self.workbook_manager.is_data_extracted = True
+                return True
+
+            # 并行模式：各工作表在子进程中提取，结果按工作表原有顺序合并
+            prefetched = None
+            if self.max_workers > 1 and self._sheet_count() > 1:
+                if not self.workbook_manager.file_path or not os.path.exists(self.workbook_manager.file_path):
+                    print("Excel文件不存在")
+                    return False
+                prefetched = self._extract_sheets_parallel()
+
             # 加载Excel文件
-            if not self._load_workbook():
+            if prefetched is None and not self._load_workbook():
                 return False
 
             # 提取快报表目标项
-            target_count = self._extract_flash_report_targets()
+            target_count = self._extract_flash_report_targets(prefetched)
             print(f"提取到目标项: {target_count} 个")
 
             # 计算层级关系
@@ -64,9 +140,17 @@ class DataExtractor:
                 print("X 层级关系计算失败")
 
             # 提取数据源项（使用增强逻辑）
-            source_count = self._extract_data_source_items_enhanced()
+            source_count = self._extract_data_source_items_enhanced(prefetched)
             print(f"提取到来源项: {source_count} 个")
 
+            self.workbook_manager.sheet_fingerprints = dict(self._fingerprints)
+            self.workbook_manager.sheet_part_digests = self._read_part_digests()
+            self.workbook_manager.invalidate_search_service()
+            self.workbook_manager.is_data_extracted = True
+
+            if self.cache:
+                self.cache.save_extraction(self.workbook_manager)
+
             return True
 
         except Exception as e:
@@ -75,6 +159,223 @@ class DataExtractor:
             traceback.print_exc()
             return False
 
+    def refresh_changed_sheets(self) -> Optional[ExtractionDiff]:
+        """
+        增量重新提取：只重新处理内容指纹与上次提取不同的工作表
+
+        未变化工作表的目标项和来源项原样保留；变化的工作表重新提取后与已有数据项逐项比较，
+        内容未变的数据项保留原对象。映射公式不受影响，调用方可根据返回的差异只重算受影响的公式
+        （CalculationEngine.apply_extraction_diff）。从未提取过时执行完整提取
+
+        Returns:
+            Optional[ExtractionDiff]: 数据项差异，提取失败时返回None
+        """
+        manager = self.workbook_manager
+        if not manager.sheet_fingerprints:
+            return self._refresh_all()
+
+        try:
+            print("检查工作表内容变化...")
+            if not self._load_workbook():
+                return None
+
+            tasks = self._sheet_tasks()
+            # XML部件未变化的工作表直接沿用上次的指纹，不必逐行读取单元格
+            part_digests = self._read_part_digests()
+            fingerprints = {}
+            for task in tasks:
+                sheet_name = task[1]
+                previous = manager.sheet_fingerprints.get(task)
+                if previous is not None and sheet_name in part_digests and \
+                        part_digests[sheet_name] == manager.sheet_part_digests.get(sheet_name):
+                    fingerprints[task] = previous
+                else:
+                    fingerprints[task] = self._compute_sheet_fingerprint(*task)
+            changed = [task for task in tasks if fingerprints[task] != manager.sheet_fingerprints.get(task)]
+            changed_set = set(changed)
+
+            diff = ExtractionDiff(
+                changed_sheets=list(dict.fromkeys(sheet_name for _, sheet_name in changed)),
+                unchanged_sheets=list(dict.fromkeys(sheet_name for kind, sheet_name in tasks
+                                                    if (kind, sheet_name) not in changed_set))
+            )
+            print(f"内容变化的工作表: {diff.changed_sheets if changed else '无'}")
+
+            prefetched = None
+            if self.max_workers > 1 and len(changed) > 1:
+                prefetched = self._extract_sheets_parallel(changed)
+
+            self._refresh_targets(tasks, changed_set, prefetched, diff)
+            self._refresh_sources(tasks, changed_set, prefetched, diff)
+
+            manager.sheet_fingerprints = {task: fingerprint for task, fingerprint in fingerprints.items()
+                                          if fingerprint is not None}
+            manager.sheet_part_digests = part_digests
+            manager.is_data_extracted = True
+            if manager.search_service is not None and diff.has_changes:
+                manager.search_service.apply_diff(diff)
+            print(diff.summary())
+
+            if self.cache and changed:
+                self.cache.save_extraction(manager)
+
+            return diff
+
+        except Exception as e:
+            print(f"增量提取失败: {e}")
+            import traceback
+            traceback.print_exc()
+            return None
+
+    def _refresh_all(self) -> Optional[ExtractionDiff]:
+        """完整重新提取，并与原有数据项比较得到差异"""
+        manager = self.workbook_manager
+        old_targets = dict(manager.target_items)
+        old_sources = SourceItemStore(manager.source_items)
+
+        manager.target_items.clear()
+        manager.source_items.clear()
+        if not self.extract_all_data():
+            manager.target_items.update(old_targets)
+            manager.source_items.update(old_sources)
+            return None
+
+        diff = ExtractionDiff(changed_sheets=list(dict.fromkeys(name for _, name in self._sheet_tasks())))
+        diff.added_targets, diff.removed_targets, diff.modified_targets = self._diff_items(
+            old_targets, manager.target_items, self._same_target)
+        diff.added_sources, diff.removed_sources, diff.modified_sources = self._diff_items(
+            old_sources, manager.source_items, lambda old, new: old == new)
+        print(diff.summary())
+        return diff
+
+    @staticmethod
+    def _same_target(old: TargetItem, new: TargetItem) -> bool:
+        """两次提取的目标项内容是否相同（层级关系字段由update_hierarchy_structure生成，不参与比较）"""
+        return (old.sheet_name == new.sheet_name and old.row == new.row and old.name == new.name and
+                old.original_text == new.original_text and old.level == new.level)
+
+    @staticmethod
+    def _diff_items(old_items, new_items, same) -> Tuple[List[str], List[str], List[str]]:
+        """
+        比较两组数据项
+
+        Returns:
+            Tuple[List[str], List[str], List[str]]: (新增ID, 删除ID, 内容变化ID)
+        """
+        added = [item_id for item_id in new_items if item_id not in old_items]
+        removed = [item_id for item_id in old_items if item_id not in new_items]
+        modified = [item_id for item_id in new_items
+                    if item_id in old_items and not same(old_items[item_id], new_items[item_id])]
+        return added, removed, modified
+
+    def _refresh_targets(self, tasks: List[Tuple[str, str]], changed: set,
+                         prefetched: Optional[Dict[Tuple[str, str], Any]], diff: ExtractionDiff):
+        """重新提取变化的快报表，按工作表顺序重建目标项（未变化的目标项保留原对象）"""
+        manager = self.workbook_manager
+        old_targets = manager.target_items
+        previous_sheets = {sheet_name for kind, sheet_name in manager.sheet_fingerprints if kind == "target"}
+
+        by_sheet: Dict[str, Dict[str, TargetItem]] = {}
+        for target_id, target in old_targets.items():
+            by_sheet.setdefault(target.sheet_name, {})[target_id] = target
+
+        rebuilt: Dict[str, TargetItem] = {}
+        for kind, sheet_name in tasks:
+            if kind != "target":
+                continue
+            old_sheet_targets = by_sheet.get(sheet_name, {})
+            if (kind, sheet_name) not in changed:
+                rebuilt.update(old_sheet_targets)
+                continue
+
+            if prefetched is not None:
+                sheet_targets, output = prefetched[(kind, sheet_name)]
+                print(output, end="")
+            else:
+                sheet_targets = self._extract_sheet_targets(sheet_name)
+
+            new_sheet_targets = {target.id: target for target in sheet_targets or []}
+            added, _, modified = self._diff_items(old_sheet_targets, new_sheet_targets, self._same_target)
+            diff.added_targets.extend(added)
+            diff.modified_targets.extend(modified)
+            unchanged = set(new_sheet_targets) - set(added) - set(modified)
+            for target_id, target in new_sheet_targets.items():
+                rebuilt[target_id] = old_sheet_targets[target_id] if target_id in unchanged else target
+
+        # 保留不是由提取产生的目标项（如手工添加的）
+        for target_id, target in old_targets.items():
+            if target_id not in rebuilt and target.sheet_name not in previous_sheets:
+                rebuilt[target_id] = target
+
+        diff.removed_targets.extend(target_id for target_id in old_targets if target_id not in rebuilt)
+
+        if diff.added_targets or diff.removed_targets or diff.modified_targets:
+            old_targets.clear()
+            old_targets.update(rebuilt)
+            print("重新计算层级关系...")
+            update_hierarchy_structure(manager)
+
+    def _refresh_sources(self, tasks: List[Tuple[str, str]], changed: set,
+                         prefetched: Optional[Dict[Tuple[str, str], Any]], diff: ExtractionDiff):
+        """重新提取变化的数据源表，逐表替换来源项"""
+        manager = self.workbook_manager
+        source_items = manager.source_items
+        source_sheets = [sheet_name for kind, sheet_name in tasks if kind == "source"]
+
+        # 不再是数据源表的工作表，删除上次提取的来源项
+        stale_sheets = [sheet_name for kind, sheet_name in manager.sheet_fingerprints
+                        if kind == "source" and sheet_name not in source_sheets]
+
+        for sheet_name in stale_sheets + source_sheets:
+            if sheet_name in source_sheets and ("source", sheet_name) not in changed:
+                continue
+
+            if sheet_name not in source_sheets:
+                sheet_sources = None
+            elif prefetched is not None:
+                sheet_sources, output = prefetched[("source", sheet_name)]
+                print(output, end="")
+            else:
+                sheet_sources = self._extract_sheet_sources(sheet_name)
+
+            if isinstance(source_items, SourceItemStore):
+                old_ids = source_items.get_sheet_ids(sheet_name)
+            else:
+                old_ids = [source_id for source_id, source in source_items.items() if source.sheet_name == sheet_name]
+            old_sheet_sources = {source_id: source_items[source_id] for source_id in old_ids}
+            new_sheet_sources = {source.id: source for source in sheet_sources or []}
+
+            added, removed, modified = self._diff_items(old_sheet_sources, new_sheet_sources,
+                                                        lambda old, new: old == new)
+            diff.added_sources.extend(added)
+            diff.removed_sources.extend(removed)
+            diff.modified_sources.extend(modified)
+
+            if isinstance(source_items, SourceItemStore):
+                source_items.replace_sheet(sheet_name, sheet_sources)
+            else:
+                for source_id in old_ids:
+                    del source_items[source_id]
+                source_items.update(new_sheet_sources)
+
+    def _sheet_count(self) -> int:
+        """需要提取的工作表数量"""
+        return len(self.workbook_manager.flash_report_sheets) + len(self.workbook_manager.data_source_sheets)
+
+    def _sheet_tasks(self) -> List[Tuple[str, str]]:
+        """需要提取的 (用途, 工作表名)，快报表在前"""
+        tasks = [("target", self._get_sheet_name(item)) for item in self.workbook_manager.flash_report_sheets]
+        tasks += [("source", self._get_sheet_name(item)) for item in self.workbook_manager.data_source_sheets]
+        return list(dict.fromkeys(tasks))
+
+    def _read_part_digests(self) -> Dict[str, str]:
+        """读取各工作表XML部件的摘要，无法读取时返回空字典（退回到逐行计算指纹）"""
+        try:
+            return dict(self.workbook_manager.get_session().get_part_digests())
+        except Exception as e:
+            print(f"读取工作表部件摘要失败: {e}")
+            return {}
+
     def _load_workbook(self) -> bool:
         """加载Excel工作簿"""
         try:
@@ -82,7 +383,9 @@ class DataExtractor:
                 print("Excel文件不存在")
                 return False
 
-            self.workbook = openpyxl.load_workbook(self.workbook_manager.file_path, data_only=True)
+            # 复用工作簿会话中已加载的工作簿（文件变化时会话会自动重新加载）
+            self.workbook = self.workbook_manager.get_session().get_workbook(read_only=self.streaming)
+            self._schema_sheets.clear()
             print(f"Excel文件加载成功: {self.workbook_manager.file_path}")
             return True
 
@@ -90,22 +393,25 @@ class DataExtractor:
             print(f"Excel文件加载失败: {e}")
             return False
 
-    def _extract_flash_report_targets(self) -> int:
-        """提取快报表目标项（保持原有逻辑）"""
+    def _extract_flash_report_targets(self, prefetched: Optional[Dict[Tuple[str, str], Any]] = None) -> int:
+        """提取快报表目标项（保持原有逻辑）
+
+        Args:
+            prefetched: 并行模式下子进程已提取的结果 {("target", 工作表名): (目标项列表, 输出文本)}
+        """
         target_count = 0
 
         for sheet_item in self.workbook_manager.flash_report_sheets:
             sheet_name = self._get_sheet_name(sheet_item)
-            print(f"\n提取快报表 '{sheet_name}' 的目标项...")
+            if prefetched is None:
+                sheet_targets = self._extract_sheet_targets(sheet_name)
+            else:
+                sheet_targets, output = prefetched[("target", sheet_name)]
+                print(output, end="")
 
-            if sheet_name not in self.workbook.sheetnames:
-                print(f"  工作表 '{sheet_name}' 不存在")
+            if sheet_targets is None:
                 continue
-
-            sheet = self.workbook[sheet_name]
-            sheet_targets = self._extract_targets_from_sheet(sheet, sheet_name)
             target_count += len(sheet_targets)
-            print(f"  提取到 {len(sheet_targets)} 个目标项")
 
             # 添加到工作簿管理器
             for target in sheet_targets:
@@ -113,43 +419,114 @@ class DataExtractor:
 
         return target_count
 
-    def _extract_data_source_items_enhanced(self) -> int:
-        """提取数据源项（增强版）"""
+    def _extract_sheet_targets(self, sheet_name: str) -> Optional[List[TargetItem]]:
+        """提取一个快报表的目标项，工作表不存在时返回None"""
+        print(f"\n提取快报表 '{sheet_name}' 的目标项...")
+
+        if sheet_name not in self.workbook.sheetnames:
+            print(f"  工作表 '{sheet_name}' 不存在")
+            return None
+
+        sheet = self.workbook[sheet_name]
+        fingerprint = self._new_fingerprint("target", sheet_name)
+        sheet_targets = self._extract_targets_from_sheet(sheet, sheet_name, fingerprint)
+        self._fingerprints[("target", sheet_name)] = fingerprint.hexdigest()
+        print(f"  提取到 {len(sheet_targets)} 个目标项")
+        return sheet_targets
+
+    def _extract_data_source_items_enhanced(self, prefetched: Optional[Dict[Tuple[str, str], Any]] = None) -> int:
+        """提取数据源项（增强版）
+
+        Args:
+            prefetched: 并行模式下子进程已提取的结果 {("source", 工作表名): (来源项列存储, 输出文本)}
+        """
         source_count = 0
 
         for sheet_item in self.workbook_manager.data_source_sheets:
             sheet_name = self._get_sheet_name(sheet_item)
-            print(f"\n提取数据源表 '{sheet_name}' 的来源项...")
+            if prefetched is None:
+                sheet_sources = self._extract_sheet_sources(sheet_name)
+            else:
+                sheet_sources, output = prefetched[("source", sheet_name)]
+                print(output, end="")
 
-            if sheet_name not in self.workbook.sheetnames:
-                print(f"  工作表 '{sheet_name}' 不存在")
+            if sheet_sources is None:
                 continue
+            source_count += len(sheet_sources)
 
-            sheet = self.workbook[sheet_name]
+            # 添加到工作簿管理器（列存储直接共享，不逐项物化）
+            if isinstance(self.workbook_manager.source_items, SourceItemStore):
+                self.workbook_manager.source_items.add_table(sheet_sources)
+            else:
+                for source in sheet_sources:
+                    self.workbook_manager.source_items[source.id] = source
 
-            # 分析表格模式
-            print(f"  分析表格模式...")
-            table_schema = self.schema_analyzer.analyze_table_schema(sheet)
-            print(f"  识别为: {table_schema.table_type.value}")
+        return source_count
 
-            # 根据表格类型使用不同的提取策略
-            if table_schema.table_type == TableType.TRIAL_BALANCE:
-                sheet_sources = self._extract_trial_balance_sources(sheet, sheet_name, table_schema)
-            else:
-                sheet_sources = self._extract_general_sources(sheet, sheet_name, table_schema)
+    def _extract_sheet_sources(self, sheet_name: str) -> Optional[SourceTable]:
+        """提取一个数据源表的来源项，工作表不存在时返回None"""
+        print(f"\n提取数据源表 '{sheet_name}' 的来源项...")
 
-            source_count += len(sheet_sources)
-            print(f"  提取到 {len(sheet_sources)} 个来源项")
+        if sheet_name not in self.workbook.sheetnames:
+            print(f"  工作表 '{sheet_name}' 不存在")
+            return None
 
-            # 添加到工作簿管理器
-            for source in sheet_sources:
-                self.workbook_manager.source_items[source.id] = source
+        sheet = self.workbook[sheet_name]
 
-        return source_count
+        # 分析表格模式
+        print(f"  分析表格模式...")
+        table_schema = self.schema_analyzer.analyze_table_schema(self._get_schema_sheet(sheet, sheet_name))
+        print(f"  识别为: {table_schema.table_type.value}")
+
+        # 根据表格类型使用不同的提取策略（逐行提取时同时计算工作表指纹）
+        fingerprint = self._new_fingerprint("source", sheet_name)
+        if table_schema.table_type == TableType.TRIAL_BALANCE:
+            sheet_sources = self._extract_trial_balance_sources(sheet, sheet_name, table_schema, fingerprint)
+        else:
+            sheet_sources = self._extract_general_sources(sheet, sheet_name, table_schema, fingerprint)
+        self._fingerprints[("source", sheet_name)] = fingerprint.hexdigest()
+
+        print(f"  提取到 {len(sheet_sources)} 个来源项")
+        return sheet_sources
+
+    def _extract_sheets_parallel(self, tasks: Optional[List[Tuple[str, str]]] = None
+                                 ) -> Optional[Dict[Tuple[str, str], Any]]:
+        """
+        在进程池中按工作表并行提取，每个子进程以只读模式打开工作簿
+
+        Args:
+            tasks: 要提取的 (类型, 工作表名)，None表示所有工作表
+
+        Returns:
+            Optional[Dict[Tuple[str, str], Any]]: {(类型, 工作表名): (数据项列表, 输出文本)}，失败时返回None
+        """
+        tasks = self._sheet_tasks() if tasks is None else list(tasks)
 
-    def _extract_trial_balance_sources(self, sheet, sheet_name: str, schema: TableSchema) -> List[SourceItem]:
+        # 大的工作表先提交，使各进程的负载更均衡
+        worksheets = self.workbook_manager.worksheets
+        tasks.sort(key=lambda task: worksheets[task[1]].max_row if task[1] in worksheets else 0, reverse=True)
+
+        print(f"并行提取 {len(tasks)} 个工作表（{self.max_workers} 个进程）...")
+        results = {}
+        try:
+            with ProcessPoolExecutor(max_workers=min(self.max_workers, len(tasks)),
+                                     initializer=_init_extraction_worker,
+                                     initargs=(self.workbook_manager.file_path,)) as executor:
+                futures = [executor.submit(_extract_sheet_in_worker, kind, sheet_name) for kind, sheet_name in tasks]
+                for future in as_completed(futures):
+                    kind, sheet_name, items, output, fingerprint = future.result()
+                    results[(kind, sheet_name)] = (items, output)
+                    if fingerprint is not None:
+                        self._fingerprints[(kind, sheet_name)] = fingerprint
+        except Exception as e:
+            print(f"并行提取失败，改为逐个工作表提取: {e}")
+            return None
+
+        return results
+
+    def _extract_trial_balance_sources(self, sheet, sheet_name: str, schema: TableSchema,
+                                       fingerprint: Optional[SheetFingerprint] = None) -> SourceTable:
         """提取科目余额表来源项（专用逻辑）"""
-        sources = []
 
         print(f"    使用科目余额表专用提取逻辑")
         print(f"    数据开始行: {schema.data_start_row}")
@@ -160,12 +537,14 @@ class DataExtractor:
             [col for col in schema.data_columns]
         )
 
-        # 扫描所有数据行（支持大型科目余额表）
-        max_row = sheet.max_row or 5000  # 科目余额表通常更大
+        # 数值列的位置和列键名（每个工作表只生成一次）
+        numeric_columns = self._get_numeric_columns(schema, sheet_name)
+        sources = SourceTable(sheet_name, "trial_balance", [column_key for _, column_key in numeric_columns])
 
-        for row_num in range(schema.data_start_row, max_row + 1):
+        # 逐行流式扫描所有数据行（支持大型科目余额表）
+        for row_num, row in self._iter_row_values(sheet, schema.data_start_row, fingerprint):
             # 提取科目信息
-            account_info = self._extract_account_info(sheet, row_num, schema)
+            account_info = self._extract_account_info(row, schema)
 
             if not account_info:
                 continue
@@ -176,112 +555,202 @@ class DataExtractor:
             # 确定层级
             hierarchy_level = self._calculate_account_level(account_code)
 
-            # 提取所有数据列的值
-            data_columns = {}
-            main_value = None
-
-            for col_info in schema.data_columns:
-                if col_info.is_numeric:
-                    cell = sheet.cell(row=row_num, column=col_info.column_index)
-                    if self._is_data_cell(cell):
-                        value = self._extract_cell_value(cell)
-                        # 生成更清晰的列键名
-                        column_key = self._generate_column_key(col_info, sheet_name)
-                        data_columns[column_key] = value
-
-                        # 第一个有效数值作为主要数值
-                        if main_value is None:
-                            main_value = value
+            # 提取所有数据列的值（第一个有效数值作为主要数值）
+            data_columns, main_value = self._extract_row_data(row, numeric_columns)
 
             # 只有找到有效数据才创建来源项
             if data_columns:
-                source = self._create_enhanced_source_item(
-                    sheet_name=sheet_name,
+                self._append_source_row(
+                    sources,
                     account_name=account_name,
                     account_code=account_code,
                     row_num=row_num,
                     hierarchy_level=hierarchy_level,
                     data_columns=data_columns,
-                    main_value=main_value,
-                    table_type="trial_balance"
+                    main_value=main_value
                 )
-                sources.append(source)
 
         print(f"    科目余额表提取完成，共 {len(sources)} 个项目")
         return sources
 
-    def _extract_general_sources(self, sheet, sheet_name: str, schema: TableSchema) -> List[SourceItem]:
+    def _extract_general_sources(self, sheet, sheet_name: str, schema: TableSchema,
+                                 fingerprint: Optional[SheetFingerprint] = None) -> SourceTable:
         """提取通用表格来源项"""
-        sources = []
-
         print(f"    使用通用表格提取逻辑")
 
-        # 扫描所有数据行（移除行数限制）
-        max_row = sheet.max_row or 2000  # 增加默认上限
+        # 数值列的位置和列键名（每个工作表只生成一次）
+        numeric_columns = self._get_numeric_columns(schema, sheet_name)
+        sources = SourceTable(sheet_name, schema.table_type.value, [column_key for _, column_key in numeric_columns])
 
-        for row_num in range(schema.data_start_row, max_row + 1):
+        # 逐行流式扫描所有数据行（移除行数限制）
+        for row_num, row in self._iter_row_values(sheet, schema.data_start_row, fingerprint):
             # 提取项目名称
             item_name = None
             for name_col in schema.name_columns:
-                cell = sheet.cell(row=row_num, column=name_col)
-                if cell.value and str(cell.value).rstrip():  # 只删除尾部空白，保留前导缩进
-                    item_name = str(cell.value).rstrip()  # 保留前导缩进
+                value = self._row_value(row, name_col)
+                if value and str(value).rstrip():  # 只删除尾部空白，保留前导缩进
+                    item_name = str(value).rstrip()  # 保留前导缩进
                     break
 
             if not item_name:
                 continue
 
             # 提取所有数据列
-            data_columns = {}
-            main_value = None
-
-            for col_info in schema.data_columns:
-                if col_info.is_numeric:
-                    cell = sheet.cell(row=row_num, column=col_info.column_index)
-                    if self._is_data_cell(cell):
-                        value = self._extract_cell_value(cell)
-                        # 生成更清晰的列键名
-                        column_key = self._generate_column_key(col_info, sheet_name)
-                        data_columns[column_key] = value
-
-                        if main_value is None:
-                            main_value = value
+            data_columns, main_value = self._extract_row_data(row, numeric_columns)
 
             if data_columns:
-                source = self._create_enhanced_source_item(
-                    sheet_name=sheet_name,
+                self._append_source_row(
+                    sources,
                     account_name=item_name,
                     account_code="",
                     row_num=row_num,
                     hierarchy_level=0,
                     data_columns=data_columns,
-                    main_value=main_value,
-                    table_type=schema.table_type.value
+                    main_value=main_value
                 )
-                sources.append(source)
 
         return sources
 
-    def _extract_account_info(self, sheet, row_num: int, schema: TableSchema) -> Optional[Dict[str, str]]:
+    def _get_schema_sheet(self, sheet, sheet_name: str):
+        """获取用于表格模式分析的工作表
+
+        只读工作表不支持按单元格随机访问，流式模式下把前若干行复制到一个普通工作表中供分析
+        """
+        if not self.streaming:
+            return sheet
+
+        schema_sheet = self._schema_sheets.get(sheet_name)
+        if schema_sheet is None:
+            schema_sheet = openpyxl.Workbook().active
+            schema_sheet.title = sheet.title
+            for row in sheet.iter_rows(max_row=SCHEMA_SAMPLE_ROWS, values_only=True):
+                schema_sheet.append(row)
+
+            # 恢复表头区域的合并单元格（被合并的单元格在普通模式下没有值，保持列头识别结果一致）
+            for cell_range in self.workbook_manager.get_session().get_merged_ranges(sheet_name):
+                min_col, min_row, max_col, max_row = range_boundaries(cell_range)
+                if min_row <= SCHEMA_SAMPLE_ROWS:
+                    schema_sheet.merge_cells(start_row=min_row, start_column=min_col,
+                                             end_row=min(max_row, SCHEMA_SAMPLE_ROWS), end_column=max_col)
+
+            self._schema_sheets[sheet_name] = schema_sheet
+        return schema_sheet
+
+    def _iter_row_values(self, sheet, start_row: int, fingerprint: Optional[SheetFingerprint] = None):
+        """从start_row开始逐行读取单元格值
+
+        Args:
+            fingerprint: 工作表指纹，不为None时表头行和读取到的每一行都计入指纹
+
+        Yields:
+            Tuple[int, Tuple]: (行号, 该行各列的值)
+        """
+        rows = enumerate(sheet.iter_rows(min_row=start_row, values_only=True), start_row)
+        if fingerprint is None:
+            return rows
+
+        if start_row > 1:
+            fingerprint.add_rows(sheet.iter_rows(max_row=start_row - 1, values_only=True))
+        return self._fingerprinted_rows(rows, fingerprint)
+
+    @staticmethod
+    def _fingerprinted_rows(rows, fingerprint: SheetFingerprint):
+        """逐行计入指纹后原样产出"""
+        for row_num, row in rows:
+            fingerprint.add_row(row_num, row)
+            yield row_num, row
+
+    def _new_fingerprint(self, kind: str, sheet_name: str) -> SheetFingerprint:
+        """创建工作表指纹（数据源表的合并单元格会影响列头识别，一并计入）"""
+        extra = None
+        if kind == "source":
+            if self.streaming:
+                merged_ranges = self.workbook_manager.get_session().get_merged_ranges(sheet_name)
+            else:
+                merged_ranges = [str(cell_range) for cell_range in self.workbook[sheet_name].merged_cells.ranges]
+            extra = tuple(sorted(merged_ranges))
+        return SheetFingerprint(kind, sheet_name, extra)
+
+    def _compute_sheet_fingerprint(self, kind: str, sheet_name: str) -> Optional[str]:
+        """
+        不提取数据，只计算工作表的内容指纹（与提取时逐行计算的结果相同）
+
+        Args:
+            kind: "target"（快报表）或 "source"（数据源表）
+            sheet_name: 工作表名
+
+        Returns:
+            Optional[str]: 指纹，工作表不存在时返回None
+        """
+        if sheet_name not in self.workbook.sheetnames:
+            return None
+
+        sheet = self.workbook[sheet_name]
+        fingerprint = self._new_fingerprint(kind, sheet_name)
+        if kind == "target":
+            fingerprint.add_rows(sheet.iter_rows(min_col=1, max_col=1, values_only=True))
+        else:
+            fingerprint.add_rows(sheet.iter_rows(values_only=True))
+        return fingerprint.hexdigest()
+
+    @staticmethod
+    def _row_value(row: Tuple[Any, ...], column_index: int) -> Any:
+        """按列号（从1开始）取行中的值，超出该行长度时返回None"""
+        return row[column_index - 1] if 0 < column_index <= len(row) else None
+
+    def _get_numeric_columns(self, schema: TableSchema, sheet_name: str) -> List[Tuple[int, str]]:
+        """获取数值列的列号和列键名
+
+        列键名只取决于工作表和列头，每列解析一次后缓存在ColumnInfo.column_key上，逐行提取时直接使用
+        """
+        numeric_columns = []
+        for col_info in schema.data_columns:
+            if not col_info.is_numeric:
+                continue
+            if col_info.column_key is None:
+                col_info.column_key = self._generate_column_key(col_info, sheet_name)
+            numeric_columns.append((col_info.column_index, col_info.column_key))
+        return numeric_columns
+
+    def _extract_row_data(self, row: Tuple[Any, ...],
+                          numeric_columns: List[Tuple[int, str]]) -> Tuple[Dict[str, Any], Any]:
+        """提取一行中所有数值列的值
+
+        Returns:
+            Tuple[Dict[str, Any], Any]: (列键名 -> 数值, 第一个有效数值)
+        """
+        data_columns = {}
+        main_value = None
+
+        for column_index, column_key in numeric_columns:
+            value = self._parse_numeric_value(self._row_value(row, column_index))
+            if value is not None:
+                data_columns[column_key] = value
+                if main_value is None:
+                    main_value = value
+
+        return data_columns, main_value
+
+    def _extract_account_info(self, row: Tuple[Any, ...], schema: TableSchema) -> Optional[Dict[str, str]]:
         """提取科目信息"""
         account_code = ""
         account_name = ""
 
         # 从编码列提取科目代码
         for code_col in schema.code_columns:
-            cell = sheet.cell(row=row_num, column=code_col)
-            if cell.value:
-                code_text = str(cell.value).strip()
+            value = self._row_value(row, code_col)
+            if value:
+                code_text = str(value).strip()
                 # 优化科目代码识别模式
-                if re.match(r'^\d{3,12}(\.\d+)*$', code_text):  # 支持3-12位代码，可带小数点分隔
+                if _ACCOUNT_CODE_PATTERN.match(code_text):  # 支持3-12位代码，可带小数点分隔
                     account_code = code_text
                     break
 
         # 从名称列提取科目名称
         for name_col in schema.name_columns:
-            cell = sheet.cell(row=row_num, column=name_col)
-            if cell.value:
-                name_text = str(cell.value).rstrip()  # 保留前导缩进
+            value = self._row_value(row, name_col)
+            if value:
+                name_text = str(value).rstrip()  # 保留前导缩进
                 if self._is_account_name(name_text):
                     account_name = name_text
                     break
@@ -317,41 +786,30 @@ class DataExtractor:
         else:
             return 0
 
-    def _create_enhanced_source_item(self, sheet_name: str, account_name: str, account_code: str,
-                                   row_num: int, hierarchy_level: int, data_columns: Dict[str, Any],
-                                   main_value: Any, table_type: str) -> SourceItem:
-        """创建增强的来源项"""
+    def _append_source_row(self, sources: SourceTable, account_name: str, account_code: str,
+                           row_num: int, hierarchy_level: int, data_columns: Dict[str, Any], main_value: Any):
+        """在工作表的列存储中追加一个来源项（来源项位于A列）"""
 
         # 生成唯一ID
-        source_id = f"{sheet_name}_{account_code}_{row_num}" if account_code else f"{sheet_name}_{row_num}"
+        source_id = f"{sources.sheet_name}_{account_code}_{row_num}" if account_code \
+            else f"{sources.sheet_name}_{row_num}"
 
-        # 创建基本的SourceItem
-        source = SourceItem(
-            id=source_id,
-            sheet_name=sheet_name,
+        # 层级信息
+        parent_code = self._get_parent_account_code(account_code) if account_code else ""
+
+        sources.append(
+            source_id,
             name=account_name,
-            cell_address=f"A{row_num}",  # 暂时使用A列
             row=row_num,
-            column="A",
             value=main_value,
+            data_columns=data_columns,
             account_code=account_code,
             hierarchy_level=hierarchy_level,
-            table_type=table_type,
-            data_columns=data_columns
+            parent_code=parent_code
         )
 
-        # 设置层级信息
-        if account_code:
-            parent_code = self._get_parent_account_code(account_code)
-            source.set_hierarchy_info(account_code, hierarchy_level, parent_code)
-
-        return source
-
     def _generate_column_key(self, col_info, sheet_name: str = "") -> str:
         """生成清晰的数据列键名（与TableColumnRules规则一致）"""
-        # 导入表列规则系统
-        from utils.table_column_rules import TableColumnRules
-
         # 获取主要列头文本
         primary_header = col_info.primary_header.lower() if col_info.primary_header else ""
         secondary_header = col_info.secondary_header.lower() if hasattr(col_info, 'secondary_header') and col_info.secondary_header else ""
@@ -360,11 +818,10 @@ class DataExtractor:
         if not primary_header and hasattr(self, 'workbook') and self.workbook:
             try:
                 # 查找当前工作表
-                current_sheet = None
-                for ws_name in self.workbook.sheetnames:
-                    if ws_name == sheet_name:
-                        current_sheet = self.workbook[ws_name]
-                        break
+                current_sheet = self.workbook[sheet_name] if sheet_name in self.workbook.sheetnames else None
+
+                # 只读工作表不支持按单元格访问，改用表头样本
+                current_sheet = self._schema_sheets.get(sheet_name, current_sheet)
 
                 if current_sheet:
                     # 尝试从第5行读取列头（根据利润表分析结果）
@@ -601,15 +1058,19 @@ class DataExtractor:
 
         return ""
 
-    def _extract_targets_from_sheet(self, sheet, sheet_name: str) -> List[TargetItem]:
+    def _extract_targets_from_sheet(self, sheet, sheet_name: str,
+                                    fingerprint: Optional[SheetFingerprint] = None) -> List[TargetItem]:
         """从快报表中提取目标项（保持原有逻辑）"""
         targets = []
-        max_row = sheet.max_row or 500  # 增加快报表扫描范围
 
-        for row_num in range(1, max_row + 1):
-            cell_a = sheet.cell(row=row_num, column=1)
-            if cell_a.value and str(cell_a.value).rstrip():
-                text = str(cell_a.value).rstrip()  # 保留前导缩进
+        # 只读取A列
+        for row_num, row in enumerate(sheet.iter_rows(min_col=1, max_col=1, values_only=True), 1):
+            if fingerprint is not None:
+                fingerprint.add_row(row_num, row)
+
+            value = row[0]
+            if value and str(value).rstrip():
+                text = str(value).rstrip()  # 保留前导缩进
 
                 # 跳过明显的标题行
                 if any(keyword in text for keyword in ['项目', '金额', '单位', '期间']):
@@ -638,21 +1099,14 @@ class DataExtractor:
             return None
 
         # 检测编号模式
-        numbering_patterns = [
-            r'^(\d+)\.\s*(.+)',
-            r'^(\d+)\s+(.+)',
-            r'^(\d+)、\s*(.+)',
-            r'^\((\d+)\)\s*(.+)',
-        ]
-
-        for pattern in numbering_patterns:
-            match = re.match(pattern, text.strip())
-            if match:
-                return {
-                    'numbering': match.group(1),
-                    'clean_name': match.group(2).rstrip(),  # 保留前导缩进
-                    'level': 1
-                }
+        match = _TARGET_NUMBERING_PATTERN.match(text.strip())
+        if match:
+            numbering, clean_name = [group for group in match.groups() if group is not None]
+            return {
+                'numbering': numbering,
+                'clean_name': clean_name.rstrip(),  # 保留前导缩进
+                'level': 1
+            }
 
         # 没有编号的项目
         return {
@@ -666,61 +1120,35 @@ class DataExtractor:
         if not text or len(text) < 2:
             return False
 
-        # 排除模式（更全面）
-        exclude_patterns = [
-            r'^日期[:：]', r'^期间[:：]', r'^单位[:：]',
-            r'^科目代码$', r'^科目名称$', r'^期初$', r'^期末$',
-            r'^借方$', r'^贷方$', r'^合计$', r'^小计$',
-            r'^年初$', r'^本期$', r'^余额$', r'^发生额$',
-            r'^\d+$',  # 纯数字
-            r'^[\d\.,\s\-\(\)]+$'  # 纯数字格式
-        ]
-
-        for pattern in exclude_patterns:
-            if re.match(pattern, text, re.IGNORECASE):
-                return False
+        # 排除模式（更全面，预编译为一个正则）
+        if _ACCOUNT_NAME_EXCLUDE_PATTERN.match(text):
+            return False
 
         # 包含中文字符且长度合适
-        if re.search(r'[\u4e00-\u9fff]', text) and 2 <= len(text) <= 50:
+        if CHINESE_PATTERN.search(text) and 2 <= len(text) <= 50:
             return True
 
         return False
 
-    def _is_data_cell(self, cell) -> bool:
-        """判断是否是数据单元格（增强版）"""
-        if cell.value is None:
-            return False
+    @staticmethod
+    def _parse_numeric_value(value: Any) -> Optional[float]:
+        """解析单元格值为数值，不是数据时返回None
+
+        支持数值（允许0值）、带千分位的数值字符串和负数括号格式
+        """
+        if value is None:
+            return None
 
         # 检查是否是数值
-        if isinstance(cell.value, (int, float)):
-            return True  # 允许0值
+        if isinstance(value, (int, float)):
+            return float(value)
 
         # 检查是否是数值字符串
-        if isinstance(cell.value, str):
+        if isinstance(value, str):
             try:
                 # 处理各种数值格式
-                cleaned = cell.value.replace(',', '').replace(' ', '')
+                cleaned = value.replace(',', '').replace(' ', '')
                 # 处理负数括号格式
-                if cleaned.startswith('(') and cleaned.endswith(')'):
-                    cleaned = '-' + cleaned[1:-1]
-                float(cleaned)
-                return True
-            except ValueError:
-                return False
-
-        return False
-
-    def _extract_cell_value(self, cell) -> Optional[float]:
-        """提取单元格数值"""
-        if cell.value is None:
-            return None
-
-        if isinstance(cell.value, (int, float)):
-            return float(cell.value)
-
-        if isinstance(cell.value, str):
-            try:
-                cleaned = cell.value.replace(',', '').replace(' ', '')
                 if cleaned.startswith('(') and cleaned.endswith(')'):
                     cleaned = '-' + cleaned[1:-1]
                 return float(cleaned)
@@ -738,6 +1166,37 @@ class DataExtractor:
         else:
             return str(sheet_item)
 
+# 子进程内的数据提取器（由进程池初始化函数创建，同一进程内的所有工作表共用一个只读工作簿）
+_worker_extractor: Optional[DataExtractor] = None
+
+
+def _init_extraction_worker(file_path: str):
+    """进程池初始化：在子进程内以只读模式打开工作簿"""
+    global _worker_extractor
+    _worker_extractor = DataExtractor(WorkbookManager(file_path=file_path), streaming=True)
+    _worker_extractor.workbook = _worker_extractor.workbook_manager.get_session().get_workbook(read_only=True)
+
+
+def _extract_sheet_in_worker(kind: str, sheet_name: str) -> Tuple[str, str, Any, str, Optional[str]]:
+    """
+    在子进程中提取一个工作表
+
+    Args:
+        kind: "target"（快报表）或 "source"（数据源表）
+        sheet_name: 工作表名
+
+    Returns:
+        Tuple[str, str, Any, str, Optional[str]]: (类型, 工作表名, 目标项列表或来源项列存储, 提取过程的输出文本, 工作表指纹)
+    """
+    output = io.StringIO()
+    with contextlib.redirect_stdout(output):
+        if kind == "target":
+            items = _worker_extractor._extract_sheet_targets(sheet_name)
+        else:
+            items = _worker_extractor._extract_sheet_sources(sheet_name)
+    return kind, sheet_name, items, output.getvalue(), _worker_extractor._fingerprints.get((kind, sheet_name))
+
+
 if __name__ == "__main__":
     # 测试用例
     print("增强数据提取器模块")
\ No newline at end of file
@@ -45,6 +45,23 @@ class DataStructureProcessor:
             # 兜底处理：转换为字符串
             return str(sheet_item)
 
+    def _get_sheet_rows(self, sheet_name: str) -> List[Tuple[Any, ...]]:
+        """获取工作表各行的单元格值
+
+        Args:
+            sheet_name: 工作表名称
+
+        Returns:
+            List[Tuple[Any, ...]]: 各行单元格值
+
+        Raises:
+            KeyError: 工作表不存在
+        """
+        session = self.workbook_manager.get_session()
+        if sheet_name not in session.sheetnames:
+            raise KeyError(f"Worksheet {sheet_name} does not exist.")
+        return session.get_sheet_values(sheet_name)
+
     def process_all_data(self) -> Dict[str, Any]:
         """处理所有工作表数据，返回结构化的extracted_data"""
 
@@ -73,24 +90,21 @@ class DataStructureProcessor:
     def _process_flash_report_sheet(self, sheet_info):
         """处理快报表工作表（鲁棒性增强）"""
         try:
-            import openpyxl
-
             # 安全获取工作表名称
             sheet_name = self._safe_get_sheet_name(sheet_info)
 
-            # 加载工作簿和工作表
-            workbook = openpyxl.load_workbook(self.workbook_manager.file_path, data_only=True)
-            worksheet = workbook[sheet_name]
+            # 从工作簿会话读取工作表的单元格值（整个文件只解析一次）
+            rows = self._get_sheet_rows(sheet_name)
 
             row_num = 1
-            for row in worksheet.iter_rows(values_only=False):
+            for row in rows:
                 cell_value = None
                 index_indent = 0
 
                 # 找到第一个非空单元格
-                for col_idx, cell in enumerate(row):
-                    if cell.value is not None and str(cell.value).strip():
-                        cell_value = str(cell.value).strip()
+                for col_idx, value in enumerate(row):
+                    if value is not None and str(value).strip():
+                        cell_value = str(value).strip()
                         # 估算缩进值：假设每个空列相当于缩进2
                         index_indent = col_idx * 2
                         break
@@ -118,23 +132,20 @@ class DataStructureProcessor:
     def _process_data_source_sheet(self, sheet_info):
         """处理数据来源表工作表（鲁棒性增强）"""
         try:
-            import openpyxl
-
             # 安全获取工作表名称
             sheet_name = self._safe_get_sheet_name(sheet_info)
 
-            # 加载工作簿和工作表
-            workbook = openpyxl.load_workbook(self.workbook_manager.file_path, data_only=True)
-            worksheet = workbook[sheet_name]
+            # 从工作簿会话读取工作表的单元格值（整个文件只解析一次）
+            rows = self._get_sheet_rows(sheet_name)
 
             row_num = 1
-            for row in worksheet.iter_rows(values_only=False):
+            for row in rows:
                 cell_value = None
 
                 # 找到第一个非空单元格
-                for cell in row:
-                    if cell.value is not None and str(cell.value).strip():
-                        cell_value = str(cell.value).strip()
+                for value in row:
+                    if value is not None and str(value).strip():
+                        cell_value = str(value).strip()
                         break
 
                 if cell_value:
@@ -0,0 +1,356 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+公式依赖图模块
+记录来源项、目标项与映射公式之间的依赖关系，支持脏标记、拓扑排序和循环引用检测
+"""
+
+import heapq
+from collections import defaultdict
+from typing import Callable, Dict, Hashable, List, Set, Iterable, Optional, Tuple
+
+
+class FormulaDependencyGraph:
+    """公式依赖图
+
+    节点为公式（以目标项ID标识），边有两类：
+    - 来源项 -> 引用它的公式
+    - 目标项（其公式结果） -> 引用该目标项的公式
+    """
+
+    def __init__(self):
+        """初始化依赖图"""
+        # 公式的上游依赖
+        self.formula_sources: Dict[str, Set[str]] = {}  # target_id -> {source_id}
+        self.formula_targets: Dict[str, Set[str]] = {}  # target_id -> {上游target_id}
+
+        # 反向边：谁依赖我
+        self.source_dependents: Dict[str, Set[str]] = defaultdict(set)  # source_id -> {target_id}
+        self.target_dependents: Dict[str, Set[str]] = defaultdict(set)  # target_id -> {target_id}
+
+        # 公式的稳定顺序（用于确定性的拓扑排序）
+        self.formula_order: Dict[str, int] = {}
+
+        # 待重新计算的公式
+        self.dirty: Set[str] = set()
+
+    def clear(self):
+        """清空依赖图"""
+        self.formula_sources.clear()
+        self.formula_targets.clear()
+        self.source_dependents.clear()
+        self.target_dependents.clear()
+        self.formula_order.clear()
+        self.dirty.clear()
+
+    def set_formula_dependencies(self, target_id: str, source_ids: Iterable[str],
+                                 upstream_target_ids: Iterable[str]):
+        """
+        设置（替换）公式的依赖
+
+        Args:
+            target_id: 公式所属目标项ID
+            source_ids: 公式引用的来源项ID
+            upstream_target_ids: 公式引用的目标项ID
+        """
+        self._unlink(target_id)
+
+        if target_id not in self.formula_order:
+            self.formula_order[target_id] = len(self.formula_order)
+
+        sources = set(source_ids)
+        targets = set(upstream_target_ids)
+        self.formula_sources[target_id] = sources
+        self.formula_targets[target_id] = targets
+
+        for source_id in sources:
+            self.source_dependents[source_id].add(target_id)
+        for upstream_id in targets:
+            self.target_dependents[upstream_id].add(target_id)
+
+    def remove_formula(self, target_id: str):
+        """
+        移除公式（其下游公式仍保留对该目标项的依赖）
+
+        Args:
+            target_id: 目标项ID
+        """
+        self._unlink(target_id)
+        self.formula_sources.pop(target_id, None)
+        self.formula_targets.pop(target_id, None)
+        self.formula_order.pop(target_id, None)
+        self.dirty.discard(target_id)
+
+    def _unlink(self, target_id: str):
+        """断开公式的上游边"""
+        for source_id in self.formula_sources.get(target_id, ()):
+            dependents = self.source_dependents.get(source_id)
+            if dependents:
+                dependents.discard(target_id)
+                if not dependents:
+                    del self.source_dependents[source_id]
+
+        for upstream_id in self.formula_targets.get(target_id, ()):
+            dependents = self.target_dependents.get(upstream_id)
+            if dependents:
+                dependents.discard(target_id)
+                if not dependents:
+                    del self.target_dependents[upstream_id]
+
+    def has_formula(self, target_id: str) -> bool:
+        """公式是否已在依赖图中"""
+        return target_id in self.formula_sources
+
+    def get_downstream(self, target_ids: Iterable[str]) -> Set[str]:
+        """
+        获取公式及其所有（传递）下游公式
+
+        Args:
+            target_ids: 起始公式的目标项ID
+
+        Returns:
+            Set[str]: 包含起始公式在内的受影响公式集合
+        """
+        affected = set()
+        stack = [tid for tid in target_ids if tid in self.formula_sources]
+
+        while stack:
+            current = stack.pop()
+            if current in affected:
+                continue
+            affected.add(current)
+            stack.extend(self.target_dependents.get(current, ()))
+
+        return affected
+
+    def mark_source_changed(self, source_id: str) -> Set[str]:
+        """
+        标记来源项变化，返回受影响的公式
+
+        Args:
+            source_id: 来源项ID
+
+        Returns:
+            Set[str]: 新标记为脏的公式集合
+        """
+        affected = self.get_downstream(self.source_dependents.get(source_id, ()))
+        self.dirty.update(affected)
+        return affected
+
+    def mark_formula_changed(self, target_id: str) -> Set[str]:
+        """
+        标记公式变化，返回该公式及其下游公式
+
+        Args:
+            target_id: 目标项ID
+
+        Returns:
+            Set[str]: 新标记为脏的公式集合
+        """
+        affected = self.get_downstream([target_id])
+        self.dirty.update(affected)
+        return affected
+
+    def mark_target_changed(self, target_id: str) -> Set[str]:
+        """
+        标记目标项本身变化（新增、删除或内容变化），返回其公式及引用它的公式（含传递下游）
+
+        与mark_formula_changed不同，目标项没有公式时引用它的公式同样受影响
+
+        Args:
+            target_id: 目标项ID
+
+        Returns:
+            Set[str]: 新标记为脏的公式集合
+        """
+        affected = self.get_downstream([target_id, *self.target_dependents.get(target_id, ())])
+        self.dirty.update(affected)
+        return affected
+
+    def mark_all_dirty(self):
+        """标记所有公式需要重新计算"""
+        self.dirty.update(self.formula_sources.keys())
+
+    def pop_dirty(self) -> Set[str]:
+        """取出并清空脏公式集合"""
+        dirty = self.dirty
+        self.dirty = set()
+        return dirty
+
+    def topological_order(self, target_ids: Optional[Iterable[str]] = None) -> Tuple[List[str], List[List[str]]]:
+        """
+        对公式进行拓扑排序（上游先于下游）
+
+        Args:
+            target_ids: 需要排序的公式子集，None表示全部
+
+        Returns:
+            Tuple[List[str], List[List[str]]]: (可计算的顺序, 循环引用列表)
+        """
+        if target_ids is None:
+            nodes = set(self.formula_sources.keys())
+        else:
+            nodes = {tid for tid in target_ids if tid in self.formula_sources}
+
+        in_degree = {}
+        for node in nodes:
+            in_degree[node] = sum(1 for upstream in self.formula_targets[node] if upstream in nodes)
+
+        # 使用公式的原始顺序作为并列时的次序，保证结果确定
+        heap = [(self.formula_order[node], node) for node, degree in in_degree.items() if degree == 0]
+        heapq.heapify(heap)
+
+        order = []
+        while heap:
+            _, node = heapq.heappop(heap)
+            order.append(node)
+            for dependent in self.target_dependents.get(node, ()):
+                if dependent in in_degree:
+                    in_degree[dependent] -= 1
+                    if in_degree[dependent] == 0:
+                        heapq.heappush(heap, (self.formula_order[dependent], dependent))
+
+        cycles = []
+        if len(order) < len(nodes):
+            remaining = nodes.difference(order)
+            cycles = self._find_cycles(remaining)
+
+        return order, cycles
+
+    def _find_cycles(self, nodes: Set[str]) -> List[List[str]]:
+        """在给定节点中查找循环（Tarjan强连通分量）"""
+        index_of: Dict[str, int] = {}
+        low_link: Dict[str, int] = {}
+        on_stack: Set[str] = set()
+        stack: List[str] = []
+        cycles: List[List[str]] = []
+        counter = 0
+
+        ordered_nodes = sorted(nodes, key=lambda n: self.formula_order[n])
+
+        for root in ordered_nodes:
+            if root in index_of:
+                continue
+
+            # 迭代实现，避免长依赖链导致递归过深
+            work = [(root, iter(sorted(
+                (d for d in self.target_dependents.get(root, ()) if d in nodes),
+                key=lambda n: self.formula_order[n]
+            )))]
+            index_of[root] = low_link[root] = counter
+            counter += 1
+            stack.append(root)
+            on_stack.add(root)
+
+            while work:
+                node, children = work[-1]
+                advanced = False
+
+                for child in children:
+                    if child not in index_of:
+                        index_of[child] = low_link[child] = counter
+                        counter += 1
+                        stack.append(child)
+                        on_stack.add(child)
+                        work.append((child, iter(sorted(
+                            (d for d in self.target_dependents.get(child, ()) if d in nodes),
+                            key=lambda n: self.formula_order[n]
+                        ))))
+                        advanced = True
+                        break
+                    elif child in on_stack:
+                        low_link[node] = min(low_link[node], index_of[child])
+
+                if advanced:
+                    continue
+
+                work.pop()
+                if work:
+                    parent = work[-1][0]
+                    low_link[parent] = min(low_link[parent], low_link[node])
+
+                if low_link[node] == index_of[node]:
+                    component = []
+                    while True:
+                        member = stack.pop()
+                        on_stack.discard(member)
+                        component.append(member)
+                        if member == node:
+                            break
+
+                    is_self_loop = node in self.formula_targets.get(node, ())
+                    if len(component) > 1 or is_self_loop:
+                        component.sort(key=lambda n: self.formula_order[n])
+                        cycles.append(component)
+
+        return cycles
+
+    def connected_components(self, target_ids: Optional[Iterable[str]] = None,
+                             group_key: Optional[Callable[[str], Hashable]] = None) -> List[List[str]]:
+        """
+        按目标项之间的依赖划分互不相关的公式分组（弱连通分量）
+
+        Args:
+            target_ids: 需要划分的公式子集，None表示全部
+            group_key: 可选的分组键函数，键相同的公式也归入同一分组（如按快报工作表）
+
+        Returns:
+            List[List[str]]: 分组列表，组内及组间均按公式原始顺序排列
+        """
+        if target_ids is None:
+            nodes = list(self.formula_sources.keys())
+        else:
+            nodes = [tid for tid in target_ids if tid in self.formula_sources]
+        node_set = set(nodes)
+
+        parent = {node: node for node in nodes}
+
+        def find(node: str) -> str:
+            root = node
+            while parent[root] != root:
+                root = parent[root]
+            while parent[node] != root:
+                parent[node], node = root, parent[node]
+            return root
+
+        def union(a: str, b: str):
+            root_a, root_b = find(a), find(b)
+            if root_a != root_b:
+                parent[root_b] = root_a
+
+        group_roots: Dict[Hashable, str] = {}
+        for node in nodes:
+            for upstream_id in self.formula_targets.get(node, ()):
+                if upstream_id in node_set:
+                    union(node, upstream_id)
+            if group_key is not None:
+                key = group_key(node)
+                if key in group_roots:
+                    union(node, group_roots[key])
+                else:
+                    group_roots[key] = node
+
+        components: Dict[str, List[str]] = {}
+        for node in sorted(nodes, key=lambda n: self.formula_order[n]):
+            components.setdefault(find(node), []).append(node)
+
+        return list(components.values())
+
+    def find_cycles(self) -> List[List[str]]:
+        """
+        检测所有循环引用
+
+        Returns:
+            List[List[str]]: 每个循环包含的公式目标项ID
+        """
+        _, cycles = self.topological_order()
+        return cycles
+
+    def get_statistics(self) -> Dict[str, int]:
+        """获取依赖图统计信息"""
+        return {
+            "formulas": len(self.formula_sources),
+            "source_edges": sum(len(s) for s in self.formula_sources.values()),
+            "target_edges": sum(len(t) for t in self.formula_targets.values()),
+            "dirty_formulas": len(self.dirty)
+        }
@@ -7,7 +7,6 @@
 
 import os
 import json
-import openpyxl
 from typing import List, Dict, Tuple, Optional, Any
 from datetime import datetime
 import tkinter as tk
@@ -20,19 +19,23 @@ from models.data_models import (
     WorkbookManager, WorksheetInfo, SheetType,
     TargetItem, SourceItem
 )
+from utils.extraction_cache import ExtractionCache
+from utils.excel_utils import profile_sheet
 
 
 class FileManager:
     """文件管理器类"""
 
-    def __init__(self, classification_callback=None):
+    def __init__(self, classification_callback=None, cache: Optional[ExtractionCache] = None):
         """初始化文件管理器
 
         Args:
             classification_callback: 工作表分类确认回调函数 (已弃用，现在使用拖拽界面)
+            cache: 提取结果缓存，文件内容未变化时直接使用缓存的工作表信息，不再解析工作簿
         """
         self.workbook_manager: Optional[WorkbookManager] = None
         self.current_workbook = None
+        self.cache = cache
         self.config_file = "workbook_config.json"
         # 不再使用回调，改为直接自动分类
         # self.classification_callback = classification_callback
@@ -62,19 +65,28 @@ class FileManager:
 
             print(f"正在加载Excel文件: {file_path}")
 
-            # 加载工作簿
-            self.current_workbook = openpyxl.load_workbook(file_path, data_only=True)
-
-            # 创建工作簿管理器
+            # 创建工作簿管理器，工作簿通过其会话加载（后续提取、处理、导出共用）
             self.workbook_manager = WorkbookManager(file_path=file_path)
+            self.current_workbook = None
+
+            cached_worksheets = self.cache.load_worksheets(file_path) if self.cache else None
+            if cached_worksheets is not None:
+                # 文件内容未变化，使用缓存的工作表信息
+                print("文件未变化，使用缓存的工作表信息")
+                self.workbook_manager.worksheets.update(cached_worksheets)
+            else:
+                self.current_workbook = self.workbook_manager.get_session().get_workbook()
 
-            # 分析所有工作表
-            self._analyze_all_sheets()
+                # 分析所有工作表
+                self._analyze_all_sheets()
+
+                if self.cache:
+                    self.cache.save_worksheets(file_path, self.workbook_manager.worksheets)
 
             # 自动分类工作表
             self._auto_classify_sheets()
 
-            print(f"成功加载工作簿，包含 {len(self.current_workbook.sheetnames)} 个工作表")
+            print(f"成功加载工作簿，包含 {len(self.workbook_manager.worksheets)} 个工作表")
             return True, "文件加载成功"
 
         except Exception as e:
@@ -83,48 +95,70 @@ class FileManager:
             return False, error_msg
 
     def _analyze_all_sheets(self) -> None:
-        """分析所有工作表的基本信息"""
+        """分析所有工作表的基本信息（只读取尺寸和合并单元格，不遍历单元格，分类不必等待全表扫描）"""
         if not self.current_workbook or not self.workbook_manager:
             return
 
         for sheet_name in self.current_workbook.sheetnames:
             sheet = self.current_workbook[sheet_name]
+            stats = profile_sheet(sheet, include_cells=False)
 
-            # 统计单元格信息
-            total_cells = sheet.max_row * sheet.max_column if sheet.max_row and sheet.max_column else 0
-            non_empty_cells = 0
-            numeric_cells = 0
-            text_cells = 0
+            # 添加到工作簿管理器
+            sheet_info = self.workbook_manager.add_worksheet(sheet_name, SheetType.DATA_SOURCE)
+            self._apply_sheet_profile(sheet_info, stats)
+
+            print(f"分析工作表 '{sheet_name}': {stats['max_row']}x{stats['max_column']}, "
+                  f"合并单元格: {stats['merged_cell_ranges']}")
+
+    def _apply_sheet_profile(self, sheet_info: WorksheetInfo, stats: Dict[str, Any]) -> None:
+        """将profile_sheet的结果写入工作表信息"""
+        sheet_info.max_row = stats['max_row']
+        sheet_info.max_column = stats['max_column']
+        sheet_info.data_range = stats['data_range']
+        sheet_info.merged_cell_ranges = stats['merged_cell_ranges']
+        sheet_info.has_merged_cells = stats['merged_cell_ranges'] > 0
+
+        if stats['profiled']:
+            sheet_info.non_empty_cells = stats['non_empty_cells']
+            sheet_info.numeric_cells = stats['numeric_cells']
+            sheet_info.text_cells = stats['text_cells']
+            sheet_info.formula_cells = stats['formula_cells']
+            sheet_info.fill_rate = stats['fill_rate']
+            sheet_info.is_profiled = True
+            sheet_info.is_sampled = stats['sampled']
+
+    def profile_worksheets(self, sheet_names: Optional[List[str]] = None,
+                           sample_rows: Optional[int] = None) -> Dict[str, WorksheetInfo]:
+        """
+        统计工作表的单元格信息（填充率、数值/文本/公式单元格数），结果保存在WorksheetInfo上
 
-            for row in sheet.iter_rows():
-                for cell in row:
-                    if cell.value is not None and str(cell.value).strip():
-                        non_empty_cells += 1
-                        if isinstance(cell.value, (int, float)):
-                            numeric_cells += 1
-                        else:
-                            text_cells += 1
+        Args:
+            sheet_names: 要统计的工作表，None表示全部
+            sample_rows: 每个工作表最多统计的行数，超出部分按比例估算；None表示统计全部行
 
-            # 计算填充率
-            fill_rate = round(non_empty_cells / total_cells * 100, 2) if total_cells > 0 else 0
+        Returns:
+            Dict[str, WorksheetInfo]: 已统计的工作表信息
+        """
+        if not self.workbook_manager:
+            return {}
 
-            # 添加到工作簿管理器
-            sheet_info = self.workbook_manager.add_worksheet(sheet_name, SheetType.DATA_SOURCE)
+        session = self.workbook_manager.get_session()
+        profiled = {}
 
-            # 更新额外的元数据
-            sheet_info.max_row = sheet.max_row or 0
-            sheet_info.max_column = sheet.max_column or 0
-            sheet_info.has_merged_cells = len(list(sheet.merged_cells)) > 0
-            if sheet.max_column and sheet.max_row:
-                try:
-                    col_letter = chr(64 + min(sheet.max_column, 26))  # 限制在A-Z范围内
-                    sheet_info.data_range = f"A1:{col_letter}{sheet.max_row}"
-                except:
-                    sheet_info.data_range = "A1:Z1000"  # 默认范围
-            else:
-                sheet_info.data_range = "A1:A1"
+        for sheet_name in sheet_names or list(self.workbook_manager.worksheets):
+            sheet_info = self.workbook_manager.worksheets.get(sheet_name)
+            if sheet_info is None:
+                continue
 
-            print(f"分析工作表 '{sheet_name}': {sheet.max_row}x{sheet.max_column}, 填充率: {fill_rate}%")
+            if not sheet_info.is_profiled or (sheet_info.is_sampled and sample_rows is None):
+                sheet = session.get_sheet(sheet_name)
+                if sheet is None:
+                    continue
+                self._apply_sheet_profile(sheet_info, profile_sheet(sheet, sample_rows=sample_rows))
+
+            profiled[sheet_name] = sheet_info
+
+        return profiled
 
     def _auto_classify_sheets(self) -> None:
         """自动分类工作表"""
@@ -289,6 +323,9 @@ class FileManager:
             if config_path is None:
                 config_path = self.config_file
 
+            # 保存的配置包含填充率，先补全单元格统计
+            self.profile_worksheets()
+
             config_data = {
                 'file_info': {
                     'file_path': self.workbook_manager.file_path,
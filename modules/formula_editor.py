@@ -828,7 +828,7 @@ class FormulaEditor:
         else:
             mapping_formula = self.workbook_manager.mapping_formulas[self.ui_state.current_target_id]
             mapping_formula.formula = formula_content
-            mapping_formula.last_modified = datetime.now()
+            mapping_formula.modified_time = datetime.now()
 
         # 保存到管理器
         self.workbook_manager.mapping_formulas[self.ui_state.current_target_id] = mapping_formula
@@ -0,0 +1,178 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+并行计算后端
+按依赖图把公式划分为互不相关的分组（或按快报工作表分组），
+在进程池中并行计算各分组，结果按公式原始顺序合并回工作簿
+"""
+
+import heapq
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from typing import Dict, List, Tuple, Any
+
+from models.data_models import WorkbookManager, CalculationResult, FormulaStatus
+from modules.dependency_graph import FormulaDependencyGraph
+
+
+# 子进程内的计算引擎（由进程池初始化函数创建，同一进程内的所有分组共用，引用索引只构建一次）
+_worker_engine = None
+
+
+def _init_worker(file_path: str, source_items: Dict[str, Any], target_items: Dict[str, Any]):
+    """进程池初始化：在子进程内创建只包含来源项和目标项的工作簿及计算引擎"""
+    global _worker_engine
+    from modules.calculation_engine import CalculationEngine
+
+    workbook_manager = WorkbookManager(file_path=file_path)
+    workbook_manager.source_items = source_items
+    workbook_manager.target_items = target_items
+    _worker_engine = CalculationEngine(workbook_manager)
+
+
+def _calculate_partition(formulas: Dict[str, Any],
+                         upstream_results: Dict[str, CalculationResult]) -> List[CalculationResult]:
+    """
+    在子进程中计算一个分组
+
+    Args:
+        formulas: 分组内的公式 {target_id: MappingFormula}
+        upstream_results: 分组外被引用的目标项的已有计算结果
+
+    Returns:
+        List[CalculationResult]: 分组内公式的计算结果
+    """
+    workbook_manager = _worker_engine.workbook_manager
+    workbook_manager.mapping_formulas = formulas
+    workbook_manager.calculation_results = dict(upstream_results)
+    return _worker_engine.calculate_all_formulas(show_progress=False, backend="python")
+
+
+class ParallelCalculator:
+    """基于进程池的分组并行计算"""
+
+    # 支持的分组方式
+    PARTITION_MODES = ("component", "sheet")
+
+    def __init__(self, workbook_manager: WorkbookManager, max_workers: int):
+        """
+        初始化并行计算后端
+
+        Args:
+            workbook_manager: 工作簿管理器
+            max_workers: 进程数
+        """
+        self.workbook_manager = workbook_manager
+        self.max_workers = max_workers
+
+    def partition(self, target_ids: List[str], dependency_graph: FormulaDependencyGraph,
+                  partition_by: str = "component") -> List[List[str]]:
+        """
+        划分计算任务，互相引用的公式总在同一任务中
+
+        Args:
+            target_ids: 需要计算的公式目标项ID
+            dependency_graph: 公式依赖图
+            partition_by: "component"按依赖图连通分量划分并均衡打包，"sheet"按快报工作表划分
+
+        Returns:
+            List[List[str]]: 任务列表
+        """
+        if partition_by not in self.PARTITION_MODES:
+            raise ValueError(f"不支持的分组方式: {partition_by}")
+
+        if partition_by == "sheet":
+            target_items = self.workbook_manager.target_items
+
+            def sheet_of(target_id: str) -> str:
+                target = target_items.get(target_id)
+                return target.sheet_name if target else ""
+
+            return dependency_graph.connected_components(target_ids, group_key=sheet_of)
+
+        components = dependency_graph.connected_components(target_ids)
+
+        # 连通分量通常很多且很小，按公式数量均衡地装入若干任务（每个进程约4个任务）
+        task_count = min(len(components), self.max_workers * 4)
+        if task_count <= 1:
+            return components
+
+        heap: List[Tuple[int, int]] = [(0, i) for i in range(task_count)]
+        tasks: List[List[str]] = [[] for _ in range(task_count)]
+        for component in sorted(components, key=len, reverse=True):
+            size, index = heapq.heappop(heap)
+            tasks[index].extend(component)
+            heapq.heappush(heap, (size + len(component), index))
+
+        order = dependency_graph.formula_order
+        for task in tasks:
+            task.sort(key=lambda tid: order[tid])
+        return [task for task in tasks if task]
+
+    def _get_upstream_results(self, task: List[str],
+                              dependency_graph: FormulaDependencyGraph) -> Dict[str, CalculationResult]:
+        """任务内公式引用、但不在任务内的目标项的已有结果（如已由向量化后端算出）"""
+        task_ids = set(task)
+        upstream_results = {}
+        for target_id in task:
+            for upstream_id in dependency_graph.formula_targets.get(target_id, ()):
+                if upstream_id in task_ids or upstream_id in upstream_results:
+                    continue
+                result = self.workbook_manager.calculation_results.get(upstream_id)
+                if result is not None:
+                    upstream_results[upstream_id] = result
+        return upstream_results
+
+    def calculate(self, tasks: List[List[str]], dependency_graph: FormulaDependencyGraph,
+                  show_progress: bool = False) -> Dict[str, CalculationResult]:
+        """
+        在进程池中计算所有任务
+
+        Args:
+            tasks: partition返回的任务列表
+            dependency_graph: 公式依赖图
+            show_progress: 是否显示进度
+
+        Returns:
+            Dict[str, CalculationResult]: {target_id: 计算结果}（尚未写回工作簿）
+        """
+        mapping_formulas = self.workbook_manager.mapping_formulas
+        results: Dict[str, CalculationResult] = {}
+        total = sum(len(task) for task in tasks)
+        finished = 0
+
+        with ProcessPoolExecutor(
+            max_workers=self.max_workers,
+            initializer=_init_worker,
+            initargs=(self.workbook_manager.file_path,
+                      self.workbook_manager.source_items,
+                      self.workbook_manager.target_items)
+        ) as executor:
+            futures = {}
+            for task in tasks:
+                formulas = {tid: mapping_formulas[tid] for tid in task}
+                future = executor.submit(_calculate_partition, formulas,
+                                         self._get_upstream_results(task, dependency_graph))
+                futures[future] = task
+
+            for future in as_completed(futures):
+                for result in future.result():
+                    results[result.target_id] = result
+
+                finished += len(futures[future])
+                if show_progress:
+                    print(f"进度: {finished}/{total}")
+
+        return results
+
+    def apply_results(self, results: Dict[str, CalculationResult]):
+        """将子进程的结果同步到主进程的公式对象和工作簿（按公式原始顺序写入）"""
+        for target_id, formula in self.workbook_manager.mapping_formulas.items():
+            result = results.get(target_id)
+            if result is None:
+                continue
+
+            if result.success:
+                formula.status = FormulaStatus.CALCULATED
+                formula.calculation_result = result.result
+                formula.last_calculated = result.calculated_time
+            self.workbook_manager.calculation_results[target_id] = result
@@ -0,0 +1,437 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+对账推导模块
+已知目标项的金额（如上期报表数），在来源项的所有数值列中搜索少数几个引用的带符号之和，
+使其在容差内等于该金额，并生成 [工作表:"项目名"](单元格) 格式的候选公式。
+1、2项用排序数组二分查找，3、4项用两两和表的折半（meet-in-the-middle）查找；
+同一工作表同一列中互为上下级科目的引用不会同时出现（避免重复计算）。
+与AIMapper.generate_mappings互补：完全离线、结果确定
+"""
+
+import math
+from dataclasses import dataclass, field
+from typing import Any, Dict, Iterable, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+from models.data_models import WorkbookManager, MappingFormula, FormulaStatus
+from utils.excel_utils_v2 import build_formula_reference_v2, validate_formula_syntax_v2
+from utils.similarity_index import NameSimilarityIndex
+
+
+@dataclass
+class ReconciliationTerm:
+    """候选公式中的一项"""
+
+    source_id: str
+    column_key: str  # 为空表示来源项的主要数值
+    value: float
+    sign: int  # 1 或 -1
+    reference: str  # 公式引用字符串
+
+
+@dataclass
+class ReconciliationCandidate:
+    """候选公式"""
+
+    terms: List[ReconciliationTerm]
+    total: float  # 各项带符号之和
+    difference: float  # 与目标金额之差的绝对值
+    formula: str
+    similarity: float = 0.0  # 引用项目名称与目标项名称的最大相似度
+    notes: List[str] = field(default_factory=list)
+
+    @property
+    def term_count(self) -> int:
+        return len(self.terms)
+
+
+class ReconciliationEngine:
+    """对账推导引擎"""
+
+    # 折半查找由两张两两和表拼接，最多4项
+    MAX_TERMS = 4
+    # 允许相减时，单项绝对值不超过目标金额的倍数
+    MAGNITUDE_RATIO = 2.0
+    # 每种项数最多检查的候选组合数（控制最坏情况下的耗时），以及每批检查的数量
+    MAX_CHECKS = 1 << 22
+    CHECK_CHUNK = 1 << 16
+
+    def __init__(self, workbook_manager: WorkbookManager, tolerance: float = 0.01, max_terms: int = 3,
+                 allow_subtraction: bool = True, max_pool: int = 1500, max_results: int = 10):
+        """
+        初始化对账推导引擎
+
+        Args:
+            workbook_manager: 工作簿管理器
+            tolerance: 默认容差
+            max_terms: 默认最多引用的项数（1-4）
+            allow_subtraction: 是否允许相减
+            max_pool: 3项及以上的折半查找最多使用的带符号数值个数（两两和表约为其平方的一半）
+            max_results: 默认返回的候选公式数量
+        """
+        self.workbook_manager = workbook_manager
+        self.tolerance = tolerance
+        self.max_terms = max_terms
+        self.allow_subtraction = allow_subtraction
+        self.max_pool = max_pool
+        self.max_results = max_results
+
+        self.last_statistics: Dict[str, Any] = {}
+
+    def find_formulas(self, target_value: float, target_id: Optional[str] = None,
+                      tolerance: Optional[float] = None, max_terms: Optional[int] = None,
+                      column_keys: Optional[Iterable[str]] = None, sheet_names: Optional[Iterable[str]] = None,
+                      max_results: Optional[int] = None) -> List[ReconciliationCandidate]:
+        """
+        搜索带符号之和等于目标金额的引用组合
+
+        Args:
+            target_value: 目标金额
+            target_id: 目标项ID（提供时按名称相似度排列同等的候选）
+            tolerance: 容差，None时使用默认值
+            max_terms: 最多引用的项数，None时使用默认值
+            column_keys: 只使用这些列键（空字符串表示主要数值），None表示所有列
+            sheet_names: 只使用这些工作表，None表示所有数据来源表
+            max_results: 返回数量，None时使用默认值
+
+        Returns:
+            List[ReconciliationCandidate]: 候选公式，项数少、差额小的在前
+        """
+        tolerance = self.tolerance if tolerance is None else tolerance
+        max_terms = self.max_terms if max_terms is None else max_terms
+        max_results = self.max_results if max_results is None else max_results
+        if not 1 <= max_terms <= self.MAX_TERMS:
+            raise ValueError(f"max_terms必须在1到{self.MAX_TERMS}之间")
+        if not math.isfinite(target_value) or abs(target_value) <= tolerance:
+            return []
+
+        cells, cell_values = self._collect_cells(target_value, tolerance, column_keys, sheet_names)
+        self.last_statistics = {'cells': len(cells), 'checked': 0}
+        if not cells:
+            return []
+
+        # 带符号的数值池：每个单元格一项（允许相减时再加一个负项），按数值升序
+        pool_values = cell_values
+        pool_cells = np.arange(len(cells), dtype=np.int64)
+        pool_signs = np.ones(len(cells), dtype=np.int64)
+        if self.allow_subtraction:
+            pool_values = np.concatenate([pool_values, -pool_values])
+            pool_cells = np.concatenate([pool_cells, pool_cells])
+            pool_signs = np.concatenate([pool_signs, -pool_signs])
+        order = np.argsort(pool_values, kind='stable')
+        pool = (pool_values[order], pool_cells[order], pool_signs[order])
+        conflicts = self._conflict_keys(cells)
+        self.last_statistics['conflicts'] = len(conflicts)
+
+        combinations: List[Tuple[int, ...]] = []
+        limit = max_results * 4
+        for term_count in range(1, max_terms + 1):
+            if term_count == 1:
+                found = self._search_single(pool, target_value, tolerance)
+            elif term_count == 2:
+                found = self._search_pairs(pool, conflicts, target_value, tolerance, limit)
+            else:
+                found = self._search_meet_in_middle(pool, conflicts, target_value, tolerance, term_count, limit)
+            combinations.extend(found)
+            if len(combinations) >= max_results:
+                break
+        self.last_statistics['combinations'] = len(combinations)
+
+        candidates = self._build_candidates(combinations, pool, cells, target_value)
+        self._rank(candidates, target_id)
+        return candidates[:max_results]
+
+    def _collect_cells(self, target_value: float, tolerance: float, column_keys: Optional[Iterable[str]],
+                       sheet_names: Optional[Iterable[str]]) -> Tuple[List[Tuple[str, str]], np.ndarray]:
+        """
+        从数值索引中取出可能参与组合的单元格（金额相同的单元格各自保留，可以同时出现在一个公式中）
+
+        Returns:
+            Tuple[List[Tuple[str, str]], np.ndarray]: ([(来源项ID, 列键)], 各单元格数值)
+        """
+        if self.allow_subtraction:
+            bound = abs(target_value) * self.MAGNITUDE_RATIO + tolerance
+            entries = self.workbook_manager.get_search_service().value_index.range(-bound, bound)
+        else:
+            # 只相加时各项与目标金额同号且不超过目标金额
+            low, high = (0.0, target_value + tolerance) if target_value > 0 else (target_value - tolerance, 0.0)
+            entries = self.workbook_manager.get_search_service().value_index.range(low, high)
+
+        column_keys = set(column_keys) if column_keys is not None else None
+        sheet_names = set(sheet_names) if sheet_names is not None else None
+        get_sheet_name = getattr(self.workbook_manager.source_items, 'get_sheet_name', None)
+
+        cells: List[Tuple[str, str]] = []
+        values: List[float] = []
+        for source_id, column_key, value in entries:
+            if value == 0 or (column_keys is not None and column_key not in column_keys):
+                continue
+            if sheet_names is not None:
+                sheet_name = get_sheet_name(source_id) if get_sheet_name is not None \
+                    else self.workbook_manager.source_items[source_id].sheet_name
+                if sheet_name not in sheet_names:
+                    continue
+            cells.append((source_id, column_key))
+            values.append(value)
+        return cells, np.asarray(values, dtype=np.float64)
+
+    def _conflict_keys(self, cells: List[Tuple[str, str]]) -> np.ndarray:
+        """
+        同一工作表同一列中互为上下级科目（科目代码前缀或父级科目代码）的单元格对，组合时排除
+
+        Returns:
+            np.ndarray: 单元格对的键 较小下标 * 单元格数 + 较大下标，升序
+        """
+        source_items = self.workbook_manager.source_items
+        get_sheet_name = getattr(source_items, 'get_sheet_name', None)
+        get_account_codes = getattr(source_items, 'get_account_codes', None)
+
+        # (工作表, 列键, 科目代码) -> [单元格下标]
+        by_code: Dict[Tuple[str, str, str], List[int]] = {}
+        coded: List[Tuple[int, Tuple[str, str], str, str]] = []
+        for index, (source_id, column_key) in enumerate(cells):
+            if get_account_codes is not None:
+                account_code, parent_code = get_account_codes(source_id)
+                sheet_name = get_sheet_name(source_id)
+            else:
+                source = source_items[source_id]
+                account_code, parent_code, sheet_name = source.account_code, source.parent_code, source.sheet_name
+            if account_code:
+                by_code.setdefault((sheet_name, column_key, account_code), []).append(index)
+                coded.append((index, (sheet_name, column_key), account_code, parent_code))
+
+        count = len(cells)
+        keys = set()
+        for index, scope, account_code, parent_code in coded:
+            ancestors = {account_code[:length] for length in range(1, len(account_code))}
+            if parent_code:
+                ancestors.add(parent_code)
+            ancestors.discard(account_code)
+            for ancestor_code in ancestors:
+                for other in by_code.get(scope + (ancestor_code,), ()):
+                    keys.add(min(index, other) * count + max(index, other))
+        return np.sort(np.fromiter(keys, dtype=np.int64, count=len(keys)))
+
+    @staticmethod
+    def _window(sorted_values: np.ndarray, wanted: np.ndarray, tolerance: float) -> Tuple[np.ndarray, np.ndarray]:
+        """sorted_values中落在 wanted±tolerance 内的区间"""
+        return (np.searchsorted(sorted_values, wanted - tolerance, side='left'),
+                np.searchsorted(sorted_values, wanted + tolerance, side='right'))
+
+    def _iter_matches(self, starts: np.ndarray, ends: np.ndarray) -> Iterable[Tuple[np.ndarray, np.ndarray]]:
+        """
+        分批展开 [starts[i], ends[i]) 区间为 (查询下标, 匹配下标)，总数不超过MAX_CHECKS
+
+        Yields:
+            Tuple[np.ndarray, np.ndarray]: (查询下标, 匹配下标)
+        """
+        lengths = np.maximum(ends - starts, 0)
+        cumulative = np.cumsum(lengths)
+        total = min(int(cumulative[-1]) if len(cumulative) else 0, self.MAX_CHECKS)
+        for chunk_start in range(0, total, self.CHECK_CHUNK):
+            positions = np.arange(chunk_start, min(chunk_start + self.CHECK_CHUNK, total), dtype=np.int64)
+            queries = np.searchsorted(cumulative, positions, side='right')
+            offsets = positions - (cumulative[queries] - lengths[queries])
+            self.last_statistics['checked'] += len(positions)
+            yield queries, starts[queries] + offsets
+
+    @staticmethod
+    def _conflicting(conflicts: np.ndarray, count: int, first: np.ndarray, second: np.ndarray) -> np.ndarray:
+        """单元格对是否互为上下级科目"""
+        if not len(conflicts):
+            return np.zeros(len(first), dtype=bool)
+        keys = np.minimum(first, second) * count + np.maximum(first, second)
+        positions = np.minimum(np.searchsorted(conflicts, keys), len(conflicts) - 1)
+        return conflicts[positions] == keys
+
+    def _collect_matches(self, pool, conflicts: np.ndarray, match_parts: Sequence[np.ndarray],
+                         query_parts: Sequence[np.ndarray], starts: np.ndarray, ends: np.ndarray,
+                         limit: int) -> List[Tuple[int, ...]]:
+        """
+        检查 匹配项 + 查询项 的组合：池下标递增（每个组合只出现一次）、单元格不重复、不含上下级科目对。
+        不合格的组合在计数前排除，不占用limit
+
+        Args:
+            pool: 数值池 (数值, 单元格下标, 符号)
+            conflicts: _conflict_keys的结果
+            match_parts: 每个匹配下标对应的各项池下标
+            query_parts: 每个查询下标对应的各项池下标
+            starts: 各查询的匹配区间起点
+            ends: 各查询的匹配区间终点
+            limit: 最多返回的组合数
+
+        Returns:
+            List[Tuple[int, ...]]: 组合（池下标，递增）
+        """
+        cells = pool[1]
+        cell_count = int(cells.max()) + 1 if len(cells) else 0
+        combinations: List[Tuple[int, ...]] = []
+        for queries, matches in self._iter_matches(starts, ends):
+            first = [part[matches] for part in match_parts]
+            rest = [part[queries] for part in query_parts]
+            keep = first[-1] < rest[0]
+            for left in first:
+                for right in rest:
+                    keep &= cells[left] != cells[right]
+                    keep &= ~self._conflicting(conflicts, cell_count, cells[left], cells[right])
+            combinations.extend(zip(*(part[keep].tolist() for part in first + rest)))
+            if len(combinations) >= limit:
+                break
+        return combinations[:limit]
+
+    def _search_single(self, pool, target_value: float, tolerance: float) -> List[Tuple[int, ...]]:
+        """1项：单元格数值本身（或其相反数）等于目标金额"""
+        start, end = self._window(pool[0], np.asarray([target_value]), tolerance)
+        return [(i,) for i in range(int(start[0]), int(end[0]))]
+
+    def _search_pairs(self, pool, conflicts: np.ndarray, target_value: float, tolerance: float,
+                      limit: int) -> List[Tuple[int, ...]]:
+        """2项：对每个数值二分查找 目标金额 - 数值（只在它之前的数值中查找）"""
+        values = pool[0]
+        indexes = np.arange(len(values), dtype=np.int64)
+        starts, ends = self._window(values, target_value - values, tolerance)
+        ends = np.minimum(ends, indexes)
+        return self._collect_matches(pool, conflicts, (indexes,), (indexes,), starts, ends, limit)
+
+    def _pair_table(self, pool_indexes: np.ndarray, pool,
+                    conflicts: np.ndarray) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+        """
+        数值池的两两和表，按和升序；同一单元格的正负两项、互为上下级科目的单元格对在建表时排除
+
+        Returns:
+            Tuple[np.ndarray, np.ndarray, np.ndarray]: (和, 第一项池下标, 第二项池下标)，第一项下标小于第二项
+        """
+        values, cells, _ = pool
+        left, right = np.triu_indices(len(pool_indexes), 1)
+        left, right = pool_indexes[left], pool_indexes[right]
+        cell_count = int(cells.max()) + 1
+        keep = (cells[left] != cells[right]) & ~self._conflicting(conflicts, cell_count, cells[left], cells[right])
+        left, right = left[keep], right[keep]
+        sums = values[left] + values[right]
+        order = np.argsort(sums, kind='stable')
+        return sums[order], left[order], right[order]
+
+    def _limited_pool(self, pool, target_value: float) -> np.ndarray:
+        """3项及以上使用的数值池下标：超过max_pool时保留数量级最接近目标金额一半的数值"""
+        values = pool[0]
+        indexes = np.arange(len(values))
+        if len(values) <= self.max_pool:
+            return indexes
+        distance = np.abs(np.log10(np.abs(values)) - math.log10(abs(target_value) / 2))
+        kept = np.argpartition(distance, self.max_pool - 1)[:self.max_pool]
+        return np.sort(kept)
+
+    def _search_meet_in_middle(self, pool, conflicts: np.ndarray, target_value: float, tolerance: float,
+                               term_count: int, limit: int) -> List[Tuple[int, ...]]:
+        """3、4项：单项或两两和 + 两两和表中二分查找剩余部分"""
+        pool_indexes = self._limited_pool(pool, target_value)
+        sums, left, right = self._pair_table(pool_indexes, pool, conflicts)
+        if not len(sums):
+            return []
+
+        if term_count == 3:
+            # 查询项c，匹配两两和(a, b)
+            query_values, query_parts = pool[0][pool_indexes], (pool_indexes,)
+        else:
+            # 查询两两和(c, d)，匹配两两和(a, b)
+            query_values, query_parts = sums, (left, right)
+
+        starts, ends = self._window(sums, target_value - query_values, tolerance)
+        return self._collect_matches(pool, conflicts, (left, right), query_parts, starts, ends, limit)
+
+    def _build_candidates(self, combinations: Sequence[Tuple[int, ...]], pool, cells: List[Tuple[str, str]],
+                          target_value: float) -> List[ReconciliationCandidate]:
+        """把池下标组合转换为引用具体单元格的候选公式"""
+        values, pool_cells, signs = pool
+        source_items = self.workbook_manager.source_items
+        candidates = []
+
+        for combination in combinations:
+            # 正项在前，便于生成以引用开头的公式
+            combination = sorted(combination, key=lambda i: (-int(signs[i]), -abs(values[i])))
+            terms = []
+            for i in combination:
+                source_id, column_key = cells[int(pool_cells[i])]
+                source = source_items[source_id]
+                reference = build_formula_reference_v2(source.sheet_name, source.name, source.cell_address,
+                                                       column_key or None)
+                terms.append(ReconciliationTerm(source_id, column_key, float(values[i] * signs[i]),
+                                                int(signs[i]), reference))
+
+            formula = self._format_formula(terms)
+            is_valid, _ = validate_formula_syntax_v2(formula)
+            if not is_valid:
+                continue
+
+            total = sum(term.sign * term.value for term in terms)
+            candidates.append(ReconciliationCandidate(terms, total, abs(total - target_value), formula))
+
+        return candidates
+
+    @staticmethod
+    def _format_formula(terms: List[ReconciliationTerm]) -> str:
+        """生成公式文本，如 [表:"A"](C5) + [表:"B"](C6) - [表:"C"](C7)"""
+        parts = []
+        for index, term in enumerate(terms):
+            if index == 0:
+                parts.append(term.reference if term.sign > 0 else f"-{term.reference}")
+            else:
+                parts.append(f"{'+' if term.sign > 0 else '-'} {term.reference}")
+        return " ".join(parts)
+
+    def _rank(self, candidates: List[ReconciliationCandidate], target_id: Optional[str]):
+        """排序：项数少、差额小、使用的列键少、减项少、与目标项名称相似的在前"""
+        target = self.workbook_manager.target_items.get(target_id) if target_id else None
+        if target is not None and candidates:
+            source_items = self.workbook_manager.source_items
+            source_ids = list(dict.fromkeys(term.source_id for candidate in candidates for term in candidate.terms))
+            index = NameSimilarityIndex().fit(source_ids, [source_items[source_id].name for source_id in source_ids])
+            scores = dict(index.most_similar(target.name, len(source_ids)))
+            for candidate in candidates:
+                candidate.similarity = max(scores.get(term.source_id, 0.0) for term in candidate.terms)
+
+        candidates.sort(key=lambda candidate: (
+            candidate.term_count,
+            round(candidate.difference, 6),
+            len({term.column_key for term in candidate.terms}),
+            sum(1 for term in candidate.terms if term.sign < 0),
+            -candidate.similarity,
+            candidate.formula
+        ))
+
+    def generate_mappings(self, target_values: Dict[str, float],
+                          **options) -> Tuple[bool, List[MappingFormula]]:
+        """
+        为已知金额的目标项生成映射公式（每个目标项取排名第一的候选）
+
+        Args:
+            target_values: {目标项ID: 已知金额}
+            **options: 传给find_formulas的参数（tolerance、max_terms、column_keys、sheet_names）
+
+        Returns:
+            Tuple[bool, List[MappingFormula]]: (是否成功, 映射公式列表)
+        """
+        mapping_formulas = []
+        try:
+            for target_id, value in target_values.items():
+                if target_id not in self.workbook_manager.target_items:
+                    continue
+                candidates = self.find_formulas(value, target_id=target_id, max_results=1, **options)
+                if not candidates:
+                    continue
+
+                best = candidates[0]
+                mapping_formula = MappingFormula(target_id=target_id, formula=best.formula,
+                                                 status=FormulaStatus.PENDING)
+                mapping_formula.notes = f"对账推导: {best.term_count} 项合计 {best.total:,.2f}，差额 {best.difference:.4f}"
+                mapping_formula.set_validation_result(True)
+                mapping_formulas.append(mapping_formula)
+
+            print(f"对账推导: {len(target_values)} 个目标项，生成 {len(mapping_formulas)} 个公式")
+            return True, mapping_formulas
+
+        except Exception as e:
+            print(f"对账推导失败: {e}")
+            return False, []
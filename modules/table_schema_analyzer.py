@@ -11,6 +11,8 @@ from enum import Enum
 import openpyxl
 from openpyxl.worksheet.worksheet import Worksheet
 
+from utils.pattern_rules import PriorityMatcher
+
 class TableType(Enum):
     """表格类型枚举"""
     BALANCE_SHEET = "资产负债表"
@@ -19,6 +21,14 @@ class TableType(Enum):
     TRIAL_BALANCE = "科目余额表"
     UNKNOWN = "未知表格"
 
+# 预编译的判断模式
+CHINESE_PATTERN = re.compile(r'[\u4e00-\u9fff]')
+_CODE_HEADER_PATTERN = re.compile(r'代码|code|编号|number', re.IGNORECASE)
+_CODE_VALUE_PATTERN = re.compile(r'^\d{4,8}')
+_NAME_HEADER_PATTERN = re.compile(r'名称|项目|科目|name|item|account', re.IGNORECASE)
+_PLAIN_NUMBER_PATTERN = re.compile(r'^\d+\.?\d*$')
+
+
 @dataclass
 class ColumnInfo:
     """列信息"""
@@ -28,6 +38,7 @@ class ColumnInfo:
     secondary_header: str = ""  # 二级列头
     data_type: str = "unknown"  # 数据类型：debit, credit, amount, text
     is_numeric: bool = False  # 是否为数值列
+    column_key: Optional[str] = None  # 数据列键名（按工作表解析一次后缓存，见DataExtractor._get_numeric_columns）
 
 @dataclass
 class TableSchema:
@@ -76,6 +87,10 @@ class TableSchemaAnalyzer:
             'balance': [r'余额', r'balance']
         }
 
+        # 启动时把各组模式编译为一个正则，识别时只扫描一次文本
+        self._table_type_matcher = PriorityMatcher(self.table_type_patterns.items(), re.IGNORECASE)
+        self._data_type_matcher = PriorityMatcher(self.column_patterns.items(), re.IGNORECASE)
+
     def analyze_table_schema(self, sheet: Worksheet) -> TableSchema:
         """分析表格模式"""
         # 识别表格类型
@@ -119,12 +134,7 @@ class TableSchemaAnalyzer:
         combined_text = ' '.join([sheet_name] + all_text)
 
         # 匹配表格类型
-        for table_type, patterns in self.table_type_patterns.items():
-            for pattern in patterns:
-                if re.search(pattern, combined_text, re.IGNORECASE):
-                    return table_type
-
-        return TableType.UNKNOWN
+        return self._table_type_matcher.first(combined_text) or TableType.UNKNOWN
 
     def _analyze_headers(self, sheet: Worksheet) -> Dict[str, Any]:
         """分析列头结构"""
@@ -233,17 +243,12 @@ class TableSchemaAnalyzer:
         combined = (primary + " " + secondary).lower()
 
         # 检查各种类型
-        for data_type, patterns in self.column_patterns.items():
-            for pattern in patterns:
-                if re.search(pattern, combined, re.IGNORECASE):
-                    return data_type
-
-        return "amount"
+        return self._data_type_matcher.first(combined) or "amount"
 
     def _is_code_column(self, header_text: str, sample_values: List[str]) -> bool:
         """判断是否为编码列"""
         # 检查列头
-        if re.search(r'代码|code|编号|number', header_text, re.IGNORECASE):
+        if _CODE_HEADER_PATTERN.search(header_text):
             return True
 
         # 检查数据特征
@@ -253,7 +258,7 @@ class TableSchemaAnalyzer:
         numeric_count = 0
         for value in sample_values[:5]:  # 检查前5个值
             # 科目代码通常是纯数字或以数字开头
-            if re.match(r'^\d{4,8}', value):
+            if _CODE_VALUE_PATTERN.match(value):
                 numeric_count += 1
 
         return numeric_count >= len(sample_values) * 0.7
@@ -261,10 +266,8 @@ class TableSchemaAnalyzer:
     def _is_name_column(self, header_text: str, sample_values: List[str], table_type: TableType) -> bool:
         """判断是否为名称列"""
         # 检查列头
-        name_patterns = [r'名称|项目|科目|name|item|account']
-        for pattern in name_patterns:
-            if re.search(pattern, header_text, re.IGNORECASE):
-                return True
+        if _NAME_HEADER_PATTERN.search(header_text):
+            return True
 
         # 检查数据特征
         if not sample_values:
@@ -273,7 +276,7 @@ class TableSchemaAnalyzer:
         chinese_count = 0
         for value in sample_values[:5]:
             # 包含中文且不是纯数字
-            if re.search(r'[\u4e00-\u9fff]', value) and not re.match(r'^\d+\.?\d*$', value):
+            if CHINESE_PATTERN.search(value) and not _PLAIN_NUMBER_PATTERN.match(value):
                 chinese_count += 1
 
         return chinese_count >= len(sample_values) * 0.7
@@ -325,7 +328,7 @@ class TableSchemaAnalyzer:
                 cell = sheet.cell(row=row, column=col)
                 if cell.value:
                     value_str = str(cell.value).strip()
-                    if re.search(r'[\u4e00-\u9fff]', value_str):  # 包含中文
+                    if CHINESE_PATTERN.search(value_str):  # 包含中文
                         has_name = True
                     elif isinstance(cell.value, (int, float)) or self._is_numeric_string(value_str):
                         has_number = True
@@ -0,0 +1,212 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+向量化计算后端
+将来源项数值排列为稠密向量（每个 (来源项, 列键) 一个槽位），
+把线性映射公式编译为稀疏系数矩阵，全量重算只需一次稀疏矩阵-向量乘法
+"""
+
+from typing import Dict, List, Optional, Tuple, Any
+
+import numpy as np
+
+from models.data_models import WorkbookManager, SourceItem
+from utils.reference_index import iter_source_references, read_source_value
+from utils.formula_compiler import CompiledFormula
+
+
+class VectorizedCalculator:
+    """基于NumPy的批量公式计算后端
+
+    只处理引用全部精确命中来源项槽位的线性公式（引用的加减及常数倍），
+    其余公式（含引用相乘、除以引用、引用目标项或需要模糊匹配）由调用方走标量路径。
+    """
+
+    def __init__(self, workbook_manager: WorkbookManager):
+        """
+        初始化向量化计算后端
+
+        Args:
+            workbook_manager: 工作簿管理器
+        """
+        self.workbook_manager = workbook_manager
+
+        # 值向量布局
+        self.slot_index: Dict[str, int] = {}  # 引用字符串 -> 槽位
+        self.source_slots: Dict[str, List[Tuple[int, str]]] = {}  # 来源项ID -> [(槽位, 列键)]
+        self.values = np.zeros(0, dtype=np.float64)
+        self._layout_version = 0
+        self._layout_built = False
+
+        # 稀疏系数矩阵（COO格式）
+        self.row_target_ids: List[str] = []
+        self.rows = np.zeros(0, dtype=np.int64)
+        self.cols = np.zeros(0, dtype=np.int64)
+        self.coefficients = np.zeros(0, dtype=np.float64)
+        self.constants = np.zeros(0, dtype=np.float64)
+        self._matrix_signature: Optional[Tuple[Any, ...]] = None
+
+    @staticmethod
+    def _to_float(value: Any) -> Optional[float]:
+        """转换为浮点数，无法转换时返回None"""
+        if value is None:
+            return None
+        if isinstance(value, (int, float)):
+            return float(value)
+        try:
+            return float(value)
+        except (ValueError, TypeError):
+            return None
+
+    def _iter_source_slots(self, source: SourceItem):
+        """遍历来源项的所有 (引用字符串, 列键, 数值)，取值方式与标量路径的ReferenceIndex相同"""
+        source_items = self.workbook_manager.source_items
+        for column_key, reference in iter_source_references(source):
+            value = self._to_float(read_source_value(source_items, source.id, column_key))
+            if value is not None:
+                yield reference, column_key, value
+
+    def build_value_vector(self) -> np.ndarray:
+        """
+        根据workbook_manager.source_items重建值向量
+
+        Returns:
+            np.ndarray: 值向量
+        """
+        slot_index = {}
+        source_slots = {}
+        slot_owners = []  # 槽位 -> 来源项ID
+        values = []
+
+        for source_id, source in self.workbook_manager.source_items.items():
+            slots = source_slots.setdefault(source_id, [])
+            for reference, column_key, value in self._iter_source_slots(source):
+                slot = slot_index.get(reference)
+                if slot is None:
+                    slot = len(values)
+                    slot_index[reference] = slot
+                    slot_owners.append(source_id)
+                    values.append(value)
+                else:
+                    # 同一引用重复时以最后一个来源项为准（与ReferenceIndex和值映射表一致）
+                    owner_slots = source_slots[slot_owners[slot]]
+                    owner_slots[:] = [entry for entry in owner_slots if entry[0] != slot]
+                    slot_owners[slot] = source_id
+                    values[slot] = value
+                slots.append((slot, column_key))
+
+        source_slots = {source_id: slots for source_id, slots in source_slots.items() if slots}
+
+        self.slot_index = slot_index
+        self.source_slots = source_slots
+        self.values = np.array(values, dtype=np.float64)
+        self._layout_version += 1
+        self._layout_built = True
+        self._matrix_signature = None
+
+        return self.values
+
+    def ensure_value_vector(self):
+        """确保值向量已构建"""
+        if not self._layout_built:
+            self.build_value_vector()
+
+    def invalidate(self):
+        """来源项集合发生变化时调用，下次计算时重建值向量和系数矩阵"""
+        self._layout_built = False
+        self._matrix_signature = None
+
+    def update_source_values(self, source_id: str) -> bool:
+        """
+        原地更新来源项对应槽位的数值
+
+        Args:
+            source_id: 来源项ID
+
+        Returns:
+            bool: 是否能原地更新（False表示需要重建布局）
+        """
+        if not self._layout_built:
+            return False
+
+        source = self.workbook_manager.source_items.get(source_id)
+        slots = self.source_slots.get(source_id, [])
+        if source is None:
+            return not slots
+
+        new_values = {column_key: value for _, column_key, value in self._iter_source_slots(source)}
+        if set(new_values) != {column_key for _, column_key in slots}:
+            # 有效列发生变化，槽位布局失效
+            self.invalidate()
+            return False
+
+        for slot, column_key in slots:
+            self.values[slot] = new_values[column_key]
+        return True
+
+    def compile_formulas(self, compiled_formulas: Dict[str, CompiledFormula]) -> List[str]:
+        """
+        将线性公式编译为稀疏系数矩阵（公式集合未变化时复用上次结果）
+
+        Args:
+            compiled_formulas: {target_id: 编译后的公式}
+
+        Returns:
+            List[str]: 由矩阵计算的目标项ID（矩阵行顺序）
+        """
+        self.ensure_value_vector()
+
+        signature = (self._layout_version,
+                     tuple((tid, compiled.formula) for tid, compiled in compiled_formulas.items()))
+        if signature == self._matrix_signature:
+            return self.row_target_ids
+
+        row_target_ids = []
+        rows, cols, coefficients, constants = [], [], [], []
+
+        for target_id, compiled in compiled_formulas.items():
+            if not compiled.is_linear:
+                continue
+
+            slots = [self.slot_index.get(ref['full_reference']) for ref in compiled.references]
+            if any(slot is None for slot in slots):
+                continue
+
+            row = len(row_target_ids)
+            row_target_ids.append(target_id)
+            constants.append(compiled.linear_constant)
+            for local_slot, coefficient in compiled.linear_terms:
+                rows.append(row)
+                cols.append(slots[local_slot])
+                coefficients.append(coefficient)
+
+        self.row_target_ids = row_target_ids
+        self.rows = np.array(rows, dtype=np.int64)
+        self.cols = np.array(cols, dtype=np.int64)
+        self.coefficients = np.array(coefficients, dtype=np.float64)
+        self.constants = np.array(constants, dtype=np.float64)
+        self._matrix_signature = signature
+
+        return row_target_ids
+
+    def evaluate(self) -> np.ndarray:
+        """
+        执行稀疏矩阵-向量乘法
+
+        Returns:
+            np.ndarray: 与row_target_ids对应的计算结果
+        """
+        if not self.row_target_ids:
+            return np.zeros(0, dtype=np.float64)
+
+        contributions = self.coefficients * self.values[self.cols]
+        return np.bincount(self.rows, weights=contributions,
+                           minlength=len(self.row_target_ids)) + self.constants
+
+    def get_statistics(self) -> Dict[str, int]:
+        """获取后端统计信息"""
+        return {
+            "value_slots": int(self.values.shape[0]),
+            "linear_formulas": len(self.row_target_ids),
+            "nonzero_coefficients": int(self.coefficients.shape[0])
+        }
@@ -0,0 +1,187 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+SourceItemStore / SourceTable 列存储测试
+覆盖物化对象的修改写回、弱引用释放后重新读取、replace_sheet的顺序、复制和序列化，
+以及iter_numeric_columns对特殊行的屏蔽
+"""
+
+import copy
+import gc
+import pickle
+
+import numpy as np
+
+from models.data_models import SourceItem, SourceItemStore, SourceTable
+
+
+def make_table(sheet_name: str, count: int, start: int = 0) -> SourceTable:
+    """count行的列存储，主要数值为行序号，数据列a、b"""
+    table = SourceTable(sheet_name, column_keys=["a", "b"])
+    for index in range(start, start + count):
+        table.append(f"{sheet_name}_{index}", f"项{index}", index + 2, float(index),
+                     {"a": index + 0.5, "b": index + 0.25}, account_code=str(1000 + index))
+    return table
+
+
+def make_store(*tables: SourceTable) -> SourceItemStore:
+    store = SourceItemStore()
+    for table in tables:
+        store.add_table(table)
+    return store
+
+
+def numeric_columns(store: SourceItemStore):
+    """{(列键, 来源项ID): 数值}（只保留非NaN）"""
+    result = {}
+    for column_key, ids, values in store.iter_numeric_columns():
+        for source_id, value in zip(ids, values.tolist()):
+            if not np.isnan(value):
+                assert (column_key, source_id) not in result, "同一单元格不应出现两次"
+                result[(column_key, source_id)] = value
+    return result
+
+
+def test_edit_survives_garbage_collection():
+    store = make_store(make_table("表", 3))
+
+    item = store["表_1"]
+    item.value = 123.0
+    item.add_data_column("c", 7.0, "借方")
+    item.data_columns["a"] = 9.5
+    del item.data_columns["b"]
+    item.notes = "已调整"
+    del item
+    gc.collect()
+
+    item = store["表_1"]
+    assert item.value == 123.0
+    assert item.data_columns == {"a": 9.5, "c": 7.0}
+    assert item.column_info == {"c": "借方"}
+    assert item.notes == "已调整"
+
+    # 不物化的读取与物化对象一致
+    assert store.get_value("表_1") == 123.0
+    assert store.get_value("表_1", "a") == 9.5
+    assert store.get_value("表_1", "b") is None
+    assert store.get_value("表_1", "c") == 7.0
+
+
+def test_column_info_edit_alone_is_kept():
+    store = make_store(make_table("表", 2))
+
+    store["表_0"].column_info["a"] = "期初余额"
+    gc.collect()
+
+    assert store["表_0"].column_info == {"a": "期初余额"}
+
+
+def test_non_float_value_and_reassignment_keep_row_columnar():
+    store = make_store(make_table("表", 3))
+
+    item = store["表_2"]
+    item.value = 5  # 整数不能保存在浮点数组中
+    store["表_2"] = item
+    del item
+    gc.collect()
+
+    assert store.get_value("表_2") == 5
+    assert isinstance(store["表_2"].value, int)
+    assert store.get_statistics()["tables"] == 1
+
+
+def test_unedited_items_are_not_retained():
+    table = make_table("表", 3)
+    store = make_store(table)
+
+    for item in store.values():
+        assert item.value is not None
+    gc.collect()
+
+    assert not table._pinned
+    assert not table._irregular
+
+
+def test_replace_sheet_keeps_sheet_position():
+    first, second, third = make_table("表1", 2), make_table("表2", 2), make_table("表3", 2)
+    store = make_store(first, second, third)
+    store["单独"] = SourceItem(id="单独", sheet_name="表2", name="单独", cell_address="A9", row=9, column="A",
+                              value=1.0)
+
+    replacement = make_table("表2", 3, start=10)
+    store.replace_sheet("表2", replacement)
+
+    assert list(store) == ["表1_0", "表1_1", "表2_10", "表2_11", "表2_12", "表3_0", "表3_1"]
+    assert store.get_sheet_ids("表2") == ["表2_10", "表2_11", "表2_12"]
+    assert store["表2_11"].value == 11.0
+
+    store.replace_sheet("表1", None)
+    assert list(store) == ["表2_10", "表2_11", "表2_12", "表3_0", "表3_1"]
+
+
+def test_replace_sheet_drops_edited_rows_of_old_table():
+    store = make_store(make_table("表", 2))
+    store["表_0"].value = 99.0
+
+    store.replace_sheet("表", make_table("表", 2))
+
+    assert store["表_0"].value == 0.0
+    assert store.get_value("表_0") == 0.0
+
+
+def test_copy_and_deepcopy_are_detached():
+    store = make_store(make_table("表", 2))
+    item = store["表_0"]
+
+    for duplicate in (copy.copy(item), copy.deepcopy(item)):
+        assert type(duplicate) is SourceItem
+        assert type(duplicate.data_columns) is dict
+        assert duplicate == item
+        duplicate.value = -1.0
+        duplicate.data_columns["a"] = -1.0
+
+    assert store.get_value("表_0") == 0.0
+    assert store.get_value("表_0", "a") == 0.5
+
+
+def test_pickle_round_trip_keeps_edits_and_binding():
+    store = make_store(make_table("表", 3))
+    item = store["表_1"]
+    item.value = 42.0
+    item.notes = "备注"
+    item.column_info["a"] = "借方"
+    del item
+
+    restored = pickle.loads(pickle.dumps(store, protocol=5))
+
+    item = restored["表_1"]
+    assert item.value == 42.0
+    assert item.notes == "备注"
+    assert item.column_info == {"a": "借方"}
+
+    # 反序列化后的对象仍写回反序列化的列存储，不影响原来的
+    item.value = 7.0
+    assert restored.get_value("表_1") == 7.0
+    assert store.get_value("表_1") == 42.0
+
+
+def test_iter_numeric_columns_masks_special_rows():
+    store = make_store(make_table("表", 4))
+
+    store["表_0"].value = 5  # 非浮点数：行改为按对象保存
+    store["表_1"].data_columns["a"] = "文本"  # 非数值的数据列
+    store["表_2"] = SourceItem(id="表_2", sheet_name="表", name="替换", cell_address="A4", row=4, column="A",
+                              value=20.0, data_columns={"b": 21.0})
+    del store["表_3"]
+
+    columns = numeric_columns(store)
+
+    assert columns[("", "表_0")] == 5.0
+    assert columns[("a", "表_0")] == 0.5
+    assert columns[("", "表_1")] == 1.0
+    assert ("a", "表_1") not in columns
+    assert columns[("b", "表_1")] == 1.25
+    assert columns[("", "表_2")] == 20.0
+    assert columns[("b", "表_2")] == 21.0
+    assert ("a", "表_2") not in columns
+    assert not any(source_id == "表_3" for _, source_id in columns)
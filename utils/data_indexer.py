@@ -7,21 +7,47 @@
 
 from typing import Dict, List, Set, Any, Optional, Tuple, Union
 import re
+import heapq
 from collections import defaultdict
 from datetime import datetime
 
+from utils.ngram_index import NGramIndex
+from utils.similarity_index import NameSimilarityIndex
+from utils.value_index import ValueIndex
+
 
 class DataIndexer:
     """数据索引管理器"""
 
-    def __init__(self):
-        """初始化索引器"""
+    # fuzzy_search补充n-gram相似名称时的最低相似度
+    NGRAM_MIN_SIMILARITY = 0.5
+    # 相似项目建议的最低余弦相似度
+    SIMILARITY_THRESHOLD = 0.3
+
+    def __init__(self, ngram_size: int = 2):
+        """
+        初始化索引器
+
+        Args:
+            ngram_size: 名称和关键词倒排索引的n-gram长度（2为二元组，3为三元组）
+        """
         # 各种索引
         self.name_index = defaultdict(list)  # 名称索引
         self.sheet_index = defaultdict(list)  # 工作表索引
         self.keyword_index = defaultdict(set)  # 关键词索引
-        self.numeric_index = defaultdict(list)  # 数值索引
         self.level_index = defaultdict(list)  # 层级索引
+        self.code_index = defaultdict(list)  # 科目代码索引
+
+        # 名称、关键词和科目代码的字符n-gram倒排索引（子串搜索只访问共享n-gram的键）
+        self.name_ngrams = NGramIndex(ngram_size)
+        self.keyword_ngrams = NGramIndex(ngram_size)
+        self.code_ngrams = NGramIndex(ngram_size)
+
+        # 来源项数值索引（主要数值和data_columns各列分别排序，首次查询时构建，索引内容变化后重建）
+        self._value_index: Optional[ValueIndex] = None
+
+        # 名称相似度索引（按项目类型，首次查询时构建，索引内容变化后重建）
+        self._similarity_indexes: Dict[Optional[str], NameSimilarityIndex] = {}
 
         # 元数据
         self.indexed_items = {}  # 所有被索引的项目
@@ -36,6 +62,10 @@ class DataIndexer:
             item_data: 项目数据
             item_type: 项目类型 ('target' 或 'source')
         """
+        # 重复添加时先移除旧条目
+        if item_id in self.indexed_items:
+            self.remove_item(item_id)
+
         # 存储项目信息
         self.indexed_items[item_id] = {
             'data': item_data,
@@ -51,8 +81,10 @@ class DataIndexer:
         if item_type == 'target':
             self._build_level_index(item_id, item_data)
         elif item_type == 'source':
-            self._build_numeric_index(item_id, item_data)
+            self._value_index = None
+            self._build_code_index(item_id, item_data)
 
+        self._similarity_indexes.clear()
         self.last_update = datetime.now()
 
     def _build_name_index(self, item_id: str, item_data: Dict[str, Any], item_type: str) -> None:
@@ -60,12 +92,14 @@ class DataIndexer:
         name = item_data.get('name', '').lower().strip()
         if name:
             self.name_index[name].append((item_type, item_id))
+            self.name_ngrams.add(name)
 
             # 同时索引原始文本（如果存在）
             if item_type == 'target' and 'original_text' in item_data:
                 original = item_data['original_text'].lower().strip()
                 if original and original != name:
                     self.name_index[original].append((item_type, item_id))
+                    self.name_ngrams.add(original)
 
     def _build_sheet_index(self, item_id: str, item_data: Dict[str, Any], item_type: str) -> None:
         """构建工作表索引"""
@@ -75,6 +109,13 @@ class DataIndexer:
 
     def _build_keyword_index(self, item_id: str, item_data: Dict[str, Any], item_type: str) -> None:
         """构建关键词索引"""
+        for keyword in self._extract_keywords(item_data, item_type):
+            self.keyword_index[keyword].add((item_type, item_id))
+            self.keyword_ngrams.add(keyword)
+
+    @staticmethod
+    def _extract_keywords(item_data: Dict[str, Any], item_type: str) -> Set[str]:
+        """从项目名称（目标项还包括原始文本）中提取关键词"""
         # 提取所有文本内容
         texts = []
         if 'name' in item_data:
@@ -98,38 +139,122 @@ class DataIndexer:
                 numbers = re.findall(r'\d+', text)
                 keywords.update(numbers)
 
-        # 建立关键词索引
-        for keyword in keywords:
-            if len(keyword) >= 2:  # 过滤太短的关键词
-                self.keyword_index[keyword].add((item_type, item_id))
+        # 过滤太短的关键词
+        return {keyword for keyword in keywords if len(keyword) >= 2}
 
     def _build_level_index(self, item_id: str, item_data: Dict[str, Any]) -> None:
         """构建层级索引（仅目标项）"""
         level = item_data.get('level', 1)
         self.level_index[level].append(item_id)
 
-    def _build_numeric_index(self, item_id: str, item_data: Dict[str, Any]) -> None:
-        """构建数值索引（仅来源项）"""
-        value = item_data.get('value')
-        if isinstance(value, (int, float)):
-            # 按数值范围建立索引
-            if value == 0:
-                range_key = '0'
-            elif value > 0:
-                if value < 1000:
-                    range_key = '0-1k'
-                elif value < 10000:
-                    range_key = '1k-10k'
-                elif value < 100000:
-                    range_key = '10k-100k'
-                elif value < 1000000:
-                    range_key = '100k-1m'
-                else:
-                    range_key = '1m+'
-            else:
-                range_key = 'negative'
-
-            self.numeric_index[range_key].append(item_id)
+    def _get_value_index(self) -> ValueIndex:
+        """获取来源项数值索引（主要数值和data_columns）"""
+        if self._value_index is None:
+            self._value_index = ValueIndex.from_entries(
+                (item_id, column_key, value)
+                for item_id, info in self.indexed_items.items() if info['type'] == 'source'
+                for column_key, value in [("", info['data'].get('value')),
+                                          *(info['data'].get('data_columns') or {}).items()]
+            )
+        return self._value_index
+
+    def _build_code_index(self, item_id: str, item_data: Dict[str, Any]) -> None:
+        """构建科目代码索引（仅来源项）"""
+        code = str(item_data.get('account_code') or '').lower().strip()
+        if code:
+            self.code_index[code].append(item_id)
+            self.code_ngrams.add(code)
+
+    def remove_item(self, item_id: str) -> bool:
+        """
+        从索引中移除项目（按登记时的数据找到各索引中的条目）
+
+        Args:
+            item_id: 项目唯一标识
+
+        Returns:
+            bool: 项目是否存在
+        """
+        item_info = self.indexed_items.pop(item_id, None)
+        if item_info is None:
+            return False
+
+        item_data = item_info['data']
+        item_type = item_info['type']
+        entry = (item_type, item_id)
+
+        name = item_data.get('name', '').lower().strip()
+        names = [name] if name else []
+        if item_type == 'target' and 'original_text' in item_data:
+            original = item_data['original_text'].lower().strip()
+            if original and original != name:
+                names.append(original)
+        for indexed_name in names:
+            self._remove_entry(self.name_index, indexed_name, entry, self.name_ngrams)
+
+        self._remove_entry(self.sheet_index, item_data.get('sheet_name', ''), entry)
+
+        for keyword in self._extract_keywords(item_data, item_type):
+            self._remove_entry(self.keyword_index, keyword, entry, self.keyword_ngrams)
+
+        if item_type == 'target':
+            self._remove_entry(self.level_index, item_data.get('level', 1), item_id)
+        elif item_type == 'source':
+            self._value_index = None
+            self._remove_entry(self.code_index, str(item_data.get('account_code') or '').lower().strip(),
+                               item_id, self.code_ngrams)
+
+        self._similarity_indexes.clear()
+        self.last_update = datetime.now()
+        return True
+
+    @staticmethod
+    def _remove_entry(index: Dict[Any, Any], key: Any, entry: Any, ngrams: Optional[NGramIndex] = None) -> None:
+        """从一个索引的键下删除条目，键下没有条目时连同n-gram索引中的键一起删除"""
+        entries = index.get(key)
+        if entries is None:
+            return
+        if isinstance(entries, set):
+            entries.discard(entry)
+        elif entry in entries:
+            entries.remove(entry)
+        if not entries:
+            del index[key]
+            if ngrams is not None:
+                ngrams.discard(key)
+
+    def search_name_containing(self, query: str, item_type: Optional[str] = None) -> List[Tuple[str, str]]:
+        """
+        搜索名称（或目标项原始文本）包含查询文本的项目（单向包含，适合输入即搜索）
+
+        Args:
+            query: 查询文本
+            item_type: 只返回指定类型的项目，None表示全部
+
+        Returns:
+            List[Tuple[str, str]]: (item_type, item_id) 列表（同一项目只出现一次）
+        """
+        results = {}
+        for indexed_name in self.name_ngrams.matching_containing(query.lower().strip()):
+            for entry in self.name_index[indexed_name]:
+                if item_type is None or entry[0] == item_type:
+                    results[entry] = None
+        return list(results)
+
+    def search_code_containing(self, query: str) -> List[str]:
+        """
+        搜索科目代码包含查询文本的来源项
+
+        Args:
+            query: 查询文本
+
+        Returns:
+            List[str]: item_id 列表
+        """
+        results = []
+        for code in self.code_ngrams.matching_containing(query.lower().strip()):
+            results.extend(self.code_index[code])
+        return results
 
     def search_by_name(self, name: str, exact_match: bool = False) -> List[Tuple[str, str]]:
         """
@@ -147,10 +272,10 @@ class DataIndexer:
         if exact_match:
             return self.name_index.get(name_lower, [])
         else:
+            # 互为包含关系的名称由n-gram倒排索引给出，不再遍历所有名称
             results = []
-            for indexed_name, items in self.name_index.items():
-                if name_lower in indexed_name or indexed_name in name_lower:
-                    results.extend(items)
+            for indexed_name in self.name_ngrams.matching(name_lower):
+                results.extend(self.name_index[indexed_name])
             return results
 
     def search_by_keywords(self, keywords: Union[str, List[str]]) -> List[Tuple[str, str]]:
@@ -171,14 +296,9 @@ class DataIndexer:
         for keyword in keywords:
             keyword_lower = keyword.lower().strip()
 
-            # 精确匹配
-            if keyword_lower in self.keyword_index:
-                all_results.update(self.keyword_index[keyword_lower])
-
-            # 模糊匹配
-            for indexed_keyword, items in self.keyword_index.items():
-                if keyword_lower in indexed_keyword or indexed_keyword in keyword_lower:
-                    all_results.update(items)
+            # 精确匹配和模糊匹配（互为包含关系的关键词）
+            for indexed_keyword in self.keyword_ngrams.matching(keyword_lower):
+                all_results.update(self.keyword_index[indexed_keyword])
 
         return list(all_results)
 
@@ -191,31 +311,42 @@ class DataIndexer:
         return self.level_index.get(level, [])
 
     def search_by_value_range(self, min_value: Optional[float] = None,
-                             max_value: Optional[float] = None) -> List[str]:
+                             max_value: Optional[float] = None,
+                             column_key: Optional[str] = "") -> List[str]:
         """
-        根据数值范围搜索来源项
+        根据数值范围搜索来源项（在排序的数值数组上二分查找）
 
         Args:
             min_value: 最小值
             max_value: 最大值
+            column_key: 数据列键名，为空时搜索主要数值，None表示所有列
 
         Returns:
-            List[str]: item_id 列表
+            List[str]: item_id 列表（按数值升序，同一项目只出现一次）
         """
-        results = []
+        entries = self._get_value_index().range(min_value, max_value, column_key)
+        return list(dict.fromkeys(item_id for item_id, _, _ in entries))
 
-        for item_id in self.get_items_by_type('source'):
-            item_data = self.indexed_items[item_id]['data']
-            value = item_data.get('value')
+    def find_nearest_values(self, value: float, limit: int = 5, column_key: Optional[str] = None,
+                            max_distance: Optional[float] = None) -> List[Dict[str, Any]]:
+        """
+        查找数值等于或最接近value的来源项数值
 
-            if isinstance(value, (int, float)):
-                if min_value is not None and value < min_value:
-                    continue
-                if max_value is not None and value > max_value:
-                    continue
-                results.append(item_id)
+        Args:
+            value: 目标数值
+            limit: 结果数量
+            column_key: 数据列键名，为空时只查主要数值，None表示所有列
+            max_distance: 最大差值，None表示不限
 
-        return results
+        Returns:
+            List[Dict[str, Any]]: 结果（按差值从小到大）
+        """
+        return [{
+            'item_id': item_id,
+            'column_key': key,
+            'value': found,
+            'distance': abs(found - value)
+        } for item_id, key, found in self._get_value_index().nearest(value, limit, column_key, max_distance)]
 
     def fuzzy_search(self, query: str, limit: int = 20) -> List[Dict[str, Any]]:
         """
@@ -229,39 +360,40 @@ class DataIndexer:
             List[Dict[str, Any]]: 搜索结果
         """
         query_lower = query.lower().strip()
-        results = []
+
+        # 候选项: item_id -> (item_type, match_type)，先到的匹配方式优先
+        candidates: Dict[str, Tuple[str, str]] = {}
 
         # 搜索名称
-        name_results = self.search_by_name(query, exact_match=False)
-        for item_type, item_id in name_results:
-            item_data = self.indexed_items[item_id]['data']
-            score = self._calculate_relevance_score(query_lower, item_data)
+        for item_type, item_id in self.search_by_name(query, exact_match=False):
+            candidates.setdefault(item_id, (item_type, 'name'))
+
+        # 搜索关键词
+        for item_type, item_id in self.search_by_keywords(query):
+            candidates.setdefault(item_id, (item_type, 'keyword'))
+
+        # 子串匹配不足时，补充共享n-gram较多的名称（容忍错字、漏字）
+        if len(candidates) < limit:
+            for _, indexed_name in self.name_ngrams.similar(query_lower, limit, self.NGRAM_MIN_SIMILARITY):
+                for item_type, item_id in self.name_index[indexed_name]:
+                    candidates.setdefault(item_id, (item_type, 'ngram'))
+
+        # 按相关性评分只保留前limit个（有界堆，评分相同时保持候选顺序）
+        scored = ((self._calculate_relevance_score(query_lower, self.indexed_items[item_id]['data']), item_id)
+                  for item_id in candidates)
+        top = heapq.nlargest(limit, scored, key=lambda item: item[0])
+
+        results = []
+        for score, item_id in top:
+            item_type, match_type = candidates[item_id]
             results.append({
                 'item_id': item_id,
                 'item_type': item_type,
-                'item_data': item_data,
+                'item_data': self.indexed_items[item_id]['data'],
                 'score': score,
-                'match_type': 'name'
+                'match_type': match_type
             })
-
-        # 搜索关键词
-        keyword_results = self.search_by_keywords(query)
-        for item_type, item_id in keyword_results:
-            if item_id not in [r['item_id'] for r in results]:  # 避免重复
-                item_data = self.indexed_items[item_id]['data']
-                score = self._calculate_relevance_score(query_lower, item_data)
-                results.append({
-                    'item_id': item_id,
-                    'item_type': item_type,
-                    'item_data': item_data,
-                    'score': score,
-                    'match_type': 'keyword'
-                })
-
-        # 按相关性评分排序
-        results.sort(key=lambda x: x['score'], reverse=True)
-
-        return results[:limit]
+        return results
 
     def _calculate_relevance_score(self, query: str, item_data: Dict[str, Any]) -> float:
         """计算相关性评分"""
@@ -314,7 +446,10 @@ class DataIndexer:
             'sheet_index_entries': len(self.sheet_index),
             'keyword_index_entries': len(self.keyword_index),
             'level_index_entries': len(self.level_index),
-            'numeric_index_entries': len(self.numeric_index),
+            'code_index_entries': len(self.code_index),
+            'numeric_index_entries': len(self._get_value_index()),
+            'name_ngram_entries': self.name_ngrams.get_statistics()['grams'],
+            'keyword_ngram_entries': self.keyword_ngrams.get_statistics()['grams'],
             'last_update': self.last_update.isoformat() if self.last_update else None
         }
 
@@ -323,8 +458,13 @@ class DataIndexer:
         self.name_index.clear()
         self.sheet_index.clear()
         self.keyword_index.clear()
-        self.numeric_index.clear()
+        self._value_index = None
         self.level_index.clear()
+        self.code_index.clear()
+        self.name_ngrams.clear()
+        self.keyword_ngrams.clear()
+        self.code_ngrams.clear()
+        self._similarity_indexes.clear()
         self.indexed_items.clear()
         self.last_update = None
 
@@ -343,54 +483,59 @@ class DataIndexer:
             'export_time': datetime.now().isoformat()
         }
 
+    def _get_similarity_index(self, item_type: Optional[str] = None) -> NameSimilarityIndex:
+        """获取指定类型（None表示全部）项目名称的相似度索引"""
+        index = self._similarity_indexes.get(item_type)
+        if index is None:
+            item_ids = [item_id for item_id, info in self.indexed_items.items()
+                        if item_type is None or info['type'] == item_type]
+            names = [self.indexed_items[item_id]['data'].get('name', '') for item_id in item_ids]
+            index = NameSimilarityIndex().fit(item_ids, names)
+            self._similarity_indexes[item_type] = index
+        return index
+
+    def _similar_result(self, item_id: str, similarity: float) -> Dict[str, Any]:
+        """构造相似项目结果"""
+        info = self.indexed_items[item_id]
+        return {
+            'item_id': item_id,
+            'item_type': info['type'],
+            'item_data': info['data'],
+            'similarity': similarity
+        }
+
     def suggest_similar_items(self, item_id: str, limit: int = 5) -> List[Dict[str, Any]]:
-        """建议相似项目"""
+        """建议相似项目（按名称的字符n-gram TF-IDF余弦相似度）"""
         if item_id not in self.indexed_items:
             return []
 
-        item_info = self.indexed_items[item_id]
-        item_data = item_info['data']
-        item_name = item_data.get('name', '')
-
-        # 基于名称相似性查找
-        similar_results = []
-
-        for other_id, other_info in self.indexed_items.items():
-            if other_id == item_id:
-                continue
-
-            other_data = other_info['data']
-            other_name = other_data.get('name', '')
-
-            # 计算相似性
-            similarity = self._calculate_similarity(item_name, other_name)
-
-            if similarity > 0.3:  # 相似性阈值
-                similar_results.append({
-                    'item_id': other_id,
-                    'item_type': other_info['type'],
-                    'item_data': other_data,
-                    'similarity': similarity
-                })
+        item_name = self.indexed_items[item_id]['data'].get('name', '')
+        matches = self._get_similarity_index().most_similar(
+            item_name, limit, self.SIMILARITY_THRESHOLD, exclude_id=item_id)
+        return [self._similar_result(other_id, similarity) for other_id, similarity in matches]
 
-        # 按相似性排序
-        similar_results.sort(key=lambda x: x['similarity'], reverse=True)
-
-        return similar_results[:limit]
-
-    def _calculate_similarity(self, text1: str, text2: str) -> float:
-        """计算文本相似性"""
-        if not text1 or not text2:
-            return 0.0
-
-        text1_lower = text1.lower()
-        text2_lower = text2.lower()
-
-        # 简单的相似性算法
-        common_chars = sum(1 for c in text1_lower if c in text2_lower)
-        max_length = max(len(text1), len(text2))
+    def suggest_sources_for_targets(self, target_ids: Optional[List[str]] = None, limit: int = 5,
+                                    min_similarity: Optional[float] = None) -> Dict[str, List[Dict[str, Any]]]:
+        """
+        批量为目标项推荐名称最相似的来源项（一次向量化计算，不逐对比较）
 
-        if max_length == 0:
-            return 0.0
+        Args:
+            target_ids: 目标项ID，None表示所有已索引的目标项
+            limit: 每个目标项的推荐数量
+            min_similarity: 最低相似度，None时使用SIMILARITY_THRESHOLD
 
-        return common_chars / max_length
\ No newline at end of file
+        Returns:
+            Dict[str, List[Dict[str, Any]]]: {目标项ID: 相似来源项列表}
+        """
+        if target_ids is None:
+            target_ids = self.get_items_by_type('target')
+        target_ids = [item_id for item_id in target_ids if item_id in self.indexed_items]
+        if min_similarity is None:
+            min_similarity = self.SIMILARITY_THRESHOLD
+
+        names = [self.indexed_items[item_id]['data'].get('name', '') for item_id in target_ids]
+        matches = self._get_similarity_index('source').top_k(names, limit, min_similarity)
+        return {
+            target_id: [self._similar_result(source_id, similarity) for source_id, similarity in target_matches]
+            for target_id, target_matches in zip(target_ids, matches)
+        }
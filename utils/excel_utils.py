@@ -10,6 +10,8 @@ from typing import List, Dict, Tuple, Any, Optional, Union
 from datetime import datetime
 import re
 
+from utils.formula_compiler import FormulaCompiler, FormulaSyntaxError
+
 
 def safe_get_cell_value(sheet, row: int, column: Union[int, str]) -> Any:
     """
@@ -375,47 +377,94 @@ def validate_excel_file(file_path: str) -> Tuple[bool, str]:
         return False, f"文件验证失败: {str(e)}"
 
 
-def get_sheet_statistics(sheet) -> Dict[str, Any]:
+def profile_sheet(sheet, include_cells: bool = True, sample_rows: Optional[int] = None) -> Dict[str, Any]:
     """
-    获取工作表统计信息
+    工作表概况：尺寸、数据范围、合并单元格，以及（可选）单元格统计
+
+    尺寸和合并单元格只读取工作表元数据，开销与单元格数量无关；单元格统计只按值遍历一次。
+    sample_rows 指定时只统计前 sample_rows 行并按行数比例估算全表
 
     Args:
-        sheet: openpyxl工作表对象
+        sheet: openpyxl工作表对象（只读工作表没有合并单元格信息）
+        include_cells: 是否统计单元格
+        sample_rows: 抽样行数，None表示统计全部行
 
     Returns:
-        Dict[str, Any]: 统计信息
+        Dict[str, Any]: 概况信息
     """
+    max_row = sheet.max_row or 0
+    max_column = sheet.max_column or 0
+    merged_cells = getattr(sheet, 'merged_cells', None)
+    merged_ranges = merged_cells.ranges if merged_cells is not None else ()
+
     stats = {
         'name': sheet.title,
-        'max_row': sheet.max_row or 0,
-        'max_column': sheet.max_column or 0,
-        'total_cells': 0,
+        'max_row': max_row,
+        'max_column': max_column,
+        'data_range': (f"A1:{openpyxl.utils.get_column_letter(max_column)}{max_row}"
+                       if max_row and max_column else "A1:A1"),
+        'merged_cell_ranges': len(merged_ranges),
+        'merged_header_ranges': sum(1 for merged_range in merged_ranges if merged_range.min_row <= 5),
+        'total_cells': max_row * max_column,
         'non_empty_cells': 0,
         'numeric_cells': 0,
         'text_cells': 0,
         'formula_cells': 0,
-        'fill_rate': 0.0
+        'fill_rate': 0.0,
+        'profiled': False,
+        'sampled': False
     }
 
-    if sheet.max_row and sheet.max_column:
-        stats['total_cells'] = sheet.max_row * sheet.max_column
+    if not include_cells or not stats['total_cells']:
+        return stats
+
+    scan_rows = max_row if sample_rows is None else min(sample_rows, max_row)
+    non_empty = numeric = text = formula = 0
+
+    for row in sheet.iter_rows(max_row=scan_rows, values_only=True):
+        for value in row:
+            if value is None:
+                continue
+            if isinstance(value, str):
+                stripped = value.strip()
+                if not stripped:
+                    continue
+                non_empty += 1
+                if stripped[0] == '=':
+                    formula += 1
+                else:
+                    text += 1
+            else:
+                non_empty += 1
+                if isinstance(value, (int, float)):
+                    numeric += 1
+
+    # 抽样时按行数比例估算
+    scale = max_row / scan_rows if scan_rows else 1
+    stats.update({
+        'non_empty_cells': round(non_empty * scale),
+        'numeric_cells': round(numeric * scale),
+        'text_cells': round(text * scale),
+        'formula_cells': round(formula * scale),
+        'profiled': True,
+        'sampled': scan_rows < max_row
+    })
+    stats['fill_rate'] = round(min(stats['non_empty_cells'] / stats['total_cells'] * 100, 100.0), 2)
 
-        for row in sheet.iter_rows():
-            for cell in row:
-                if cell.value is not None and str(cell.value).strip():
-                    stats['non_empty_cells'] += 1
+    return stats
 
-                    if isinstance(cell.value, (int, float)):
-                        stats['numeric_cells'] += 1
-                    elif isinstance(cell.value, str):
-                        if cell.value.strip().startswith('='):
-                            stats['formula_cells'] += 1
-                        else:
-                            stats['text_cells'] += 1
 
-        stats['fill_rate'] = round(stats['non_empty_cells'] / stats['total_cells'] * 100, 2)
+def get_sheet_statistics(sheet) -> Dict[str, Any]:
+    """
+    获取工作表统计信息
 
-    return stats
+    Args:
+        sheet: openpyxl工作表对象
+
+    Returns:
+        Dict[str, Any]: 统计信息
+    """
+    return profile_sheet(sheet)
 
 
 def validate_formula_syntax(formula: str) -> Tuple[bool, Optional[str]]:
@@ -517,6 +566,18 @@ def build_formula_reference(sheet_name: str, item_name: str) -> str:
     return f"[{sheet_name}]![{item_name}]"
 
 
+def _parse_reference_matches(formula: str) -> List[Dict[str, str]]:
+    """解析公式中的引用，返回编译器使用的引用信息"""
+    return [
+        {'sheet_name': match.group(1), 'item_name': match.group(2), 'full_reference': match.group(0)}
+        for match in re.finditer(r'\[([^\[\]]+)\]!\[([^\[\]]+)\]', formula)
+    ]
+
+
+# [工作表名]![项目名] 格式公式的编译器
+_formula_compiler = FormulaCompiler(reference_parser=_parse_reference_matches)
+
+
 def format_formula_display(formula: str, max_length: int = 50) -> str:
     """
     格式化公式显示
@@ -554,14 +615,12 @@ def evaluate_formula_with_values(formula: str, value_map: Dict[str, Any]) -> Tup
         if not is_valid:
             return False, error_msg
 
-        # 替换引用为实际值
-        eval_formula = formula
-
-        reference_pattern = r'\[([^\[\]]+)\]!\[([^\[\]]+)\]'
-        references = re.findall(reference_pattern, formula)
+        compiled = _formula_compiler.compile(formula.strip())
 
-        for sheet_name, item_name in references:
-            reference = build_formula_reference(sheet_name, item_name)
+        # 按引用槽位取值
+        values = []
+        for ref_data in compiled.references:
+            reference = ref_data['full_reference']
 
             if reference in value_map:
                 value = value_map[reference]
@@ -573,24 +632,19 @@ def evaluate_formula_with_values(formula: str, value_map: Dict[str, Any]) -> Tup
                     except ValueError:
                         return False, f"引用 {reference} 的值不是有效数字: {value}"
 
-                eval_formula = eval_formula.replace(reference, str(value))
+                values.append(value)
             else:
                 return False, f"找不到引用 {reference} 的值"
 
-        # 安全地评估数学表达式
+        # 执行编译后的算术表达式（不经过eval）
         try:
-            # 移除空格
-            eval_formula = eval_formula.replace(' ', '')
-
-            # 使用eval计算（注意：在生产环境中应该使用更安全的方法）
-            result = eval(eval_formula)
-
-            return True, result
-
+            return True, compiled.evaluate(values)
         except ZeroDivisionError:
             return False, "除零错误"
         except Exception as e:
             return False, f"计算错误: {str(e)}"
 
+    except FormulaSyntaxError as e:
+        return False, f"计算错误: {str(e)}"
     except Exception as e:
         return False, f"公式评估失败: {str(e)}"
\ No newline at end of file
@@ -12,6 +12,8 @@ import re
 import shutil
 import os
 
+from utils.formula_compiler import FormulaCompiler, FormulaSyntaxError, compile_formula
+
 
 def safe_get_cell_value(sheet, row: int, column: Union[int, str]) -> Any:
     """
@@ -125,35 +127,19 @@ def validate_formula_syntax_v2(formula: str) -> Tuple[bool, Optional[str]]:
     if not formula or not formula.strip():
         return False, "公式不能为空"
 
+    # 与计算共用同一编译器，校验通过的公式在计算时直接命中编译缓存
     try:
-        # 验证公式中的引用格式
-        references = parse_formula_references_v2(formula)
-        if not references:
-            return False, "公式中未发现有效的引用"
-
-        # 检查数学表达式语法
-        # 将引用替换为数字进行语法检查
-        test_formula = formula
-        for ref_data in references:
-            test_formula = test_formula.replace(ref_data['full_reference'], '1')
-
-        # 验证数学表达式
-        try:
-            # 只允许基本数学运算符
-            allowed_chars = set('0123456789+-*/()., ')
-            if not all(c in allowed_chars for c in test_formula):
-                return False, "公式包含不支持的字符"
-
-            # 尝试编译表达式（不执行）
-            compile(test_formula, '<string>', 'eval')
-            return True, None
-
-        except SyntaxError as e:
-            return False, f"数学表达式语法错误: {str(e)}"
-
+        compiled = compile_formula(formula)
+    except FormulaSyntaxError as e:
+        return False, str(e)
     except Exception as e:
         return False, f"公式验证失败: {str(e)}"
 
+    if not compiled.references:
+        return False, "公式中未发现有效的引用"
+
+    return True, None
+
 
 def parse_formula_references_v2(formula: str) -> List[Dict[str, str]]:
     """
@@ -303,6 +289,10 @@ def build_formula_reference_v3(sheet_name: str, item_name: str, column_key: str
         return f'[{sheet_name}:"{item_name}"]({cell_address or "AUTO"})'
 
 
+# 多列格式公式的编译器（引用由parse_formula_references_v3解析）
+_formula_compiler_v3 = FormulaCompiler(reference_parser=parse_formula_references_v3)
+
+
 def evaluate_formula_with_values_v3(formula: str, source_items: Dict[str, Any]) -> Tuple[bool, Union[float, str]]:
     """
     使用来源项直接计算公式 - 支持多列数据格式
@@ -318,31 +308,32 @@ def evaluate_formula_with_values_v3(formula: str, source_items: Dict[str, Any])
         return False, "公式为空"
 
     try:
-        # 解析引用
-        references = parse_formula_references_v3(formula)
+        try:
+            compiled = _formula_compiler_v3.compile(formula)
+        except FormulaSyntaxError as e:
+            if not parse_formula_references_v3(formula):
+                return False, "无法计算表达式"
+            return False, f"计算错误: {str(e)}"
 
-        if not references:
-            # 可能是纯数学表达式
+        if not compiled.references:
+            # 纯数学表达式
             try:
-                result = eval(formula)
-                return True, float(result) if isinstance(result, (int, float)) else result
-            except:
+                return True, compiled.evaluate(())
+            except ArithmeticError:
                 return False, "无法计算表达式"
 
-        # 替换引用为实际值
-        working_formula = formula
-        for ref in references:
-            ref_value = _resolve_reference_value_v3(ref, source_items)
+        # 按引用槽位取值（名称索引只构建一次，避免每个引用都遍历全部来源项）
+        name_index = build_source_name_index(source_items)
+        values = []
+        for ref in compiled.references:
+            ref_value = _resolve_reference_value_v3(ref, source_items, name_index)
             if ref_value is None:
                 return False, f"找不到引用: {ref['full_reference']}"
-
-            # 替换引用为数值
-            working_formula = working_formula.replace(ref['full_reference'], str(ref_value))
+            values.append(ref_value)
 
         # 计算结果
         try:
-            result = eval(working_formula)
-            return True, float(result) if isinstance(result, (int, float)) else result
+            return True, compiled.evaluate(values)
         except Exception as e:
             return False, f"计算错误: {str(e)}"
 
@@ -350,13 +341,32 @@ def evaluate_formula_with_values_v3(formula: str, source_items: Dict[str, Any])
         return False, f"公式解析错误: {str(e)}"
 
 
-def _resolve_reference_value_v3(reference: Dict[str, str], source_items: Dict[str, Any]) -> Union[float, None]:
+def build_source_name_index(source_items: Dict[str, Any]) -> Dict[Tuple[str, str], List[Any]]:
+    """
+    按 (工作表名, 项目名) 对来源项建立索引
+
+    Args:
+        source_items: 来源项字典
+
+    Returns:
+        Dict[Tuple[str, str], List[Any]]: {(工作表名, 项目名): [来源项]}（保持原有顺序）
+    """
+    name_index = {}
+    for item in source_items.values():
+        if hasattr(item, 'sheet_name') and hasattr(item, 'name'):
+            name_index.setdefault((item.sheet_name, item.name), []).append(item)
+    return name_index
+
+
+def _resolve_reference_value_v3(reference: Dict[str, str], source_items: Dict[str, Any],
+                                name_index: Optional[Dict[Tuple[str, str], List[Any]]] = None) -> Union[float, None]:
     """
     解析引用值 - 支持多列数据
 
     Args:
         reference: 引用信息
         source_items: 来源项字典
+        name_index: build_source_name_index构建的索引，None时临时构建
 
     Returns:
         float: 引用的值，如果找不到返回None
@@ -365,27 +375,27 @@ def _resolve_reference_value_v3(reference: Dict[str, str], source_items: Dict[st
     item_name = reference['item_name']
     column_key = reference.get('column_key')
 
+    if name_index is None:
+        name_index = build_source_name_index(source_items)
+
     # 查找匹配的来源项
-    for item in source_items.values():
-        if (hasattr(item, 'sheet_name') and item.sheet_name == sheet_name and
-            hasattr(item, 'name') and item.name == item_name):
-
-            if column_key:
-                # 多列数据模式
-                if hasattr(item, 'data_columns') and item.data_columns:
-                    value = item.data_columns.get(column_key)
-                    if value is not None:
-                        try:
-                            return float(value)
-                        except (ValueError, TypeError):
-                            return None
-            else:
-                # 标准模式 - 使用主要值
-                if hasattr(item, 'value') and item.value is not None:
+    for item in name_index.get((sheet_name, item_name), ()):
+        if column_key:
+            # 多列数据模式
+            if hasattr(item, 'data_columns') and item.data_columns:
+                value = item.data_columns.get(column_key)
+                if value is not None:
                     try:
-                        return float(item.value)
+                        return float(value)
                     except (ValueError, TypeError):
                         return None
+        else:
+            # 标准模式 - 使用主要值
+            if hasattr(item, 'value') and item.value is not None:
+                try:
+                    return float(item.value)
+                except (ValueError, TypeError):
+                    return None
 
     return None
 
@@ -405,28 +415,35 @@ def evaluate_formula_with_values_v2(formula: str, value_map: Dict[str, Any]) ->
         return False, "公式为空"
 
     try:
-        # 解析引用
-        references = parse_formula_references_v2(formula)
+        # 编译公式（带缓存），引用按槽位取值后直接执行字节码
+        try:
+            compiled = compile_formula(formula)
+        except FormulaSyntaxError as e:
+            if not parse_formula_references_v2(formula):
+                return False, "无法计算表达式"
+            return False, f"计算错误: {str(e)}"
 
-        if not references:
-            # 可能是纯数学表达式
+        if not compiled.references:
+            # 纯数学表达式
             try:
-                result = eval(formula)
-                return True, float(result) if isinstance(result, (int, float)) else result
-            except:
+                return True, compiled.evaluate(())
+            except ArithmeticError:
                 return False, "无法计算表达式"
 
-        # 替换引用为实际值
-        calculated_formula = formula
+        # 引用索引（ReferenceIndex）自带精确/模糊查找，普通字典则按下面的方式查找
+        resolve_value = getattr(value_map, 'resolve_value', None)
+        values = []
 
-        for ref_data in references:
+        for ref_data in compiled.references:
             full_ref = ref_data['full_reference']
 
             # 在值映射表中查找对应的值
             value = None
 
+            if resolve_value is not None:
+                value = resolve_value(ref_data)
             # 方法1: 直接匹配完整引用
-            if full_ref in value_map:
+            elif full_ref in value_map:
                 value = value_map[full_ref]
             else:
                 # 方法2: 通过工作表名和项目名匹配
@@ -447,13 +464,11 @@ def evaluate_formula_with_values_v2(formula: str, value_map: Dict[str, Any]) ->
                 except (ValueError, TypeError):
                     return False, f"引用值不是数字: {full_ref} = {value}"
 
-            # 替换引用为值
-            calculated_formula = calculated_formula.replace(full_ref, str(value))
+            values.append(value)
 
         # 计算最终表达式
         try:
-            result = eval(calculated_formula)
-            return True, float(result)
+            return True, compiled.evaluate(values)
         except Exception as e:
             return False, f"计算错误: {str(e)}"
 
@@ -0,0 +1,228 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+数据提取结果的磁盘缓存
+以工作簿文件内容的SHA-256为键保存工作表信息，以 文件内容 + 工作表分类 + 表格规则 为键保存提取出的
+目标项和来源项（pickle protocol 5）。重新打开未修改的文件时直接读取缓存，无需openpyxl解析
+"""
+
+import hashlib
+import json
+import os
+import pickle
+from typing import Any, Dict, List, Optional, Tuple
+
+
+# 缓存格式版本（提取逻辑或数据模型变化导致旧缓存不再适用时递增）
+CACHE_FORMAT_VERSION = 3
+
+# 默认缓存目录（与workbook_config.json一样相对于工作目录）
+DEFAULT_CACHE_DIR = "extraction_cache"
+
+# 默认表格规则文件
+DEFAULT_RULES_PATH = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))),
+                                  'data', 'table_schema_rules.json')
+
+_HASH_CHUNK_SIZE = 1 << 20
+
+
+class ExtractionCache:
+    """数据提取结果缓存"""
+
+    def __init__(self, cache_dir: str = DEFAULT_CACHE_DIR, rules_path: str = DEFAULT_RULES_PATH,
+                 max_entries: int = 200):
+        """
+        初始化提取缓存
+
+        Args:
+            cache_dir: 缓存目录（首次写入时创建）
+            rules_path: 表格规则文件，内容变化后提取缓存失效
+            max_entries: 最多保留的缓存文件数，超出时删除最久未使用的
+        """
+        self.cache_dir = cache_dir
+        self.rules_path = rules_path
+        self.max_entries = max_entries
+
+        # (绝对路径, 修改时间ns, 文件大小) -> SHA-256，同一进程内不重复计算
+        self._digests: Dict[Tuple[str, int, int], str] = {}
+
+        self.hits = 0
+        self.misses = 0
+
+    def file_digest(self, file_path: str) -> str:
+        """
+        计算文件内容的SHA-256
+
+        Args:
+            file_path: 文件路径
+
+        Returns:
+            str: 十六进制摘要
+        """
+        stat = os.stat(file_path)
+        memo_key = (os.path.abspath(file_path), stat.st_mtime_ns, stat.st_size)
+        digest = self._digests.get(memo_key)
+        if digest is None:
+            sha256 = hashlib.sha256()
+            with open(file_path, 'rb') as f:
+                for chunk in iter(lambda: f.read(_HASH_CHUNK_SIZE), b""):
+                    sha256.update(chunk)
+            digest = sha256.hexdigest()
+            self._digests[memo_key] = digest
+        return digest
+
+    def _rules_digest(self) -> str:
+        """表格规则文件内容的摘要（文件不存在时为空）"""
+        try:
+            return self.file_digest(self.rules_path)
+        except OSError:
+            return ""
+
+    def _worksheets_key(self, file_path: str) -> str:
+        return f"{self.file_digest(file_path)}.v{CACHE_FORMAT_VERSION}.sheets"
+
+    def _extraction_key(self, file_path: str, flash_report_sheets: List[str],
+                        data_source_sheets: List[str]) -> str:
+        # 分类列表中也可能是WorksheetInfo对象，统一按名称
+        classification = json.dumps([[getattr(sheet, 'name', sheet) for sheet in flash_report_sheets],
+                                     [getattr(sheet, 'name', sheet) for sheet in data_source_sheets]],
+                                    ensure_ascii=False, default=str)
+        sha256 = hashlib.sha256()
+        sha256.update(self.file_digest(file_path).encode('ascii'))
+        sha256.update(classification.encode('utf-8'))
+        sha256.update(self._rules_digest().encode('ascii'))
+        return f"{sha256.hexdigest()}.v{CACHE_FORMAT_VERSION}.extract"
+
+    def _path(self, key: str) -> str:
+        return os.path.join(self.cache_dir, f"{key}.pkl")
+
+    def _load(self, key: str) -> Optional[Any]:
+        """读取缓存，不存在或损坏时返回None"""
+        path = self._path(key)
+        if not os.path.exists(path):
+            self.misses += 1
+            return None
+
+        try:
+            with open(path, 'rb') as f:
+                payload = pickle.load(f)
+            os.utime(path)  # 记录最近使用时间，供清理时判断
+        except Exception as e:
+            print(f"读取提取缓存失败，将重新提取: {e}")
+            self.misses += 1
+            return None
+
+        self.hits += 1
+        return payload
+
+    def _save(self, key: str, payload: Any) -> bool:
+        """写入缓存（先写临时文件再替换，避免留下不完整的缓存）"""
+        try:
+            os.makedirs(self.cache_dir, exist_ok=True)
+            path = self._path(key)
+            temp_path = f"{path}.{os.getpid()}.tmp"
+            with open(temp_path, 'wb') as f:
+                pickle.dump(payload, f, protocol=5)
+            os.replace(temp_path, path)
+            self._prune()
+            return True
+        except Exception as e:
+            print(f"写入提取缓存失败: {e}")
+            return False
+
+    def _prune(self):
+        """删除超出数量上限的最久未使用的缓存文件"""
+        entries = [os.path.join(self.cache_dir, name) for name in os.listdir(self.cache_dir)
+                   if name.endswith('.pkl')]
+        if len(entries) <= self.max_entries:
+            return
+
+        entries.sort(key=os.path.getmtime)
+        for path in entries[:len(entries) - self.max_entries]:
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+
+    def load_worksheets(self, file_path: str) -> Optional[Dict[str, Any]]:
+        """
+        读取缓存的工作表信息
+
+        Args:
+            file_path: 工作簿路径
+
+        Returns:
+            Optional[Dict[str, Any]]: {工作表名: WorksheetInfo}，未缓存时返回None
+        """
+        return self._load(self._worksheets_key(file_path))
+
+    def save_worksheets(self, file_path: str, worksheets: Dict[str, Any]) -> bool:
+        """
+        保存工作表信息
+
+        Args:
+            file_path: 工作簿路径
+            worksheets: {工作表名: WorksheetInfo}
+
+        Returns:
+            bool: 是否成功
+        """
+        return self._save(self._worksheets_key(file_path), worksheets)
+
+    def load_extraction(self, workbook_manager) -> bool:
+        """
+        读取缓存的提取结果并写入工作簿管理器
+
+        Args:
+            workbook_manager: 已完成工作表分类的工作簿管理器
+
+        Returns:
+            bool: 是否命中缓存
+        """
+        key = self._extraction_key(workbook_manager.file_path, workbook_manager.flash_report_sheets,
+                                   workbook_manager.data_source_sheets)
+        payload = self._load(key)
+        if payload is None:
+            return False
+
+        workbook_manager.target_items.update(payload["target_items"])
+        workbook_manager.source_items.update(payload["source_items"])
+        workbook_manager.sheet_fingerprints = dict(payload.get("sheet_fingerprints", {}))
+        return True
+
+    def save_extraction(self, workbook_manager) -> bool:
+        """
+        保存工作簿管理器中的提取结果（目标项和来源项，包括data_columns，以及各工作表的内容指纹）
+
+        Args:
+            workbook_manager: 已完成数据提取的工作簿管理器
+
+        Returns:
+            bool: 是否成功
+        """
+        key = self._extraction_key(workbook_manager.file_path, workbook_manager.flash_report_sheets,
+                                   workbook_manager.data_source_sheets)
+        return self._save(key, {
+            "target_items": workbook_manager.target_items,
+            "source_items": workbook_manager.source_items,
+            "sheet_fingerprints": workbook_manager.sheet_fingerprints
+        })
+
+    def clear(self):
+        """删除所有缓存文件"""
+        if not os.path.isdir(self.cache_dir):
+            return
+        for name in os.listdir(self.cache_dir):
+            if name.endswith('.pkl'):
+                try:
+                    os.remove(os.path.join(self.cache_dir, name))
+                except OSError:
+                    pass
+
+    def get_statistics(self) -> Dict[str, Any]:
+        """获取缓存统计信息"""
+        return {
+            "cache_dir": os.path.abspath(self.cache_dir),
+            "hits": self.hits,
+            "misses": self.misses
+        }
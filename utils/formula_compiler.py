@@ -0,0 +1,426 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+公式编译工具
+将 [工作表名:"项目名"](单元格地址) 格式的公式一次性编译为逆波兰字节码和引用槽位，
+重复计算时只需按槽位取值并执行算术运算，无需再次正则解析和eval。
+只支持 + - * / ( ) 和数字常量，其他引用格式可通过 reference_parser 接入
+"""
+
+import re
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Any, Callable, Dict, List, Optional, Sequence, Tuple, Union
+
+
+# 引用格式: [工作表名:"项目名"](单元格地址) 或 [工作表名:"项目名:列名"](单元格地址)
+REFERENCE_PATTERN = re.compile(r'\[([^\]]+):"([^"]+)"\]\(([A-Z]+\d+)\)')
+NUMBER_PATTERN = re.compile(r'\d+(?:\.\d*)?|\.\d+')
+
+# 字节码操作码
+OP_CONST = 0  # 压入常量
+OP_REF = 1    # 压入引用槽位的值
+OP_ADD = 2
+OP_SUB = 3
+OP_MUL = 4
+OP_DIV = 5
+OP_NEG = 6    # 一元负号
+
+_BINARY_OPS = {'+': OP_ADD, '-': OP_SUB, '*': OP_MUL, '/': OP_DIV}
+
+# 引用解析函数: 公式 -> 引用信息列表（每项至少包含 full_reference）
+ReferenceParser = Callable[[str], List[Dict[str, Any]]]
+
+
+class FormulaSyntaxError(ValueError):
+    """公式语法错误"""
+
+
+@dataclass
+class CompiledFormula:
+    """编译后的公式"""
+
+    formula: str  # 原始公式文本
+    references: List[Dict[str, str]]  # 引用槽位（去重，按首次出现顺序）
+    code: Tuple[Tuple[int, Any], ...]  # 逆波兰字节码 (操作码, 参数)
+
+    # 线性形式: 常量 + Σ 系数 × 槽位值（非线性公式为None）
+    linear_terms: Optional[List[Tuple[int, float]]] = None
+    linear_constant: float = 0.0
+
+    @property
+    def is_linear(self) -> bool:
+        """是否为引用的线性组合"""
+        return self.linear_terms is not None
+
+    @property
+    def slot_count(self) -> int:
+        """引用槽位数量"""
+        return len(self.references)
+
+    def evaluate(self, values: Sequence[float]) -> float:
+        """
+        使用槽位值执行字节码
+
+        Args:
+            values: 与references一一对应的数值序列
+
+        Returns:
+            float: 计算结果
+
+        Raises:
+            ZeroDivisionError: 除数为0
+        """
+        stack = []
+        push = stack.append
+        pop = stack.pop
+
+        for op, arg in self.code:
+            if op == OP_REF:
+                push(values[arg])
+            elif op == OP_CONST:
+                push(arg)
+            elif op == OP_NEG:
+                stack[-1] = -stack[-1]
+            else:
+                right = pop()
+                if op == OP_ADD:
+                    stack[-1] += right
+                elif op == OP_SUB:
+                    stack[-1] -= right
+                elif op == OP_MUL:
+                    stack[-1] *= right
+                else:
+                    stack[-1] /= right
+
+        return float(stack[0])
+
+
+def parse_reference_match(match) -> Dict[str, str]:
+    """
+    将引用正则匹配结果转换为引用信息字典（与parse_formula_references_v2格式一致）
+
+    Args:
+        match: REFERENCE_PATTERN的匹配对象
+
+    Returns:
+        Dict[str, str]: 引用信息
+    """
+    item_text = match.group(2)
+    column_key = ''
+    if ':' in item_text:
+        # 带列名格式，列名为最后一个冒号之后的部分
+        item_text, _, column_key = item_text.rpartition(':')
+
+    return {
+        'sheet_name': match.group(1).strip(),
+        'item_name': item_text.strip(),
+        'column_key': column_key.strip(),
+        'cell_address': match.group(3).strip(),
+        'full_reference': match.group(0)
+    }
+
+
+def _match_reference(formula: str, pos: int, references: List[Dict[str, Any]]) -> Optional[Dict[str, Any]]:
+    """在pos处匹配外部解析出的引用（references已按长度降序排列）"""
+    for ref_data in references:
+        if formula.startswith(ref_data['full_reference'], pos):
+            return ref_data
+    return None
+
+
+def tokenize_formula(formula: str, reference_parser: Optional[ReferenceParser] = None) -> List[Tuple[str, Any]]:
+    """
+    将公式切分为记号
+
+    Args:
+        formula: 公式字符串
+        reference_parser: 引用解析函数，None表示使用内置的 [工作表名:"项目名"](单元格地址) 格式
+
+    Returns:
+        List[Tuple[str, Any]]: 记号列表，类型为 'num'、'ref'、'op'
+
+    Raises:
+        FormulaSyntaxError: 包含不支持的字符
+    """
+    tokens = []
+    pos = 0
+    length = len(formula)
+
+    external_references = None
+    if reference_parser is not None:
+        # 长引用优先，避免一个引用是另一个引用前缀时匹配错位
+        unique = {ref_data['full_reference']: ref_data for ref_data in reference_parser(formula)}
+        external_references = sorted(unique.values(), key=lambda r: len(r['full_reference']), reverse=True)
+
+    while pos < length:
+        char = formula[pos]
+
+        if char.isspace():
+            pos += 1
+            continue
+
+        if char == '[':
+            if external_references is not None:
+                ref_data = _match_reference(formula, pos, external_references)
+                if ref_data is None:
+                    raise FormulaSyntaxError(f"无效的引用格式 (位置 {pos + 1})")
+                tokens.append(('ref', ref_data))
+                pos += len(ref_data['full_reference'])
+                continue
+
+            match = REFERENCE_PATTERN.match(formula, pos)
+            if not match:
+                raise FormulaSyntaxError(f"无效的引用格式 (位置 {pos + 1})")
+            tokens.append(('ref', parse_reference_match(match)))
+            pos = match.end()
+            continue
+
+        if char.isdigit() or char == '.':
+            match = NUMBER_PATTERN.match(formula, pos)
+            if not match:
+                raise FormulaSyntaxError(f"无效的数字 (位置 {pos + 1})")
+            tokens.append(('num', float(match.group(0))))
+            pos = match.end()
+            continue
+
+        if char in '+-*/()':
+            tokens.append(('op', char))
+            pos += 1
+            continue
+
+        raise FormulaSyntaxError(f"公式包含不支持的字符: '{char}' (位置 {pos + 1})")
+
+    return tokens
+
+
+class _FormulaParser:
+    """递归下降解析器，直接生成逆波兰字节码和线性形式"""
+
+    def __init__(self, tokens: List[Tuple[str, Any]]):
+        self.tokens = tokens
+        self.pos = 0
+        self.code: List[Tuple[int, Any]] = []
+        self.references: List[Dict[str, str]] = []
+        self.slot_map: Dict[str, int] = {}
+
+    def parse(self):
+        if not self.tokens:
+            raise FormulaSyntaxError("公式不能为空")
+
+        linear = self._parse_expression()
+        if self.pos < len(self.tokens):
+            kind, value = self.tokens[self.pos]
+            if kind == 'op' and value == ')':
+                raise FormulaSyntaxError("括号不匹配")
+            raise FormulaSyntaxError("数学表达式语法错误: 缺少运算符")
+        return linear
+
+    def _peek(self) -> Optional[Tuple[str, Any]]:
+        if self.pos < len(self.tokens):
+            return self.tokens[self.pos]
+        return None
+
+    def _parse_expression(self):
+        linear = self._parse_term()
+        while True:
+            token = self._peek()
+            if not token or token[0] != 'op' or token[1] not in '+-':
+                return linear
+            self.pos += 1
+            right = self._parse_term()
+            self.code.append((_BINARY_OPS[token[1]], None))
+            linear = _combine_linear(linear, right, token[1])
+
+    def _parse_term(self):
+        linear = self._parse_unary()
+        while True:
+            token = self._peek()
+            if not token or token[0] != 'op' or token[1] not in '*/':
+                return linear
+            self.pos += 1
+            right = self._parse_unary()
+            self.code.append((_BINARY_OPS[token[1]], None))
+            linear = _combine_linear(linear, right, token[1])
+
+    def _parse_unary(self):
+        token = self._peek()
+        if token and token[0] == 'op' and token[1] in '+-':
+            self.pos += 1
+            operand = self._parse_unary()
+            if token[1] == '-':
+                self.code.append((OP_NEG, None))
+                return _scale_linear(operand, -1.0)
+            return operand
+        return self._parse_primary()
+
+    def _parse_primary(self):
+        token = self._peek()
+        if token is None:
+            raise FormulaSyntaxError("数学表达式语法错误: 公式不完整")
+
+        kind, value = token
+        self.pos += 1
+
+        if kind == 'num':
+            self.code.append((OP_CONST, value))
+            return ({}, value)
+
+        if kind == 'ref':
+            full_reference = value['full_reference']
+            slot = self.slot_map.get(full_reference)
+            if slot is None:
+                slot = len(self.references)
+                self.slot_map[full_reference] = slot
+                self.references.append(value)
+            self.code.append((OP_REF, slot))
+            return ({slot: 1.0}, 0.0)
+
+        if value == '(':
+            linear = self._parse_expression()
+            closing = self._peek()
+            if not closing or closing != ('op', ')'):
+                raise FormulaSyntaxError("括号不匹配")
+            self.pos += 1
+            return linear
+
+        if value == ')':
+            raise FormulaSyntaxError("括号不匹配")
+
+        raise FormulaSyntaxError(f"数学表达式语法错误: 运算符 '{value}' 位置不正确")
+
+
+def _scale_linear(linear, factor: float):
+    """线性形式乘以常数"""
+    if linear is None:
+        return None
+    coefficients, constant = linear
+    return ({slot: coef * factor for slot, coef in coefficients.items()}, constant * factor)
+
+
+def _combine_linear(left, right, operator: str):
+    """合并两个线性形式，无法保持线性时返回None"""
+    if left is None or right is None:
+        return None
+
+    if operator in '+-':
+        sign = 1.0 if operator == '+' else -1.0
+        coefficients = dict(left[0])
+        for slot, coef in right[0].items():
+            coefficients[slot] = coefficients.get(slot, 0.0) + sign * coef
+        return (coefficients, left[1] + sign * right[1])
+
+    if operator == '*':
+        if not right[0]:
+            return _scale_linear(left, right[1])
+        if not left[0]:
+            return _scale_linear(right, left[1])
+        return None
+
+    # 除法: 仅除以非零常数时保持线性
+    if not right[0] and right[1] != 0:
+        return _scale_linear(left, 1.0 / right[1])
+    return None
+
+
+def _compile(formula: str, reference_parser: Optional[ReferenceParser] = None) -> CompiledFormula:
+    """编译公式（不使用缓存）"""
+    if not formula or not formula.strip():
+        raise FormulaSyntaxError("公式不能为空")
+
+    parser = _FormulaParser(tokenize_formula(formula, reference_parser))
+    linear = parser.parse()
+
+    compiled = CompiledFormula(
+        formula=formula,
+        references=parser.references,
+        code=tuple(parser.code)
+    )
+
+    if linear is not None:
+        coefficients, constant = linear
+        compiled.linear_terms = [(slot, coef) for slot, coef in sorted(coefficients.items()) if coef != 0.0]
+        compiled.linear_constant = constant
+
+    return compiled
+
+
+class FormulaCompiler:
+    """带缓存的公式编译器，缓存以公式文本为键"""
+
+    def __init__(self, max_size: int = 100000, reference_parser: Optional[ReferenceParser] = None):
+        """
+        初始化编译器
+
+        Args:
+            max_size: 缓存的最大公式数量（按最近使用淘汰）
+            reference_parser: 引用解析函数，None表示使用内置引用格式
+        """
+        self.max_size = max_size
+        self.reference_parser = reference_parser
+        self._cache: "OrderedDict[str, Union[CompiledFormula, FormulaSyntaxError]]" = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    def compile(self, formula: str) -> CompiledFormula:
+        """
+        编译公式，已编译过的公式直接从缓存返回
+
+        Args:
+            formula: 公式字符串
+
+        Returns:
+            CompiledFormula: 编译结果
+
+        Raises:
+            FormulaSyntaxError: 公式语法错误（错误结果同样会被缓存）
+        """
+        cached = self._cache.get(formula)
+        if cached is not None:
+            self.hits += 1
+            self._cache.move_to_end(formula)
+        else:
+            self.misses += 1
+            try:
+                cached = _compile(formula, self.reference_parser)
+            except FormulaSyntaxError as e:
+                cached = e
+
+            self._cache[formula] = cached
+            if len(self._cache) > self.max_size:
+                self._cache.popitem(last=False)
+
+        if isinstance(cached, FormulaSyntaxError):
+            raise FormulaSyntaxError(str(cached))
+        return cached
+
+    def clear_cache(self):
+        """清空编译缓存"""
+        self._cache.clear()
+        self.hits = 0
+        self.misses = 0
+
+    def get_cache_stats(self) -> Dict[str, Any]:
+        """获取缓存统计"""
+        total = self.hits + self.misses
+        return {
+            "cached_formulas": len(self._cache),
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": round(self.hits / total * 100, 2) if total > 0 else 0.0
+        }
+
+
+# 全局共享编译器，同一公式在多个计算引擎实例之间只编译一次
+_default_compiler = FormulaCompiler()
+
+
+def get_default_compiler() -> FormulaCompiler:
+    """获取全局共享的公式编译器"""
+    return _default_compiler
+
+
+def compile_formula(formula: str) -> CompiledFormula:
+    """使用全局编译器编译公式"""
+    return _default_compiler.compile(formula)
+
@@ -0,0 +1,210 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+字符N-gram倒排索引
+为一组文本键（项目名称、关键词）建立 字符n-gram -> 文本键 的倒排表。
+中文项目名称没有分词边界，按字符切分的二元/三元组比按词切分更适合子串搜索：
+查询只需要求交各n-gram的倒排表，只访问与查询共享n-gram的文本键，不再扫描全部键
+"""
+
+import heapq
+from collections import defaultdict
+from typing import Dict, Iterable, List, Set, Tuple
+
+
+class NGramIndex:
+    """字符N-gram倒排索引
+
+    同时登记长度为1到n的所有字符片段，短于n的查询（如只输入一个字）同样可以直接查表
+    """
+
+    def __init__(self, n: int = 2):
+        """
+        初始化索引
+
+        Args:
+            n: 最大片段长度（2为二元组，3为三元组）
+        """
+        if n < 1:
+            raise ValueError("n必须大于等于1")
+        self.n = n
+
+        # 片段 -> 包含该片段的文本键
+        self._postings: Dict[str, Set[str]] = defaultdict(set)
+        # 文本键 -> 该键的n元片段数量（用于相似度评分）
+        self._gram_counts: Dict[str, int] = {}
+        # 文本键 -> 登记顺序（查询结果按登记顺序返回，与遍历原索引的顺序一致）
+        self._ordinals: Dict[str, int] = {}
+        self._next_ordinal = 0
+
+    def __len__(self) -> int:
+        return len(self._gram_counts)
+
+    def __contains__(self, key: object) -> bool:
+        return key in self._gram_counts
+
+    def _fragments(self, text: str) -> Set[str]:
+        """长度为1到n的所有片段"""
+        return {text[i:i + size] for size in range(1, self.n + 1) for i in range(len(text) - size + 1)}
+
+    def _grams(self, text: str) -> Set[str]:
+        """评分用的片段：长度为n的片段，文本短于n时为文本本身"""
+        if len(text) <= self.n:
+            return {text} if text else set()
+        return {text[i:i + self.n] for i in range(len(text) - self.n + 1)}
+
+    def add(self, key: str):
+        """
+        登记文本键（已登记时忽略）
+
+        Args:
+            key: 文本键
+        """
+        if not key or key in self._gram_counts:
+            return
+        for fragment in self._fragments(key):
+            self._postings[fragment].add(key)
+        self._gram_counts[key] = len(self._grams(key))
+        self._ordinals[key] = self._next_ordinal
+        self._next_ordinal += 1
+
+    def discard(self, key: str):
+        """
+        移除文本键（未登记时忽略）
+
+        Args:
+            key: 文本键
+        """
+        if self._gram_counts.pop(key, None) is None:
+            return
+        del self._ordinals[key]
+        for fragment in self._fragments(key):
+            postings = self._postings.get(fragment)
+            if postings is not None:
+                postings.discard(key)
+                if not postings:
+                    del self._postings[fragment]
+
+    def clear(self):
+        """清空索引"""
+        self._postings.clear()
+        self._gram_counts.clear()
+        self._ordinals.clear()
+        self._next_ordinal = 0
+
+    def keys(self) -> Iterable[str]:
+        """所有文本键"""
+        return self._gram_counts.keys()
+
+    def containing(self, query: str) -> Set[str]:
+        """
+        包含查询文本的文本键（query in key）
+
+        按倒排表从小到大求交，最后以子串判断排除n-gram都出现但不连续的键
+
+        Args:
+            query: 查询文本
+
+        Returns:
+            Set[str]: 文本键集合
+        """
+        if not query:
+            return set(self._gram_counts)
+
+        postings = []
+        for gram in self._grams(query):
+            keys = self._postings.get(gram)
+            if not keys:
+                return set()
+            postings.append(keys)
+
+        postings.sort(key=len)
+        candidates = set(postings[0])
+        for keys in postings[1:]:
+            candidates &= keys
+            if not candidates:
+                return candidates
+
+        if len(query) <= self.n:
+            return candidates
+        return {key for key in candidates if query in key}
+
+    def contained_in(self, query: str) -> Set[str]:
+        """
+        是查询文本子串的文本键（key in query），只查找查询文本的各个子串
+
+        Args:
+            query: 查询文本
+
+        Returns:
+            Set[str]: 文本键集合
+        """
+        gram_counts = self._gram_counts
+        length = len(query)
+        return {query[i:j] for i in range(length) for j in range(i + 1, length + 1)
+                if query[i:j] in gram_counts}
+
+    def matching(self, query: str) -> List[str]:
+        """
+        与查询文本互为包含关系的文本键（query in key 或 key in query）
+
+        Args:
+            query: 查询文本
+
+        Returns:
+            List[str]: 文本键（按登记顺序）
+        """
+        matches = self.containing(query)
+        matches.update(self.contained_in(query))
+        return sorted(matches, key=self._ordinals.__getitem__)
+
+    def matching_containing(self, query: str) -> List[str]:
+        """
+        包含查询文本的文本键（query in key）
+
+        Args:
+            query: 查询文本
+
+        Returns:
+            List[str]: 文本键（按登记顺序）
+        """
+        return sorted(self.containing(query), key=self._ordinals.__getitem__)
+
+    def similar(self, query: str, limit: int = 20, min_score: float = 0.0) -> List[Tuple[float, str]]:
+        """
+        按共享n-gram数量的相似度（Dice系数）排序的文本键
+
+        只累加查询n-gram的倒排表，未共享任何n-gram的键不会被访问；结果保存在大小为limit的堆中
+
+        Args:
+            query: 查询文本
+            limit: 返回数量
+            min_score: 最低相似度
+
+        Returns:
+            List[Tuple[float, str]]: [(相似度, 文本键)]，相似度从高到低
+        """
+        query_grams = self._grams(query)
+        if not query_grams or limit <= 0:
+            return []
+
+        shared: Dict[str, int] = defaultdict(int)
+        for gram in query_grams:
+            for key in self._postings.get(gram, ()):
+                shared[key] += 1
+
+        query_count = len(query_grams)
+        gram_counts = self._gram_counts
+        ordinals = self._ordinals
+        scored = ((2.0 * count / (query_count + gram_counts[key]), key) for key, count in shared.items())
+        # 相似度相同时先登记的键在前
+        return heapq.nlargest(limit, (item for item in scored if item[0] >= min_score),
+                              key=lambda item: (item[0], -ordinals[item[1]]))
+
+    def get_statistics(self) -> Dict[str, int]:
+        """获取索引统计信息"""
+        return {
+            'keys': len(self._gram_counts),
+            'grams': len(self._postings),
+            'postings': sum(len(keys) for keys in self._postings.values())
+        }
@@ -0,0 +1,81 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+预编译的模式规则
+把一组正则模式在启动时编译为一个交替正则，逐行/逐单元格判断时只需一次扫描，
+不再对每个模式分别调用 re.search / re.match
+"""
+
+import re
+from typing import Any, Iterable, List, Optional, Pattern, Sequence, Tuple
+
+
+def compile_any(patterns: Iterable[str], flags: int = 0) -> Pattern:
+    """
+    编译"任意一个模式匹配"的交替正则
+
+    combined.search(text) 等价于 any(re.search(p, text) for p in patterns)，
+    combined.match(text) 等价于 any(re.match(p, text) for p in patterns)
+
+    Args:
+        patterns: 正则模式（不能包含编号的反向引用）
+        flags: 正则标志
+
+    Returns:
+        Pattern: 编译后的正则
+    """
+    return re.compile("|".join(f"(?:{pattern})" for pattern in patterns), flags)
+
+
+class PriorityMatcher:
+    """按优先级排列的具名规则组
+
+    每条规则是 (标签, [模式...])，first(text) 返回第一条有模式在文本中出现的规则的标签，
+    与依次对每条规则的每个模式调用 re.search 的结果相同，但只扫描一次文本
+    """
+
+    def __init__(self, rules: Iterable[Tuple[Any, Sequence[str]]], flags: int = 0):
+        """
+        初始化规则组
+
+        Args:
+            rules: [(标签, 模式列表)]，靠前的规则优先
+            flags: 正则标志
+        """
+        self.labels: List[Any] = []
+        alternatives = []
+        for label, patterns in rules:
+            if not patterns:
+                continue
+            alternatives.append(f"(?P<r{len(self.labels)}>{'|'.join(f'(?:{p})' for p in patterns)})")
+            self.labels.append(label)
+
+        self._group_names = [f"r{i}" for i in range(len(self.labels))]
+
+        # 零宽前瞻：在每个位置尝试所有规则，不会因为较早的匹配覆盖而漏掉其他规则
+        self._pattern = re.compile(f"(?=(?:{'|'.join(alternatives)}))", flags) if alternatives else None
+
+    def first(self, text: str) -> Optional[Any]:
+        """
+        查找优先级最高的匹配规则
+
+        Args:
+            text: 文本
+
+        Returns:
+            Optional[Any]: 规则标签，没有规则匹配时返回None
+        """
+        if self._pattern is None:
+            return None
+
+        best = len(self.labels)
+        for match in self._pattern.finditer(text):
+            # 规则模式内部可能有自己的分组，按命名分组查找是哪条规则匹配
+            index = next(i for i, value in enumerate(match.group(*self._group_names)) if value is not None) \
+                if len(self.labels) > 1 else 0
+            if index < best:
+                best = index
+                if best == 0:
+                    break
+
+        return self.labels[best] if best < len(self.labels) else None
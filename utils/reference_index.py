@@ -0,0 +1,294 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+引用解析索引
+以完整引用字符串和 (工作表名, 项目名, 列键) 为键建立来源项索引，
+使公式引用的解析为常数时间；模糊匹配作为显式的最后手段并缓存结果。
+来源项的主要数值和 data_columns 中的每一列都有各自的引用，索引按工作表在首次访问时构建
+"""
+
+from collections.abc import Mapping
+from typing import Any, Dict, Iterator, List, Optional, Set, Tuple
+
+from utils.excel_utils_v2 import build_formula_reference_v2
+
+
+# 索引条目: (来源项ID, 列键)，列键为空表示来源项的主要数值
+ReferenceEntry = Tuple[str, str]
+
+
+def iter_source_references(source) -> Iterator[Tuple[str, str]]:
+    """遍历来源项可被引用的 (列键, 引用字符串)：主要数值及每个数据列"""
+    if source.value is not None:
+        yield '', build_formula_reference_v2(source.sheet_name, source.name, source.cell_address)
+
+    for column_key, column_value in source.data_columns.items():
+        if column_value is not None:
+            yield column_key, build_formula_reference_v2(source.sheet_name, source.name,
+                                                         source.cell_address, column_key)
+
+
+def read_source_value(source_items: Any, source_id: str, column_key: str = '') -> Any:
+    """
+    读取来源项的当前数值（各计算后端共用的取值方式）
+
+    列存储的来源项集合直接读取数值，不物化来源项
+
+    Args:
+        source_items: 来源项集合 {item_id: SourceItem}
+        source_id: 来源项ID
+        column_key: 列键，为空时读取主要数值
+
+    Returns:
+        Any: 数值，来源项不存在时返回None
+    """
+    get_value = getattr(source_items, 'get_value', None)
+    if get_value is not None:
+        return get_value(source_id, column_key)
+
+    source = source_items.get(source_id)
+    if source is None:
+        return None
+    if column_key:
+        return source.data_columns.get(column_key)
+    return source.value
+
+
+class ReferenceIndex(Mapping):
+    """来源项引用索引
+
+    同时实现 Mapping[引用字符串, 值] 接口，可直接替代 build_value_map 生成的值映射表。
+    索引只保存来源项ID，取值时读取来源项的当前数值，因此数值变化无需重建索引。
+    构建时只按工作表分组，某个工作表的条目在第一次查找该工作表时才登记。
+    """
+
+    def __init__(self, source_items: Optional[Dict[str, Any]] = None):
+        """
+        初始化引用索引
+
+        Args:
+            source_items: 来源项字典 {item_id: SourceItem}
+        """
+        self.source_items: Dict[str, Any] = source_items if source_items is not None else {}
+
+        # 引用字符串 -> [来源项ID]（同一引用重复时以最后一个为准，与值映射表一致）
+        self._by_reference: Dict[str, List[ReferenceEntry]] = {}
+        # (工作表名, 项目名, 列键) -> [条目]（以第一个为准）
+        self._by_name: Dict[Tuple[str, str, str], List[ReferenceEntry]] = {}
+        # 来源项ID -> 已登记的键，用于增量更新
+        self._source_keys: Dict[str, List[Tuple[str, Any]]] = {}
+
+        # 按工作表延迟构建: 工作表名 -> {来源项ID: None}（保持来源项顺序）
+        self._sheet_sources: Dict[str, Dict[str, None]] = {}
+        self._source_sheet: Dict[str, str] = {}
+        self._built_sheets: Set[str] = set()
+
+        # 模糊匹配缓存 (工作表名, 项目名) -> 条目
+        self._fuzzy_cache: Dict[Tuple[str, str], Optional[ReferenceEntry]] = {}
+        self.exact_lookups = 0
+        self.exact_hits = 0
+        self.fuzzy_lookups = 0
+        self.fuzzy_cache_hits = 0
+
+        # 列存储的来源项集合可以不物化来源项直接读取工作表名和数值
+        get_sheet_name = getattr(self.source_items, 'get_sheet_name', None)
+
+        for source_id in self.source_items:
+            sheet_name = get_sheet_name(source_id) if get_sheet_name is not None \
+                else self.source_items[source_id].sheet_name
+            self._sheet_sources.setdefault(sheet_name, {})[source_id] = None
+            self._source_sheet[source_id] = sheet_name
+
+    @classmethod
+    def from_source_items(cls, source_items: Dict[str, Any]) -> 'ReferenceIndex':
+        """从来源项字典构建索引"""
+        return cls(source_items)
+
+    def _ensure_sheet(self, sheet_name: str):
+        """确保工作表的条目已登记"""
+        if sheet_name in self._built_sheets or sheet_name not in self._sheet_sources:
+            return
+        self._built_sheets.add(sheet_name)
+        for source_id in self._sheet_sources[sheet_name]:
+            self._add_source(self.source_items[source_id])
+
+    def _ensure_all(self):
+        """确保所有工作表的条目已登记"""
+        for sheet_name in list(self._sheet_sources):
+            self._ensure_sheet(sheet_name)
+
+    def _add_source(self, source):
+        """登记来源项"""
+        keys = []
+        sheet_name = source.sheet_name
+        item_name = source.name.strip()
+
+        for column_key, reference in iter_source_references(source):
+            entry = (source.id, column_key)
+
+            self._by_reference.setdefault(reference, []).append(entry)
+            keys.append(('reference', reference))
+
+            name_key = (sheet_name, item_name, column_key)
+            self._by_name.setdefault(name_key, []).append(entry)
+            keys.append(('name', name_key))
+
+        if keys:
+            self._source_keys[source.id] = keys
+
+    def _remove_source(self, source_id: str):
+        """移除来源项的所有登记"""
+        tables = {'reference': self._by_reference, 'name': self._by_name}
+
+        for table_name, key in self._source_keys.pop(source_id, []):
+            table = tables[table_name]
+            entries = table.get(key)
+            if not entries:
+                continue
+            entries[:] = [entry for entry in entries if entry[0] != source_id]
+            if not entries:
+                del table[key]
+
+    def update_source(self, source_id: str):
+        """
+        来源项新增、删除或名称/地址/有效列变化后更新索引
+
+        Args:
+            source_id: 来源项ID
+        """
+        self._remove_source(source_id)
+
+        old_sheet = self._source_sheet.pop(source_id, None)
+        if old_sheet is not None:
+            self._sheet_sources.get(old_sheet, {}).pop(source_id, None)
+
+        source = self.source_items.get(source_id)
+        if source is not None:
+            self._sheet_sources.setdefault(source.sheet_name, {})[source_id] = None
+            self._source_sheet[source_id] = source.sheet_name
+            if source.sheet_name in self._built_sheets:
+                self._add_source(source)
+
+        self._fuzzy_cache.clear()
+
+    def lookup(self, ref_data: Dict[str, str]) -> Optional[ReferenceEntry]:
+        """
+        精确查找引用：完整引用字符串 -> (工作表, 项目名, 列键)
+
+        不按单元格地址查找：项目名不存在的引用不能解析为该单元格上的其他项目（行移动或改名后会取错科目）
+
+        Args:
+            ref_data: 引用信息（parse_formula_references_v2格式）
+
+        Returns:
+            Optional[ReferenceEntry]: 命中的条目
+        """
+        sheet_name = ref_data['sheet_name']
+        self._ensure_sheet(sheet_name)
+        self.exact_lookups += 1
+
+        entries = self._by_reference.get(ref_data['full_reference'])
+        if entries:
+            self.exact_hits += 1
+            return entries[-1]
+
+        column_key = ref_data.get('column_key') or ''
+
+        entries = self._by_name.get((sheet_name, ref_data['item_name'], column_key))
+        if entries:
+            self.exact_hits += 1
+            return entries[0]
+
+        return None
+
+    def fuzzy_lookup(self, ref_data: Dict[str, str]) -> Optional[ReferenceEntry]:
+        """
+        模糊查找：返回第一个同时包含工作表名和项目名的引用（结果缓存）
+
+        Args:
+            ref_data: 引用信息
+
+        Returns:
+            Optional[ReferenceEntry]: 命中的条目
+        """
+        cache_key = (ref_data['sheet_name'], ref_data['item_name'])
+        self.fuzzy_lookups += 1
+
+        if cache_key in self._fuzzy_cache:
+            self.fuzzy_cache_hits += 1
+            return self._fuzzy_cache[cache_key]
+
+        # 模糊匹配可能命中任意工作表，需要完整索引
+        self._ensure_all()
+
+        sheet_name, item_name = cache_key
+        result = None
+        for reference, entries in self._by_reference.items():
+            if sheet_name in reference and item_name in reference:
+                result = entries[-1]
+                break
+
+        self._fuzzy_cache[cache_key] = result
+        return result
+
+    def resolve(self, ref_data: Dict[str, str]) -> Optional[ReferenceEntry]:
+        """精确查找，失败时模糊查找"""
+        entry = self.lookup(ref_data)
+        if entry is None:
+            entry = self.fuzzy_lookup(ref_data)
+        return entry
+
+    def value_of(self, entry: ReferenceEntry) -> Any:
+        """
+        读取条目的当前值
+
+        Args:
+            entry: 索引条目
+
+        Returns:
+            Any: 数值，来源项不存在时返回None
+        """
+        source_id, column_key = entry
+        return read_source_value(self.source_items, source_id, column_key)
+
+    def resolve_value(self, ref_data: Dict[str, str]) -> Any:
+        """解析引用并返回当前值，找不到时返回None"""
+        entry = self.resolve(ref_data)
+        return self.value_of(entry) if entry is not None else None
+
+    def to_value_map(self) -> Dict[str, Any]:
+        """
+        导出为 {引用字符串: 值} 形式的值映射表
+
+        Returns:
+            Dict[str, Any]: 值映射表
+        """
+        self._ensure_all()
+        return {reference: self.value_of(entries[-1]) for reference, entries in self._by_reference.items()}
+
+    def get_statistics(self) -> Dict[str, int]:
+        """获取索引统计信息"""
+        return {
+            "sheets": len(self._sheet_sources),
+            "built_sheets": len(self._built_sheets),
+            "references": len(self._by_reference),
+            "name_keys": len(self._by_name),
+            "exact_lookups": self.exact_lookups,
+            "exact_hit_rate": round(self.exact_hits / self.exact_lookups * 100, 2) if self.exact_lookups else 0.0,
+            "fuzzy_lookups": self.fuzzy_lookups,
+            "fuzzy_cache_hits": self.fuzzy_cache_hits
+        }
+
+    # Mapping 接口：按引用字符串取值
+    def __getitem__(self, reference: str) -> Any:
+        self._ensure_all()
+        entries = self._by_reference[reference]
+        return self.value_of(entries[-1])
+
+    def __iter__(self) -> Iterator[str]:
+        self._ensure_all()
+        return iter(self._by_reference)
+
+    def __len__(self) -> int:
+        self._ensure_all()
+        return len(self._by_reference)
@@ -0,0 +1,226 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+数据项搜索服务
+提取完成后以DataIndexer为目标项和来源项建立一次索引，目标项搜索框、来源项树的过滤和
+WorkbookManager.search_source_items共用同一份索引。增量重新提取后按差异只更新变化的数据项
+"""
+
+from typing import Any, Dict, List, Optional, Set
+
+from utils.data_indexer import DataIndexer
+from utils.value_index import ValueEntry, ValueIndex
+
+
+class ItemSearchService:
+    """目标项/来源项搜索服务"""
+
+    def __init__(self, workbook_manager: Optional[Any] = None):
+        """
+        初始化搜索服务
+
+        Args:
+            workbook_manager: 工作簿管理器，不为None时立即建立索引
+        """
+        self.indexer = DataIndexer()
+        self.workbook_manager = None
+
+        # 数据项ID -> 登记顺序（搜索结果按原有顺序返回）
+        self._target_order: Dict[str, int] = {}
+        self._source_order: Dict[str, int] = {}
+        self._next_order = 0
+
+        # 来源项数值索引（主要数值和所有data_columns，首次数值查询时由列存储直接构建）
+        self._value_index: Optional[ValueIndex] = None
+
+        self.build_count = 0
+        self.update_count = 0
+
+        if workbook_manager is not None:
+            self.build(workbook_manager)
+
+    @staticmethod
+    def _target_data(target: Any) -> Dict[str, Any]:
+        """目标项的索引数据"""
+        return {
+            'name': target.name or '',
+            'original_text': target.original_text or '',
+            'sheet_name': target.sheet_name,
+            'level': target.level
+        }
+
+    @staticmethod
+    def _source_data(source: Any) -> Dict[str, Any]:
+        """来源项的索引数据"""
+        return {
+            'name': source.name or '',
+            'sheet_name': source.sheet_name,
+            'value': source.value,
+            'account_code': source.account_code or ''
+        }
+
+    def build(self, workbook_manager: Any):
+        """
+        为工作簿管理器的全部目标项和来源项建立索引
+
+        Args:
+            workbook_manager: 工作簿管理器
+        """
+        self.workbook_manager = workbook_manager
+        self.indexer.clear_index()
+        self._target_order.clear()
+        self._source_order.clear()
+        self._next_order = 0
+        self._value_index = None
+
+        for target_id, target in workbook_manager.target_items.items():
+            self._add_target(target_id, target)
+        for source_id, source in workbook_manager.source_items.items():
+            self._add_source(source_id, source)
+        self.build_count += 1
+
+    def is_stale(self, workbook_manager: Any) -> bool:
+        """索引是否不再对应工作簿管理器的数据项（换了管理器或数据项数量变化）"""
+        return (workbook_manager is not self.workbook_manager or
+                len(workbook_manager.target_items) != len(self._target_order) or
+                len(workbook_manager.source_items) != len(self._source_order))
+
+    def _add_target(self, target_id: str, target: Any):
+        self.indexer.add_item(target_id, self._target_data(target), 'target')
+        if target_id not in self._target_order:
+            self._target_order[target_id] = self._next_order
+            self._next_order += 1
+
+    def _add_source(self, source_id: str, source: Any):
+        self.indexer.add_item(source_id, self._source_data(source), 'source')
+        if source_id not in self._source_order:
+            self._source_order[source_id] = self._next_order
+            self._next_order += 1
+
+    def _remove(self, item_id: str, order: Dict[str, int]):
+        self.indexer.remove_item(item_id)
+        order.pop(item_id, None)
+
+    def apply_diff(self, diff: Any):
+        """
+        按增量重新提取的差异更新索引（DataExtractor.refresh_changed_sheets返回的ExtractionDiff）
+
+        Args:
+            diff: 数据项差异
+        """
+        manager = self.workbook_manager
+        for target_id in diff.removed_targets:
+            self._remove(target_id, self._target_order)
+        for source_id in diff.removed_sources:
+            self._remove(source_id, self._source_order)
+
+        for target_id in diff.added_targets + diff.modified_targets:
+            if target_id in manager.target_items:
+                self._add_target(target_id, manager.target_items[target_id])
+        for source_id in diff.added_sources + diff.modified_sources:
+            if source_id in manager.source_items:
+                self._add_source(source_id, manager.source_items[source_id])
+        if diff.added_sources or diff.removed_sources or diff.modified_sources:
+            self._value_index = None
+        self.update_count += 1
+
+    def match_targets(self, query: str) -> Set[str]:
+        """
+        名称或原始文本包含查询文本（不区分大小写）的目标项ID
+
+        Args:
+            query: 查询文本，为空时返回全部目标项
+
+        Returns:
+            Set[str]: 目标项ID
+        """
+        if not query.strip():
+            return set(self._target_order)
+        return {item_id for _, item_id in self.indexer.search_name_containing(query, 'target')}
+
+    def match_sources(self, query: str, by_sheet: bool = False, by_code: bool = False) -> Set[str]:
+        """
+        名称包含查询文本（不区分大小写）的来源项ID
+
+        Args:
+            query: 查询文本，为空时返回全部来源项
+            by_sheet: 工作表名包含查询文本的来源项也算匹配
+            by_code: 科目代码包含查询文本的来源项也算匹配
+
+        Returns:
+            Set[str]: 来源项ID
+        """
+        if not query.strip():
+            return set(self._source_order)
+
+        matches = {item_id for _, item_id in self.indexer.search_name_containing(query, 'source')}
+        if by_code:
+            matches.update(self.indexer.search_code_containing(query))
+        if by_sheet:
+            query_lower = query.lower().strip()
+            for sheet_name, entries in self.indexer.sheet_index.items():
+                if query_lower in sheet_name.lower():
+                    matches.update(item_id for item_type, item_id in entries if item_type == 'source')
+        return matches
+
+    def search_sources(self, query: str, by_sheet: bool = True, by_code: bool = False) -> List[Any]:
+        """
+        搜索来源项，按来源项原有顺序返回
+
+        Args:
+            query: 查询文本
+            by_sheet: 工作表名包含查询文本的来源项也算匹配
+            by_code: 科目代码包含查询文本的来源项也算匹配
+
+        Returns:
+            List[SourceItem]: 来源项
+        """
+        source_items = self.workbook_manager.source_items
+        matches = self.match_sources(query, by_sheet, by_code)
+        return [source_items[item_id] for item_id in sorted(matches, key=self._source_order.__getitem__)]
+
+    @property
+    def value_index(self) -> ValueIndex:
+        """来源项数值索引"""
+        if self._value_index is None:
+            self._value_index = ValueIndex.from_source_items(self.workbook_manager.source_items)
+        return self._value_index
+
+    def find_values(self, value: float, tolerance: float = 0.005,
+                    column_key: Optional[str] = None) -> List[ValueEntry]:
+        """
+        查找数值与value相差不超过tolerance的来源项单元格（默认搜索所有数据列）
+
+        Args:
+            value: 目标数值
+            tolerance: 容差
+            column_key: 列键，为空时只搜索主要数值，None表示所有列
+
+        Returns:
+            List[ValueEntry]: (来源项ID, 列键, 数值)
+        """
+        return self.value_index.find_equal(value, tolerance, column_key)
+
+    def nearest_values(self, value: float, k: int = 5, column_key: Optional[str] = None) -> List[ValueEntry]:
+        """
+        查找数值最接近value的k个来源项单元格（默认搜索所有数据列）
+
+        Args:
+            value: 目标数值
+            k: 返回数量
+            column_key: 列键，为空时只搜索主要数值，None表示所有列
+
+        Returns:
+            List[ValueEntry]: (来源项ID, 列键, 数值)，按差值从小到大
+        """
+        return self.value_index.nearest(value, k, column_key)
+
+    def get_statistics(self) -> Dict[str, Any]:
+        """获取搜索服务统计信息"""
+        return {
+            'targets': len(self._target_order),
+            'sources': len(self._source_order),
+            'builds': self.build_count,
+            'incremental_updates': self.update_count,
+            'index': self.indexer.get_statistics()
+        }
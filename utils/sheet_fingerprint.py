@@ -0,0 +1,85 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+工作表内容指纹
+按行累积单元格值的哈希，用于判断重新提取时哪些工作表的内容发生了变化。
+只记录非空行（行号 + 去掉尾部空单元格的值），与工作簿以普通模式还是只读模式打开无关
+"""
+
+import hashlib
+import pickle
+from typing import Any, Iterable, Tuple
+
+
+# 指纹格式版本（计算方式变化时递增，使旧指纹全部失效）
+FINGERPRINT_VERSION = 1
+
+
+class SheetFingerprint:
+    """工作表内容指纹"""
+
+    def __init__(self, kind: str, sheet_name: str, extra: Any = None):
+        """
+        初始化指纹
+
+        Args:
+            kind: 工作表用途（"target"快报表 / "source"数据源表）
+            sheet_name: 工作表名
+            extra: 其他影响提取结果的内容（如合并单元格区域）
+        """
+        self._hash = hashlib.blake2b(digest_size=16)
+        # 不使用memo，相同的值总是得到相同的字节，与对象是否共享无关
+        self._pickler = pickle.Pickler(self, protocol=5)
+        self._pickler.fast = True
+        self._dump((FINGERPRINT_VERSION, kind, sheet_name, extra))
+
+        self.last_row = 0
+        self.max_column = 0
+
+    def write(self, data: bytes):
+        """供Pickler写入"""
+        self._hash.update(data)
+
+    def _dump(self, value: Any):
+        try:
+            self._pickler.dump(value)
+        except Exception:
+            # 无法序列化的单元格值（如第三方对象）退回到文本表示
+            self._hash.update(repr(value).encode('utf-8', 'surrogatepass'))
+
+    def add_row(self, row_num: int, row: Tuple[Any, ...]):
+        """
+        累积一行单元格值
+
+        Args:
+            row_num: 行号
+            row: 该行各列的值
+        """
+        width = len(row)
+        while width and row[width - 1] is None:
+            width -= 1
+        if not width:
+            return
+
+        self._dump((row_num, row[:width] if width < len(row) else row))
+        self.last_row = row_num
+        if width > self.max_column:
+            self.max_column = width
+
+    def add_rows(self, rows: Iterable[Tuple[Any, ...]], start_row: int = 1):
+        """
+        累积连续的多行
+
+        Args:
+            rows: 各行单元格值
+            start_row: 第一行的行号
+        """
+        for row_num, row in enumerate(rows, start_row):
+            self.add_row(row_num, row)
+
+    def hexdigest(self) -> str:
+        """指纹（包含内容范围：最后一个非空行和最大非空列）"""
+        digest = self._hash.copy()
+        digest.update(f"|{self.last_row}x{self.max_column}".encode('ascii'))
+        return digest.hexdigest()
+
@@ -0,0 +1,217 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+名称相似度索引
+把项目名称表示为字符n-gram的TF-IDF稀疏向量（L2归一化，内积即余弦相似度），
+以按n-gram分列的稀疏矩阵（CSC）保存语料。一批查询的相似度由各查询n-gram的倒排列
+一次性展开并用bincount累加得到，再按行取前k个，不逐对比较名称
+"""
+
+import math
+from collections import Counter
+from typing import Dict, Iterable, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+
+class NameSimilarityIndex:
+    """基于字符n-gram TF-IDF的名称相似度索引"""
+
+    # 每批查询的相似度矩阵最多包含的元素数（查询数 x 语料数），控制内存占用
+    BLOCK_CELLS = 1 << 22
+
+    def __init__(self, ngram_range: Tuple[int, int] = (1, 2)):
+        """
+        初始化相似度索引
+
+        Args:
+            ngram_range: n-gram长度范围 (最小, 最大)，默认同时使用单字和二元组
+        """
+        min_n, max_n = ngram_range
+        if min_n < 1 or max_n < min_n:
+            raise ValueError(f"无效的n-gram范围: {ngram_range}")
+        self.ngram_range = ngram_range
+
+        self.ids: List[str] = []
+        self.vocabulary: Dict[str, int] = {}
+        self.idf = np.zeros(0, dtype=np.float64)
+
+        # 语料矩阵（CSC）：第j个n-gram的非零元素为 doc_indices/weights[indptr[j]:indptr[j+1]]
+        self.indptr = np.zeros(1, dtype=np.int64)
+        self.doc_indices = np.zeros(0, dtype=np.int64)
+        self.weights = np.zeros(0, dtype=np.float64)
+
+    def __len__(self) -> int:
+        return len(self.ids)
+
+    def _grams(self, text: str) -> Counter:
+        """文本的n-gram词频（文本短于最小长度时为文本本身）"""
+        text = (text or "").lower().strip()
+        min_n, max_n = self.ngram_range
+        if len(text) < min_n:
+            return Counter([text]) if text else Counter()
+        return Counter(text[i:i + size] for size in range(min_n, max_n + 1)
+                       for i in range(len(text) - size + 1))
+
+    def fit(self, ids: Sequence[str], texts: Sequence[str]) -> 'NameSimilarityIndex':
+        """
+        以一组名称建立语料
+
+        Args:
+            ids: 项目ID
+            texts: 与ids对应的名称
+
+        Returns:
+            NameSimilarityIndex: 自身
+        """
+        self.ids = list(ids)
+        self.vocabulary = {}
+        rows: List[int] = []
+        cols: List[int] = []
+        counts: List[int] = []
+        for row, text in enumerate(texts):
+            for gram, count in self._grams(text).items():
+                rows.append(row)
+                cols.append(self.vocabulary.setdefault(gram, len(self.vocabulary)))
+                counts.append(count)
+
+        doc_count = len(self.ids)
+        gram_count = len(self.vocabulary)
+        rows_array = np.asarray(rows, dtype=np.int64)
+        cols_array = np.asarray(cols, dtype=np.int64)
+
+        # 平滑的逆文档频率：每个(文档, n-gram)只出现一次，列计数即文档频率
+        df = np.bincount(cols_array, minlength=gram_count)
+        self.idf = np.log((1.0 + doc_count) / (1.0 + df)) + 1.0
+
+        weights = np.asarray(counts, dtype=np.float64) * self.idf[cols_array]
+        norms = np.sqrt(np.bincount(rows_array, weights=weights * weights, minlength=doc_count))
+        norms[norms == 0] = 1.0
+        weights /= norms[rows_array]
+
+        order = np.argsort(cols_array, kind='stable')
+        self.doc_indices = rows_array[order]
+        self.weights = weights[order]
+        self.indptr = np.zeros(gram_count + 1, dtype=np.int64)
+        np.cumsum(df, out=self.indptr[1:])
+        return self
+
+    def _transform(self, texts: Iterable[str]) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+        """
+        把查询文本转换为语料空间中的稀疏向量（COO，按行排列）
+
+        语料中没有的n-gram不参与内积，但按文档频率为0计入查询向量的长度
+
+        Returns:
+            Tuple[np.ndarray, np.ndarray, np.ndarray]: (行, n-gram列, 权重)
+        """
+        unseen_idf = math.log(1.0 + len(self.ids)) + 1.0
+        rows: List[int] = []
+        cols: List[int] = []
+        weights: List[float] = []
+        for row, text in enumerate(texts):
+            entries = []
+            norm = 0.0
+            for gram, count in self._grams(text).items():
+                col = self.vocabulary.get(gram)
+                weight = count * (self.idf[col] if col is not None else unseen_idf)
+                norm += weight * weight
+                if col is not None:
+                    entries.append((col, weight))
+            norm = math.sqrt(norm) or 1.0
+            for col, weight in entries:
+                rows.append(row)
+                cols.append(col)
+                weights.append(weight / norm)
+        return (np.asarray(rows, dtype=np.int64), np.asarray(cols, dtype=np.int64),
+                np.asarray(weights, dtype=np.float64))
+
+    def top_k(self, texts: Sequence[str], k: int = 5, min_score: float = 0.0,
+              exclude_ids: Optional[Sequence[Optional[str]]] = None) -> List[List[Tuple[str, float]]]:
+        """
+        批量查询每个文本最相似的k个语料项
+
+        Args:
+            texts: 查询文本
+            k: 每个查询返回的数量
+            min_score: 最低余弦相似度（不含0分结果）
+            exclude_ids: 与texts对应、需要从该查询结果中排除的语料ID（如查询项自身）
+
+        Returns:
+            List[List[Tuple[str, float]]]: 每个查询的 [(语料ID, 相似度)]，相似度从高到低，相同时按语料顺序
+        """
+        texts = list(texts)
+        results: List[List[Tuple[str, float]]] = [[] for _ in texts]
+        doc_count = len(self.ids)
+        if not texts or not doc_count or k <= 0:
+            return results
+
+        id_positions = {item_id: index for index, item_id in enumerate(self.ids)} if exclude_ids else {}
+        query_rows, query_cols, query_weights = self._transform(texts)
+        row_bounds = np.searchsorted(query_rows, np.arange(len(texts) + 1))
+
+        block_size = max(1, self.BLOCK_CELLS // doc_count)
+        k = min(k, doc_count)
+        for block_start in range(0, len(texts), block_size):
+            block_end = min(block_start + block_size, len(texts))
+            entry_slice = slice(row_bounds[block_start], row_bounds[block_end])
+            scores = self._block_scores(query_rows[entry_slice] - block_start, query_cols[entry_slice],
+                                        query_weights[entry_slice], block_end - block_start)
+
+            if exclude_ids:
+                for offset in range(block_end - block_start):
+                    position = id_positions.get(exclude_ids[block_start + offset])
+                    if position is not None:
+                        scores[offset, position] = 0.0
+
+            if k < doc_count:
+                candidates = np.argpartition(-scores, k - 1, axis=1)[:, :k]
+            else:
+                candidates = np.broadcast_to(np.arange(doc_count), scores.shape)
+            candidate_scores = np.take_along_axis(scores, candidates, axis=1)
+
+            for offset in range(block_end - block_start):
+                row_candidates = candidates[offset]
+                row_scores = candidate_scores[offset]
+                order = np.lexsort((row_candidates, -row_scores))
+                results[block_start + offset] = [
+                    (self.ids[row_candidates[i]], float(row_scores[i])) for i in order
+                    if row_scores[i] > 0 and row_scores[i] >= min_score
+                ]
+
+        return results
+
+    def _block_scores(self, rows: np.ndarray, cols: np.ndarray, weights: np.ndarray,
+                      block_rows: int) -> np.ndarray:
+        """一批查询与全部语料的相似度矩阵（block_rows x 语料数）"""
+        doc_count = len(self.ids)
+        starts = self.indptr[cols]
+        lengths = self.indptr[cols + 1] - starts
+        total = int(lengths.sum())
+        if not total:
+            return np.zeros((block_rows, doc_count), dtype=np.float64)
+
+        # 展开每个查询n-gram的倒排列：第e个查询元素对应语料位置 starts[e] .. starts[e]+lengths[e]-1
+        entry = np.repeat(np.arange(len(cols)), lengths)
+        offsets = np.arange(total) - np.repeat(np.cumsum(lengths) - lengths, lengths)
+        positions = starts[entry] + offsets
+
+        keys = rows[entry] * doc_count + self.doc_indices[positions]
+        values = weights[entry] * self.weights[positions]
+        return np.bincount(keys, weights=values, minlength=block_rows * doc_count).reshape(block_rows, doc_count)
+
+    def most_similar(self, text: str, k: int = 5, min_score: float = 0.0,
+                     exclude_id: Optional[str] = None) -> List[Tuple[str, float]]:
+        """
+        查询单个文本最相似的k个语料项
+
+        Args:
+            text: 查询文本
+            k: 返回数量
+            min_score: 最低余弦相似度
+            exclude_id: 需要排除的语料ID
+
+        Returns:
+            List[Tuple[str, float]]: [(语料ID, 相似度)]
+        """
+        return self.top_k([text], k, min_score, [exclude_id] if exclude_id is not None else None)[0]
@@ -0,0 +1,223 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+数值索引
+每个列键（主要数值为空键，data_columns中的每一列各一个键）保存一对按数值排序的NumPy数组
+(数值, 来源项位置)，范围查询和最近值查询都用searchsorted二分定位，不扫描来源项
+"""
+
+import math
+from collections import defaultdict
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+import numpy as np
+
+
+# 索引条目: (来源项ID, 列键, 数值)，列键为空表示来源项的主要数值
+ValueEntry = Tuple[str, str, float]
+
+
+def _numeric(value: Any) -> Optional[float]:
+    """可索引的数值（布尔值、非数值和NaN/无穷返回None）"""
+    if isinstance(value, bool) or not isinstance(value, (int, float)):
+        return None
+    value = float(value)
+    return value if math.isfinite(value) else None
+
+
+class ValueIndex:
+    """来源项数值索引（按列键分别排序）"""
+
+    def __init__(self):
+        """初始化数值索引"""
+        self.ids: List[str] = []
+        # 列键 -> (升序数值, 对应的来源项在ids中的位置)
+        self._columns: Dict[str, Tuple[np.ndarray, np.ndarray]] = {}
+
+    def __len__(self) -> int:
+        return sum(len(values) for values, _ in self._columns.values())
+
+    @classmethod
+    def from_entries(cls, entries: Iterable[ValueEntry]) -> 'ValueIndex':
+        """
+        由 (来源项ID, 列键, 数值) 条目建立索引
+
+        Args:
+            entries: 索引条目（非数值的条目被忽略）
+
+        Returns:
+            ValueIndex: 数值索引
+        """
+        index = cls()
+        positions: Dict[str, int] = {}
+        pending: Dict[str, Tuple[List[int], List[float]]] = defaultdict(lambda: ([], []))
+        for source_id, column_key, value in entries:
+            value = _numeric(value)
+            if value is None:
+                continue
+            position = positions.get(source_id)
+            if position is None:
+                position = positions[source_id] = len(index.ids)
+                index.ids.append(source_id)
+            column_positions, column_values = pending[column_key]
+            column_positions.append(position)
+            column_values.append(value)
+
+        for column_key, (column_positions, column_values) in pending.items():
+            index._set_column(column_key, [np.asarray(column_values, dtype=np.float64)],
+                              [np.asarray(column_positions, dtype=np.int64)])
+        return index
+
+    @classmethod
+    def from_source_items(cls, source_items: Any) -> 'ValueIndex':
+        """
+        由来源项集合建立索引（主要数值和所有data_columns）
+
+        列存储的来源项集合（SourceItemStore）直接读取数值数组，不物化来源项
+
+        Args:
+            source_items: 来源项集合 {item_id: SourceItem}
+
+        Returns:
+            ValueIndex: 数值索引
+        """
+        iter_columns = getattr(source_items, 'iter_numeric_columns', None)
+        if iter_columns is None:
+            return cls.from_entries(
+                (source_id, column_key, value)
+                for source_id, source in source_items.items()
+                for column_key, value in [("", source.value), *source.data_columns.items()]
+            )
+
+        index = cls()
+        # id(来源项ID列表) -> (列表, 在ids中的起始位置)；保留列表引用，避免id被复用
+        offsets: Dict[int, Tuple[List[str], int]] = {}
+        pending: Dict[str, Tuple[List[np.ndarray], List[np.ndarray]]] = defaultdict(lambda: ([], []))
+        for column_key, ids, values in iter_columns():
+            known = offsets.get(id(ids))
+            if known is None:
+                known = offsets[id(ids)] = (ids, len(index.ids))
+                index.ids.extend(ids)
+            offset = known[1]
+            column_values, column_positions = pending[column_key]
+            column_values.append(np.asarray(values, dtype=np.float64))
+            column_positions.append(np.arange(offset, offset + len(ids), dtype=np.int64))
+
+        for column_key, (column_values, column_positions) in pending.items():
+            index._set_column(column_key, column_values, column_positions)
+        return index
+
+    def _set_column(self, column_key: str, values: List[np.ndarray], positions: List[np.ndarray]):
+        """合并一列的数值，去掉缺失值后按数值排序保存"""
+        values = np.concatenate(values)
+        positions = np.concatenate(positions)
+        finite = np.isfinite(values)
+        if not finite.all():
+            values = values[finite]
+            positions = positions[finite]
+        if not len(values):
+            return
+
+        order = np.argsort(values, kind='stable')
+        self._columns[column_key] = (values[order], positions[order])
+
+    def column_keys(self) -> List[str]:
+        """已索引的列键"""
+        return list(self._columns)
+
+    def _selected(self, column_key: Optional[str]) -> List[Tuple[str, Tuple[np.ndarray, np.ndarray]]]:
+        """查询的列（None表示所有列）"""
+        if column_key is None:
+            return list(self._columns.items())
+        column = self._columns.get(column_key)
+        return [(column_key, column)] if column is not None else []
+
+    def range(self, min_value: Optional[float] = None, max_value: Optional[float] = None,
+              column_key: Optional[str] = None) -> List[ValueEntry]:
+        """
+        数值在 [min_value, max_value] 内的条目
+
+        Args:
+            min_value: 最小值（含），None表示不限
+            max_value: 最大值（含），None表示不限
+            column_key: 列键，None表示所有列
+
+        Returns:
+            List[ValueEntry]: 条目，每列内按数值升序
+        """
+        results: List[ValueEntry] = []
+        for key, (values, positions) in self._selected(column_key):
+            start = 0 if min_value is None else int(np.searchsorted(values, min_value, side='left'))
+            end = len(values) if max_value is None else int(np.searchsorted(values, max_value, side='right'))
+            if start >= end:
+                continue
+            ids = self.ids
+            results.extend((ids[position], key, value)
+                           for position, value in zip(positions[start:end].tolist(), values[start:end].tolist()))
+        return results
+
+    def find_equal(self, value: float, tolerance: float = 0.005,
+                   column_key: Optional[str] = None) -> List[ValueEntry]:
+        """
+        数值与value相差不超过tolerance的条目
+
+        Args:
+            value: 目标数值
+            tolerance: 容差
+            column_key: 列键，None表示所有列
+
+        Returns:
+            List[ValueEntry]: 条目
+        """
+        return self.range(value - tolerance, value + tolerance, column_key)
+
+    def nearest(self, value: float, k: int = 1, column_key: Optional[str] = None,
+                max_distance: Optional[float] = None) -> List[ValueEntry]:
+        """
+        与value最接近的k个条目
+
+        每列只取二分位置两侧各k个候选，再在所有候选中选出差值最小的k个
+
+        Args:
+            value: 目标数值
+            k: 返回数量
+            column_key: 列键，None表示所有列
+            max_distance: 最大差值，None表示不限
+
+        Returns:
+            List[ValueEntry]: 条目，按差值从小到大（相同时按列键顺序和数值）
+        """
+        if k <= 0:
+            return []
+
+        candidate_values = []
+        candidate_positions = []
+        candidate_keys = []
+        keys = []
+        for key, (values, positions) in self._selected(column_key):
+            center = int(np.searchsorted(values, value))
+            start, end = max(0, center - k), min(len(values), center + k)
+            candidate_values.append(values[start:end])
+            candidate_positions.append(positions[start:end])
+            candidate_keys.append(np.full(end - start, len(keys), dtype=np.int64))
+            keys.append(key)
+        if not keys:
+            return []
+
+        values = np.concatenate(candidate_values)
+        positions = np.concatenate(candidate_positions)
+        key_indexes = np.concatenate(candidate_keys)
+        distances = np.abs(values - value)
+
+        order = np.lexsort((values, key_indexes, distances))[:k]
+        if max_distance is not None:
+            order = order[distances[order] <= max_distance]
+        return [(self.ids[positions[i]], keys[key_indexes[i]], float(values[i])) for i in order]
+
+    def get_statistics(self) -> Dict[str, Any]:
+        """获取索引统计信息"""
+        return {
+            'columns': len(self._columns),
+            'entries': len(self),
+            'sources': len(self.ids)
+        }
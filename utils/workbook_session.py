@@ -0,0 +1,331 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+工作簿会话
+一个Excel文件在整个处理流程（工作表分类、数据提取、数据结构处理、导出）中只解析一次：
+会话持有已加载的工作簿和各工作表的单元格值，文件在磁盘上发生变化时自动失效并重新加载。
+大型数据来源表可使用只读模式（read_only）按行流式读取，不在内存中构建完整的单元格对象
+"""
+
+import hashlib
+import os
+import posixpath
+import re
+import xml.etree.ElementTree as ElementTree
+import zipfile
+from contextlib import contextmanager
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+
+import openpyxl
+
+
+# 文件签名: (修改时间ns, 文件大小)
+FileSignature = Tuple[int, int]
+
+# 工作簿加载模式: (data_only, read_only)
+WorkbookMode = Tuple[bool, bool]
+
+# 工作表XML中的合并单元格（可能带命名空间前缀）
+_MERGE_CELL_PATTERN = re.compile(rb'<(?:\w+:)?mergeCell\s+ref="([^"]+)"')
+_READ_CHUNK_SIZE = 1 << 20
+# 工作簿级部件：内容变化会影响所有工作表的单元格值（日期系统在workbook.xml中）
+_COMMON_PARTS = ('workbook.xml', 'sharedStrings.xml', 'styles.xml')
+
+
+class WorkbookSession:
+    """工作簿会话 - 缓存同一文件的解析结果"""
+
+    def __init__(self, file_path: str):
+        """
+        初始化工作簿会话（不立即加载文件）
+
+        Args:
+            file_path: Excel文件路径
+        """
+        self.file_path = file_path
+
+        # (data_only, read_only) -> 工作簿
+        # data_only为True时读取单元格的计算值，False保留公式（用于导出写回）；read_only为流式只读模式
+        self._workbooks: Dict[WorkbookMode, Any] = {}
+        # 工作表名 -> 各行单元格值（来自data_only工作簿）
+        self._sheet_values: Dict[str, List[Tuple[Any, ...]]] = {}
+        # 工作表名 -> 合并单元格区域（只读模式下使用）
+        self._merged_ranges: Dict[str, List[str]] = {}
+        # 工作表名 -> 工作表XML部件的摘要
+        self._part_digests: Optional[Dict[str, str]] = None
+        self._signature: Optional[FileSignature] = None
+
+        self.load_count = 0
+        self.invalidation_count = 0
+
+    def _read_signature(self) -> Optional[FileSignature]:
+        """读取文件当前签名，文件不存在时返回None"""
+        try:
+            stat = os.stat(self.file_path)
+        except OSError:
+            return None
+        return stat.st_mtime_ns, stat.st_size
+
+    def is_stale(self) -> bool:
+        """已缓存的内容是否与磁盘上的文件不一致"""
+        return bool(self._workbooks) and self._read_signature() != self._signature
+
+    def invalidate(self):
+        """丢弃所有缓存内容，下次访问时重新加载文件"""
+        if self._workbooks or self._sheet_values:
+            self.invalidation_count += 1
+
+        for workbook in self._workbooks.values():
+            try:
+                workbook.close()
+            except Exception:
+                pass
+
+        self._workbooks.clear()
+        self._sheet_values.clear()
+        self._merged_ranges.clear()
+        self._part_digests = None
+        self._signature = None
+
+    def release(self, data_only: bool = True, read_only: bool = False):
+        """
+        丢弃一种模式的工作簿（如导出时已写入计算结果、与磁盘内容不再一致）
+
+        Args:
+            data_only: 要丢弃的工作簿是否为计算值模式
+            read_only: 要丢弃的工作簿是否为只读模式
+        """
+        workbook = self._workbooks.pop((data_only, read_only), None)
+        if workbook is not None:
+            workbook.close()
+        if data_only and not read_only:
+            self._sheet_values.clear()
+
+    def get_workbook(self, data_only: bool = True, read_only: bool = False):
+        """
+        获取工作簿，首次访问或文件变化后才从磁盘加载
+
+        Args:
+            data_only: True读取单元格的计算值，False保留公式
+            read_only: True以只读模式打开，工作表只能用iter_rows按行流式读取
+
+        Returns:
+            openpyxl.Workbook: 工作簿
+        """
+        if self.is_stale():
+            print(f"文件已变化，重新加载: {self.file_path}")
+            self.invalidate()
+
+        mode = (data_only, read_only)
+        workbook = self._workbooks.get(mode)
+        if workbook is None:
+            signature = self._read_signature()
+            workbook = openpyxl.load_workbook(self.file_path, data_only=data_only, read_only=read_only)
+            if not self._workbooks:
+                self._signature = signature
+            self._workbooks[mode] = workbook
+            self.load_count += 1
+
+        return workbook
+
+    @property
+    def sheetnames(self) -> List[str]:
+        """工作表名称列表"""
+        return self.get_workbook().sheetnames
+
+    def get_sheet(self, sheet_name: str):
+        """
+        获取工作表（计算值模式）
+
+        Args:
+            sheet_name: 工作表名
+
+        Returns:
+            Worksheet: 工作表，不存在时返回None
+        """
+        workbook = self.get_workbook()
+        if sheet_name not in workbook.sheetnames:
+            return None
+        return workbook[sheet_name]
+
+    def get_sheet_values(self, sheet_name: str) -> List[Tuple[Any, ...]]:
+        """
+        获取工作表各行的单元格值（首次访问时读取并缓存）
+
+        Args:
+            sheet_name: 工作表名
+
+        Returns:
+            List[Tuple[Any, ...]]: 各行单元格值，工作表不存在时返回空列表
+        """
+        sheet = self.get_sheet(sheet_name)
+        if sheet is None:
+            return []
+
+        values = self._sheet_values.get(sheet_name)
+        if values is None:
+            values = list(sheet.iter_rows(values_only=True))
+            self._sheet_values[sheet_name] = values
+        return values
+
+    def get_merged_ranges(self, sheet_name: str) -> List[str]:
+        """
+        获取工作表的合并单元格区域（如"A1:B2"）
+
+        只读模式不解析合并单元格，这里直接在工作表XML中查找mergeCell元素，
+        按块读取，不构建单元格对象
+
+        Args:
+            sheet_name: 工作表名
+
+        Returns:
+            List[str]: 合并单元格区域
+        """
+        ranges = self._merged_ranges.get(sheet_name)
+        if ranges is not None:
+            return ranges
+
+        self.get_workbook(read_only=True)  # 文件变化时先使缓存失效
+        with self._open_package() as (archive, part_paths):
+            path = part_paths.get(sheet_name) if part_paths is not None else None
+            if path is None:
+                ranges = None
+            else:
+                found: Dict[str, None] = {}
+                tail = b""
+                with archive.open(path) as source:
+                    while True:
+                        chunk = source.read(_READ_CHUNK_SIZE)
+                        if not chunk:
+                            break
+                        data = tail + chunk
+                        for match in _MERGE_CELL_PATTERN.finditer(data):
+                            found[match.group(1).decode("ascii")] = None
+                        # 保留块尾，避免元素被块边界截断
+                        tail = data[-256:]
+                ranges = list(found)
+
+        if ranges is None:
+            # 无法定位工作表XML时由普通模式的工作簿读取
+            sheet = self.get_sheet(sheet_name)
+            ranges = [str(merged) for merged in sheet.merged_cells.ranges] if sheet is not None else []
+
+        self._merged_ranges[sheet_name] = ranges
+        return ranges
+
+    @contextmanager
+    def _open_package(self) -> Iterator[Tuple[zipfile.ZipFile, Optional[Dict[str, str]]]]:
+        """
+        以zip包打开文件，按工作簿关系定位各工作表的XML部件
+
+        只按OOXML包结构读取，不依赖openpyxl的内部属性
+
+        Yields:
+            Tuple[zipfile.ZipFile, Optional[Dict[str, str]]]: (zip包, {工作表名: 部件路径})，
+            无法解析包结构时部件路径为None
+        """
+        with zipfile.ZipFile(self.file_path) as archive:
+            try:
+                part_paths = self._read_sheet_part_paths(archive)
+            except (KeyError, ElementTree.ParseError) as e:
+                print(f"无法定位工作表XML部件: {e}")
+                part_paths = None
+            yield archive, part_paths
+
+    @staticmethod
+    def _read_sheet_part_paths(archive: zipfile.ZipFile) -> Dict[str, str]:
+        """由 _rels/.rels、workbook.xml 及其关系文件得到 {工作表名: 部件路径}"""
+        def local_name(name: str) -> str:
+            return name.rsplit('}', 1)[-1]
+
+        def resolve(base: str, target: str) -> str:
+            if target.startswith('/'):
+                return target.lstrip('/')
+            return posixpath.normpath(posixpath.join(posixpath.dirname(base), target))
+
+        def relationships(part: str) -> Dict[str, str]:
+            rels_path = posixpath.join(posixpath.dirname(part), '_rels', posixpath.basename(part) + '.rels')
+            root = ElementTree.fromstring(archive.read(rels_path))
+            return {element.get('Id'): element.get('Target', '')
+                    for element in root.iter() if local_name(element.tag) == 'Relationship'}
+
+        root = ElementTree.fromstring(archive.read('_rels/.rels'))
+        workbook_part = next(resolve('', element.get('Target', ''))
+                             for element in root.iter()
+                             if local_name(element.tag) == 'Relationship'
+                             and element.get('Type', '').endswith('/officeDocument'))
+
+        targets = relationships(workbook_part)
+        names = set(archive.namelist())
+        part_paths = {}
+        for element in ElementTree.fromstring(archive.read(workbook_part)).iter():
+            if local_name(element.tag) != 'sheet':
+                continue
+            relation_id = next((value for key, value in element.attrib.items() if local_name(key) == 'id'), None)
+            target = targets.get(relation_id)
+            if target:
+                path = resolve(workbook_part, target)
+                if path in names:
+                    part_paths[element.get('name')] = path
+        return part_paths
+
+    def get_part_digests(self) -> Dict[str, str]:
+        """
+        获取各工作表在文件中的原始XML部件摘要（连同工作簿、共享字符串表和样式表部件）
+
+        只解压和哈希，不解析单元格。摘要相同的工作表单元格值一定相同；
+        摘要不同时内容未必变化（如只切换了选中的工作表），需要进一步比较单元格值。
+        无法定位工作表部件时，所有工作表都使用整个文件的摘要
+
+        Returns:
+            Dict[str, str]: {工作表名: 摘要}
+        """
+        if self._part_digests is not None and not self.is_stale():
+            return self._part_digests
+
+        sheet_names = self.get_workbook(read_only=True).sheetnames
+        with self._open_package() as (archive, part_paths):
+            if part_paths is None:
+                digest = hashlib.blake2b(digest_size=16)
+                with open(self.file_path, 'rb') as f:
+                    for chunk in iter(lambda: f.read(_READ_CHUNK_SIZE), b""):
+                        digest.update(chunk)
+                digests = dict.fromkeys(sheet_names, digest.hexdigest())
+            else:
+                common = hashlib.blake2b(digest_size=16)
+                for part in sorted(name for name in archive.namelist() if name.endswith(_COMMON_PARTS)):
+                    common.update(part.encode('utf-8'))
+                    common.update(archive.read(part))
+
+                digests = {}
+                for sheet_name in sheet_names:
+                    path = part_paths.get(sheet_name)
+                    if path is None:
+                        continue
+                    digest = common.copy()
+                    digest.update(archive.read(path))
+                    digests[sheet_name] = digest.hexdigest()
+
+        self._part_digests = digests
+        return digests
+
+    def get_statistics(self) -> Dict[str, Any]:
+        """获取会话统计信息"""
+        return {
+            "file_path": self.file_path,
+            "loaded_modes": sorted(("data_only" if data_only else "formulas") + ("_read_only" if read_only else "")
+                                   for data_only, read_only in self._workbooks),
+            "cached_sheets": len(self._sheet_values),
+            "load_count": self.load_count,
+            "invalidation_count": self.invalidation_count
+        }
+
+    def __getstate__(self):
+        # 工作簿不随对象复制到其他进程，在目标进程中按需重新加载
+        state = self.__dict__.copy()
+        state["_workbooks"] = {}
+        state["_sheet_values"] = {}
+        state["_merged_ranges"] = {}
+        state["_part_digests"] = None
+        state["_signature"] = None
+        return state